@@ -0,0 +1,141 @@
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from sqlalchemy.orm import noload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models.users import DBUser, UserRead
+
+logger = logging.getLogger(__name__)
+
+# คุกกี้เก็บ session token (JWT ที่ลงลายเซ็นแล้ว)
+SESSION_COOKIE = "session"
+ALGORITHM = "HS256"
+
+
+class SessionError(ValueError):
+    pass
+
+
+def create_token(user) -> str:
+    # token มี id, role และ status ของผู้ใช้ ณ ตอน login ตรวจลายเซ็นได้โดยไม่ต้องอ่านฐานข้อมูล
+    now = datetime.now(timezone.utc)
+    claims = {
+        "sub": str(user.id),
+        "role": user.role,
+        "status": user.status,
+        "iat": now,
+        "exp": now + timedelta(minutes=token_minutes),
+    }
+    return jwt.encode(claims, secret_key, algorithm=ALGORITHM)
+
+
+def decode_token(token: str) -> dict:
+    try:
+        claims = jwt.decode(token, secret_key, algorithms=[ALGORITHM], options={"require": ["sub", "exp"]})
+        claims["sub"] = int(claims["sub"])
+    except jwt.ExpiredSignatureError:
+        raise SessionError("Session expired. Please login again.")
+    except (jwt.InvalidTokenError, ValueError):
+        raise SessionError("Invalid session.")
+    return claims
+
+
+class UserCache:
+    # แคช LRU + TTL ของข้อมูลผู้ใช้ตาม id สำหรับตรวจสิทธิ์ทุก request
+    # ล้างทันทีเมื่อ login / logout / เปลี่ยนรหัสผ่าน / แก้ไข / ลบผู้ใช้ (TTL สำหรับกรณีรันหลาย worker)
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self._entries: OrderedDict[int, tuple[float, UserRead]] = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+
+        # metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id: int) -> UserRead | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, user: UserRead):
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int):
+        if self._entries.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+async def get_db_user(session: AsyncSession, user_id: int) -> DBUser | None:
+    # อ่านเฉพาะแถวของผู้ใช้ ไม่โหลดอุปกรณ์ทั้งหมดของผู้ใช้ (DBUser.devices เป็น selectin)
+    result = await session.exec(select(DBUser).options(noload(DBUser.devices)).where(DBUser.id == user_id))
+    return result.one_or_none()
+
+
+async def get_user(session: AsyncSession, user_id: int) -> UserRead | None:
+    user = cache.get(user_id) if cache else None
+    if user is None:
+        dbuser = await get_db_user(session, user_id)
+        if dbuser is None:
+            return None
+        user = UserRead.model_validate(dbuser)
+        if cache:
+            cache.set(user)
+    return user
+
+
+# ค่าที่ใช้งานอยู่ (กำหนดใน init_auth)
+secret_key = ""
+token_minutes = 0
+cache: UserCache | None = None
+
+
+def init_auth(settings):
+    global secret_key, token_minutes, cache
+
+    secret_key = settings.SESSION_SECRET_KEY
+    if not secret_key:
+        # key สุ่มทำให้ session หมดอายุทุกครั้งที่รีสตาร์ท / reload และใช้ร่วมกันหลาย worker ไม่ได้ จึงอนุญาตเฉพาะเมื่อตั้งค่าไว้
+        if not settings.SESSION_ALLOW_RANDOM_KEY:
+            raise RuntimeError("SESSION_SECRET_KEY is not set. Set it to the same random value on every worker.")
+        logger.warning("SESSION_SECRET_KEY is not set; using a random key for this process.")
+        secret_key = secrets.token_urlsafe(32)
+    token_minutes = settings.SESSION_EXPIRE_MINUTES
+    cache = UserCache(maxsize=settings.USER_CACHE_SIZE, ttl_seconds=settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate(user_id: int):
+    if cache:
+        cache.invalidate(user_id)
@@ -0,0 +1,256 @@
+import csv
+import json
+import time as timer
+from typing import Callable, Iterable
+
+from pydantic import ValidationError
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    MetaData,
+    Numeric,
+    String,
+    Table,
+    cast,
+    delete,
+    exists,
+    func,
+    insert,
+    literal_column,
+    select,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import history, latest, response_cache
+from .ingest import (
+    METRICS,
+    ROLLUP_TIERS,
+    accumulate_daily_conflict,
+    accumulate_rollup_conflict,
+    refresh_period_averages,
+    upsert_scores,
+    upsert_showdetects,
+)
+from .models.daily_average import DBDailyAverage
+from .models.detect import CreateDetect, DBDetect
+from .models.detect_history import DBDetectHistory
+from .models.device import DBDevice
+
+# จำนวนแถวต่อการ COPY หนึ่งครั้ง
+COPY_CHUNK_SIZE = 5000
+
+# ตารางพักข้อมูลชั่วคราวของ transaction (ไม่อยู่ใน metadata ของแอป จึงไม่ถูกสร้างโดย create_all)
+staging = Table(
+    "backfill_detects",
+    MetaData(),
+    Column("api_key", String, nullable=False),
+    Column("timestamp", DateTime, nullable=False),
+    *[Column(metric, Float, nullable=False) for metric in METRICS],
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DROP",
+)
+STAGING_COLUMNS = [column.name for column in staging.columns]
+
+
+class BackfillError(ValueError):
+    pass
+
+
+def parse_lines(lines: Iterable[str], format: str, api_key: str | None = None):
+    # แปลงไฟล์ CSV (มี header) หรือ NDJSON เป็น CreateDetect ทีละแถว
+    # คอลัมน์เหมือนไฟล์จาก /export: timestamp และค่าที่วัดได้ (api_key ในไฟล์ หรือระบุทั้งไฟล์ผ่าน api_key)
+    if format == "csv":
+        records = enumerate(csv.DictReader(lines), start=2)
+    else:
+        records = ((number, line) for number, line in enumerate(lines, start=1) if line.strip())
+
+    for number, record in records:
+        try:
+            if format != "csv":
+                record = json.loads(record)
+            if api_key:
+                record["api_key"] = api_key
+            yield CreateDetect.model_validate(record)
+        except ValidationError as error:
+            detail = error.errors()[0]
+            field = ".".join(str(part) for part in detail["loc"])
+            raise BackfillError(f"Line {number}: {field}: {detail['msg']}")
+        except (ValueError, TypeError) as error:
+            raise BackfillError(f"Line {number}: {error}")
+
+
+def chunked(detects, size: int):
+    chunk = []
+    for detect in detects:
+        chunk.append(tuple(getattr(detect, column) for column in STAGING_COLUMNS))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def backfill(
+    session: AsyncSession,
+    lines: Iterable[str],
+    format: str,
+    api_key: str | None = None,
+    progress: Callable[[dict], None] | None = None,
+) -> dict:
+    # นำเข้าข้อมูลย้อนหลังจำนวนมากใน transaction เดียว (ผู้เรียกเป็นคน commit)
+    # 1. COPY เข้าตารางพัก แล้วตัดแถวซ้ำ (ในไฟล์ และที่มีอยู่แล้วใน detects / detect_history)
+    # 2. คำนวณตารางสรุปด้วย GROUP BY ครั้งเดียวต่อตาราง แทนการคำนวณใหม่ทีละแถว
+    # 3. showdetects / scores ถูกเขียนทับเฉพาะเมื่อข้อมูลย้อนหลังใหม่กว่าข้อมูลที่มีอยู่
+    started = timer.perf_counter()
+    connection = await session.connection()
+    await connection.run_sync(lambda sync_connection: staging.create(sync_connection))
+
+    raw = await connection.get_raw_connection()
+    rows = 0
+    for chunk in chunked(parse_lines(lines, format, api_key), COPY_CHUNK_SIZE):
+        await raw.driver_connection.copy_records_to_table(
+            staging.name, records=chunk, columns=STAGING_COLUMNS
+        )
+        rows += len(chunk)
+        if progress:
+            elapsed = timer.perf_counter() - started
+            progress({"rows": rows, "seconds": round(elapsed, 2), "rows_per_second": round(rows / elapsed)})
+
+    if not rows:
+        raise BackfillError("No detection data provided.")
+
+    # ทุก api_key ต้องเป็นอุปกรณ์ที่มีอยู่ (ล็อกแถวอุปกรณ์ไว้จนจบ transaction ไม่ให้ถูกลบระหว่างนำเข้า เช่นเดียวกับ ingest)
+    await session.execute(
+        select(DBDevice.api_key)
+        .where(DBDevice.api_key.in_(select(staging.c.api_key)))
+        .order_by(DBDevice.api_key)
+        .with_for_update(key_share=True)
+    )
+    result = await session.execute(
+        select(staging.c.api_key)
+        .where(~exists().where(DBDevice.api_key == staging.c.api_key))
+        .group_by(staging.c.api_key)
+    )
+    unknown = result.scalars().all()
+    if unknown:
+        raise BackfillError(f"Invalid API Key(s): {', '.join(unknown[:10])}. Please add devices first.")
+
+    # สร้าง partition ของเดือนที่นำเข้าก่อนที่ transaction นี้จะแตะ detect_history
+    # (CREATE TABLE ... PARTITION OF บนอีก connection ต้องรอ lock ของ detect_history ที่ transaction นี้ถืออยู่ จะค้างตลอดไป)
+    if history.store:
+        months = await session.execute(
+            select(func.date_trunc("month", staging.c.timestamp)).group_by(literal_column("1"))
+        )
+        await history.store.ensure_months({month.date() for month in months.scalars().all()})
+
+    # ตัดแถวซ้ำ
+    duplicate = staging.alias("duplicate")
+    await session.execute(
+        delete(staging).where(
+            exists().where(
+                duplicate.c.api_key == staging.c.api_key,
+                duplicate.c.timestamp == staging.c.timestamp,
+                literal_column("duplicate.ctid") < literal_column("backfill_detects.ctid"),
+            )
+        )
+    )
+    existing = [DBDetect] + ([DBDetectHistory] if history.store else [])
+    for model in existing:
+        await session.execute(
+            delete(staging).where(
+                exists().where(model.api_key == staging.c.api_key, model.timestamp == staging.c.timestamp)
+            )
+        )
+
+    summary = (await session.execute(
+        select(
+            func.count(),
+            func.count(func.distinct(staging.c.api_key)),
+            func.min(staging.c.timestamp),
+            func.max(staging.c.timestamp),
+        )
+    )).one()
+    loaded, devices, first, last = summary
+    report = {"rows": rows, "duplicates": rows - loaded, "loaded": loaded, "devices": devices}
+
+    if loaded:
+        columns = [staging.c[name] for name in STAGING_COLUMNS]
+        await session.execute(insert(DBDetect).from_select(STAGING_COLUMNS, select(*columns)))
+
+        if history.store:
+            await session.execute(insert(DBDetectHistory).from_select(STAGING_COLUMNS, select(*columns)))
+            history.store.rows_submitted += loaded
+
+        # ค่าเฉลี่ยรายวัน: GROUP BY api_key, วัน ครั้งเดียว แล้วบวกเข้ากับตัวสะสมเดิม
+        day = func.date(staging.c.timestamp)
+        daily = select(
+            staging.c.api_key,
+            day,
+            func.count(),
+            *[func.sum(staging.c[metric]) for metric in METRICS],
+            *[func.round(cast(func.avg(staging.c[metric]), Numeric), 2) for metric in METRICS],
+        ).group_by(staging.c.api_key, day)
+        stmt = pg_insert(DBDailyAverage).from_select(
+            [
+                "api_key",
+                "date",
+                "readings",
+                *[f"sum_{metric}" for metric in METRICS],
+                *[f"avg_{metric}" for metric in METRICS],
+            ],
+            daily,
+        )
+        result = await session.execute(accumulate_daily_conflict(stmt))
+        report["daily_averages"] = result.rowcount
+
+        # rollup ราย 5 นาทีและรายชั่วโมง
+        for name, (model, minutes) in ROLLUP_TIERS.items():
+            bucket = func.date_bin(
+                literal_column(f"interval '{minutes} minutes'"),
+                staging.c.timestamp,
+                literal_column("timestamp '2000-01-01'"),
+            )
+            rollup = select(
+                staging.c.api_key,
+                bucket,
+                func.count(),
+                *[func.sum(staging.c[metric]) for metric in METRICS],
+                *[func.min(staging.c[metric]) for metric in METRICS],
+                *[func.max(staging.c[metric]) for metric in METRICS],
+            ).group_by(staging.c.api_key, bucket)
+            stmt = pg_insert(model).from_select(
+                [
+                    "api_key",
+                    "bucket",
+                    "readings",
+                    *[f"sum_{metric}" for metric in METRICS],
+                    *[f"min_{metric}" for metric in METRICS],
+                    *[f"max_{metric}" for metric in METRICS],
+                ],
+                rollup,
+            )
+            result = await session.execute(accumulate_rollup_conflict(model, stmt))
+            report[model.__tablename__] = result.rowcount
+
+        # สรุปรายเดือน/รายปีของอุปกรณ์และช่วงวันที่ที่นำเข้า
+        api_keys = (await session.execute(select(staging.c.api_key).group_by(staging.c.api_key))).scalars().all()
+        await refresh_period_averages(session, list(api_keys), first.date(), last.date())
+        response_cache.stage_invalidation(session, api_keys)
+
+        # ข้อมูลล่าสุดของแต่ละอุปกรณ์ในไฟล์ (upsert จะไม่เขียนทับข้อมูลที่ใหม่กว่า)
+        newest = await session.execute(
+            select(*columns).distinct(staging.c.api_key).order_by(staging.c.api_key, staging.c.timestamp.desc())
+        )
+        newest = [CreateDetect.model_validate(dict(row._mapping)) for row in newest.all()]
+        shows = await upsert_showdetects(session, newest)
+        scores = await upsert_scores(session, newest)
+        if shows and latest.wanted():
+            detect_ids = await latest.latest_detect_ids(session, [show["api_key"] for show in shows])
+            latest.stage(session, latest.build_readings(shows, scores, detect_ids))
+
+    elapsed = timer.perf_counter() - started
+    report["seconds"] = round(elapsed, 2)
+    report["rows_per_second"] = round(rows / elapsed)
+    return report
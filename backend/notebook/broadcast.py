@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+
+def isoformat(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class Subscriber:
+    # ผู้รับหนึ่งราย (หนึ่งแท็บของ dashboard) พร้อมคิวข้อความที่รอส่ง
+    # api_keys=None คือรับทุกอุปกรณ์
+
+    def __init__(self, api_keys: set[str] | None, queue_size: int):
+        self.api_keys = api_keys
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def drop(self):
+        # ทิ้งข้อความที่ค้างทั้งหมดแล้วใส่ None เพื่อให้ตัวส่งหยุดและปิดการเชื่อมต่อ
+        self.dropped = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def send_all(self, websocket, send_timeout: float):
+        # ส่งข้อความในคิวจนกว่าจะถูก drop หรือส่งไม่ทันเวลา
+        while True:
+            text = await self.queue.get()
+            if text is None:
+                return
+            try:
+                await asyncio.wait_for(websocket.send_text(text), send_timeout)
+            except asyncio.TimeoutError:
+                self.dropped = True
+                return
+            except Exception:
+                # client ปิดการเชื่อมต่อไปแล้ว
+                return
+
+
+class Broadcaster:
+    # กระจายเหตุการณ์ (ข้อมูลใหม่, สถานะอุปกรณ์) ไปยัง dashboard ที่เชื่อมต่ออยู่
+    # แปลงแต่ละเหตุการณ์เป็น JSON ครั้งเดียว แล้วต่อเป็น array ต่อผู้รับ
+    # publish ไม่เคยรอผู้รับ: ผู้รับที่คิวเต็ม (อ่านช้า) จะถูกตัดการเชื่อมต่อ ingest จึงไม่ถูกหน่วง
+
+    def __init__(self, queue_size: int, send_timeout_seconds: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout_seconds
+        self._all: set[Subscriber] = set()  # ผู้รับทุกอุปกรณ์
+        self._by_api_key: dict[str, set[Subscriber]] = {}
+
+        # metrics
+        self.events = 0
+        self.messages = 0
+        self.dropped = 0
+
+    def subscribe(self, api_keys: set[str] | None) -> Subscriber:
+        subscriber = Subscriber(api_keys, self.queue_size)
+        self._add(subscriber)
+        return subscriber
+
+    def resubscribe(self, subscriber: Subscriber, api_keys: set[str] | None):
+        self._remove(subscriber)
+        subscriber.api_keys = api_keys
+        self._add(subscriber)
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._remove(subscriber)
+
+    def _add(self, subscriber: Subscriber):
+        if subscriber.api_keys is None:
+            self._all.add(subscriber)
+            return
+        for api_key in subscriber.api_keys:
+            self._by_api_key.setdefault(api_key, set()).add(subscriber)
+
+    def _remove(self, subscriber: Subscriber):
+        self._all.discard(subscriber)
+        for api_key in subscriber.api_keys or ():
+            subscribers = self._by_api_key.get(api_key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._by_api_key[api_key]
+
+    def has_subscribers(self) -> bool:
+        return bool(self._all or self._by_api_key)
+
+    def publish(self, events: list[tuple[str, dict]]):
+        # events: [(api_key, เหตุการณ์)] ส่งเป็นข้อความเดียวต่อผู้รับ
+        if not events or not self.has_subscribers():
+            return
+
+        encoded = [(api_key, json.dumps(event, default=isoformat)) for api_key, event in events]
+        self.events += len(encoded)
+
+        parts: dict[Subscriber, list[str]] = {}
+        if self._all:
+            everything = [text for _, text in encoded]
+            for subscriber in self._all:
+                parts[subscriber] = everything
+        for api_key, text in encoded:
+            for subscriber in self._by_api_key.get(api_key, ()):
+                parts.setdefault(subscriber, []).append(text)
+
+        for subscriber, texts in parts.items():
+            if subscriber.dropped:
+                continue
+            try:
+                subscriber.queue.put_nowait("[" + ",".join(texts) + "]")
+                self.messages += 1
+            except asyncio.QueueFull:
+                logger.warning("Dropping a slow dashboard subscriber.")
+                subscriber.drop()
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        subscribers = set(self._all)
+        for group in self._by_api_key.values():
+            subscribers.update(group)
+        return {
+            "subscribers": len(subscribers),
+            "subscribers_all_devices": len(self._all),
+            "queue_size": self.queue_size,
+            "send_timeout_seconds": self.send_timeout,
+            "events": self.events,
+            "messages": self.messages,
+            "dropped": self.dropped,
+        }
+
+
+def reading_event(reading, changed: list[str]) -> dict:
+    # ข้อมูลใหม่ของอุปกรณ์ (LatestReading) และค่าที่ระดับคุณภาพเปลี่ยนจากครั้งก่อน
+    return {
+        "type": "reading",
+        "api_key": reading.api_key,
+        "reading": reading.show().model_dump(),
+        "score": reading.score().model_dump() if reading.score_id is not None else None,
+        "quality_changed": changed,
+    }
+
+
+def status_event(api_key: str, device_status: str) -> dict:
+    return {"type": "status", "api_key": api_key, "device_status": device_status}
+
+
+# ตัวกระจายที่ใช้งานอยู่ (สร้างใน init_broadcaster)
+broadcaster: Broadcaster | None = None
+
+
+def init_broadcaster(settings):
+    global broadcaster
+
+    broadcaster = Broadcaster(
+        queue_size=settings.DASHBOARD_FEED_QUEUE_SIZE,
+        send_timeout_seconds=settings.DASHBOARD_FEED_SEND_TIMEOUT_SECONDS,
+    )
+
+
+def publish_status(api_key: str, device_status: str):
+    if broadcaster:
+        broadcaster.publish([(api_key, status_event(api_key, device_status))])
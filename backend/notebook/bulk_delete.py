@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import delete, func, select, tuple_
+
+from . import device_cache, history, latest, models, pagination, response_cache
+from .history import add_months
+from .ingest import refresh_period_averages
+from .models.daily_average import DBDailyAverage
+from .models.detect import DBDetect
+from .models.detect_history import DBDetectHistory
+from .models.device import DBDevice
+from .models.period_average import DBMonthlyAverage, DBYearlyAverage
+from .models.rollup import DBRollup5m, DBRollupHourly
+from .models.score import DBScore
+from .models.showdetect import DBShow
+
+logger = logging.getLogger(__name__)
+
+# จำนวนงานลบที่ทำเสร็จแล้วที่เก็บสถานะไว้ให้ดูย้อนหลัง
+MAX_FINISHED_JOBS = 100
+
+
+async def delete_chunked(model, condition, chunk_size: int, progress: dict | None = None, name: str = "") -> int:
+    # DELETE ... WHERE <primary key> IN (SELECT <primary key> ... WHERE condition LIMIT chunk_size)
+    # ลบทีละ chunk และ commit แยกกัน เพื่อไม่ให้ถือ lock นานและไม่โหลดข้อมูลขึ้นมาใน Python
+    keys = list(model.__table__.primary_key.columns)
+    key = keys[0] if len(keys) == 1 else tuple_(*keys)
+
+    removed = 0
+    while True:
+        async for session in models.get_session():
+            async with session:
+                chunk = select(*keys).where(condition).limit(chunk_size)
+                result = await session.execute(delete(model).where(key.in_(chunk)))
+                await session.commit()
+
+        removed += result.rowcount
+        if progress is not None:
+            progress[name] = removed
+        if result.rowcount < chunk_size:
+            return removed
+
+
+async def device_months(api_key: str) -> list[date]:
+    # เดือนที่อุปกรณ์มีข้อมูล (daily_averages, rollup รายชั่วโมง, detects และประวัติข้อมูลดิบ) เรียงจากเก่าไปใหม่
+    async for session in models.get_session():
+        async with session:
+            months = set()
+            for column in (DBDailyAverage.date, DBRollupHourly.bucket, DBDetect.timestamp):
+                month = func.date_trunc("month", column)
+                result = await session.execute(
+                    select(month).where(column.table.c.api_key == api_key).group_by(month)
+                )
+                months.update(value.date() for value in result.scalars().all())
+
+            if history.store:
+                months.update(await history.store.device_months(session, api_key))
+
+    return sorted(months)
+
+
+class DeleteJob:
+    # สถานะของงานลบข้อมูลที่ทำงานเบื้องหลัง
+
+    def __init__(self, kind: str, api_key: str, user_id: int | None = None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.api_key = api_key
+        self.user_id = user_id  # ผู้ใช้ที่สั่งลบ (ดูสถานะงานได้เฉพาะผู้สั่งและ superadmin)
+        self.status = "pending"  # pending, running, done, failed
+        self.removed: dict[str, int] = {}
+        self.error: str | None = None
+        self.created_at = datetime.now()
+        self.finished_at: datetime | None = None
+        self._task: asyncio.Task | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "api_key": self.api_key,
+            "user_id": self.user_id,
+            "status": self.status,
+            "removed": self.removed,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class DeviceDataDeleter:
+    # ลบข้อมูลของอุปกรณ์ด้วย DELETE แบบ set-based ทีละ chunk และนับจำนวนแถวที่ลบของแต่ละตาราง
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self.jobs: OrderedDict[str, DeleteJob] = OrderedDict()
+
+    async def delete_device(self, api_key: str, progress: dict | None = None) -> dict[str, int]:
+        # ลบอุปกรณ์ก่อน แล้วจึงลบข้อมูลทุกตาราง: หลังจากนี้ ingest ไม่รับข้อมูลของ api_key นี้
+        # (ingest ล็อกแถวอุปกรณ์ไว้ DELETE จึงรอ transaction ที่กำลังบันทึกข้อมูลของอุปกรณ์นี้ commit ก่อน)
+        # ถ้าล้มเหลวกลางทางสามารถสั่งลบซ้ำได้ (อุปกรณ์ที่ถูกลบแล้วแต่ยังมีข้อมูลเหลือ)
+        removed = {} if progress is None else progress
+        await delete_chunked(DBDevice, DBDevice.api_key == api_key, self.chunk_size, removed, "devices")
+        self._forget(api_key)
+
+        for name, model in (
+            ("showdetects", DBShow),
+            ("scores", DBScore),
+            ("yearly_averages", DBYearlyAverage),
+            ("monthly_averages", DBMonthlyAverage),
+            ("daily_averages", DBDailyAverage),
+            ("rollups_hourly", DBRollupHourly),
+            ("rollups_5m", DBRollup5m),
+            ("detects", DBDetect),
+        ):
+            await delete_chunked(model, model.api_key == api_key, self.chunk_size, removed, name)
+
+        if history.store:
+            await delete_chunked(
+                DBDetectHistory, DBDetectHistory.api_key == api_key, self.chunk_size, removed, "detect_history"
+            )
+
+        # request ที่อ่านข้อมูลระหว่างการลบอาจเก็บข้อมูลเก่ากลับเข้าแคช
+        self._forget(api_key)
+        return removed
+
+    def _forget(self, api_key: str):
+        device_cache.invalidate(api_key)
+        pagination.invalidate("devices")
+        if latest.store:
+            latest.store.remove(api_key)
+        response_cache.invalidate(api_key)
+
+    async def delete_before(self, api_key: str, cutoff: date, progress: dict | None = None) -> dict[str, int]:
+        # ลบข้อมูลของอุปกรณ์ที่เก่ากว่า cutoff (วันแรกของเดือนถัดจากเดือนสุดท้ายที่ลบ)
+        removed = {} if progress is None else progress
+        cutoff_at = datetime.combine(cutoff, time.min)
+
+        await delete_chunked(
+            DBDailyAverage,
+            (DBDailyAverage.api_key == api_key) & (DBDailyAverage.date < cutoff),
+            self.chunk_size,
+            removed,
+            "daily_averages",
+        )
+
+        # สรุปรายเดือน/รายปี: ลบเดือนที่ไม่มีข้อมูลรายวันแล้ว และคำนวณปีที่ได้รับผลกระทบใหม่
+        async for session in models.get_session():
+            async with session:
+                await refresh_period_averages(session, [api_key], date.min, cutoff - timedelta(days=1), prune=True)
+                await session.commit()
+        for name, model in (("rollups_hourly", DBRollupHourly), ("rollups_5m", DBRollup5m)):
+            await delete_chunked(
+                model,
+                (model.api_key == api_key) & (model.bucket < cutoff_at),
+                self.chunk_size,
+                removed,
+                name,
+            )
+        await delete_chunked(
+            DBDetect,
+            (DBDetect.api_key == api_key) & (DBDetect.timestamp < cutoff_at),
+            self.chunk_size,
+            removed,
+            "detects",
+        )
+        if latest.store:
+            latest.store.forget_detects_before(cutoff_at, api_key)
+        response_cache.invalidate(api_key)
+
+        # ประวัติข้อมูลดิบ: เงื่อนไข timestamp ทำให้อ่านเฉพาะ partition ของเดือนที่ลบ
+        if history.store:
+            await delete_chunked(
+                DBDetectHistory,
+                (DBDetectHistory.api_key == api_key) & (DBDetectHistory.timestamp < cutoff_at),
+                self.chunk_size,
+                removed,
+                "detect_history",
+            )
+
+        return removed
+
+    async def delete_months(self, api_key: str, months: list[date], progress: dict | None = None) -> dict[str, int]:
+        return await self.delete_before(api_key, add_months(months[-1], 1), progress)
+
+    def submit(self, kind: str, api_key: str, run, user_id: int | None = None) -> DeleteJob:
+        # เริ่มงานลบเบื้องหลัง run(progress) และคืนสถานะงานทันที
+        job = DeleteJob(kind, api_key, user_id)
+        job._task = asyncio.create_task(self._run(job, run))
+        self.jobs[job.id] = job
+        self._trim()
+        return job
+
+    def get_job(self, job_id: str) -> DeleteJob | None:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: DeleteJob, run):
+        job.status = "running"
+        try:
+            await run(job.removed)
+            job.status = "done"
+        except Exception as error:
+            logger.exception("Delete job %s failed.", job.id)
+            job.status = "failed"
+            job.error = str(error)
+        finally:
+            job.finished_at = datetime.now()
+            job._task = None
+            self._trim()
+
+    def _trim(self):
+        # ทิ้งสถานะของงานที่เสร็จแล้วที่เก่าที่สุด
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_at]
+        for job_id in finished[: max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self.jobs[job_id]
+
+
+# ตัวลบข้อมูลที่ใช้งานอยู่
+deleter: DeviceDataDeleter | None = None
+
+
+def init_deleter(settings):
+    global deleter
+
+    deleter = DeviceDataDeleter(chunk_size=settings.RETENTION_CHUNK_SIZE)
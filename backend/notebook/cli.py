@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import sys
+from datetime import date
+
+from . import config, history, models
+from .backfill import BackfillError, backfill
+from .ingest import rebuild_daily_averages
+
+
+async def run_rebuild_daily_averages(start: date, end: date):
+    models.init_db(config.get_settings())
+
+    async for session in models.get_session():
+        async with session:
+            rebuilt = await rebuild_daily_averages(session, start, end)
+            await session.commit()
+
+    await models.engine.dispose()
+    print(f"Rebuilt {rebuilt} daily averages from {start} to {end}.")
+
+
+def print_progress(progress: dict):
+    print(f"Loaded {progress['rows']} rows in {progress['seconds']}s ({progress['rows_per_second']} rows/s)")
+
+
+async def run_backfill(path: str, format: str, api_key: str | None):
+    settings = config.get_settings()
+    models.init_db(settings)
+    history.init_history(settings)
+    if history.store:
+        await history.store.load()
+
+    try:
+        with open(path, newline="", encoding="utf-8") as file:
+            async for session in models.get_session():
+                async with session:
+                    report = await backfill(session, file, format, api_key, progress=print_progress)
+                    await session.commit()
+    finally:
+        await models.engine.dispose()
+
+    print(
+        f"Backfilled {report['loaded']} detects for {report['devices']} devices"
+        f" ({report['duplicates']} duplicates skipped) in {report['seconds']}s"
+        f" ({report['rows_per_second']} rows/s)."
+    )
+    print("Running API servers keep the latest readings in memory: POST /internal/latest-store/reload to pick up newer ones.")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m notebook.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # สร้างตัวสะสมค่าเฉลี่ยรายวันใหม่จากข้อมูล detect ดิบ
+    rebuild = subparsers.add_parser(
+        "rebuild-daily-averages", help="Rebuild daily average accumulators from raw detects."
+    )
+    rebuild.add_argument("--start", type=date.fromisoformat, required=True)
+    rebuild.add_argument("--end", type=date.fromisoformat, required=True)
+
+    # นำเข้าข้อมูลย้อนหลังจากไฟล์ CSV / NDJSON พร้อมคำนวณตารางสรุปทั้งหมด
+    load = subparsers.add_parser(
+        "backfill", help="Load historical detects from a CSV or NDJSON file and update derived tables."
+    )
+    load.add_argument("file")
+    load.add_argument("--format", choices=["csv", "ndjson"])
+    load.add_argument("--api-key", help="Device API key for every row (when the file has no api_key column).")
+
+    args = parser.parse_args()
+
+    if args.command == "rebuild-daily-averages":
+        if args.end < args.start:
+            parser.error("--end must not be earlier than --start")
+        asyncio.run(run_rebuild_daily_averages(args.start, args.end))
+
+    if args.command == "backfill":
+        format = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+        try:
+            asyncio.run(run_backfill(args.file, format, args.api_key))
+        except BackfillError as error:
+            sys.exit(f"Backfill failed: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import struct
+from datetime import datetime
+
+import numpy as np
+
+from .ingest import METRICS
+from .models.detect import CreateDetect
+
+# Content-Type ของ payload แบบ binary (แทน JSON ของ CreateDetect)
+BINARY_CONTENT_TYPE = "application/vnd.aircheck.readings"
+
+FRAME_VERSION = 1
+
+# header ของ frame (little-endian): version (uint8), padding, จำนวนข้อมูล (uint16), seq (uint32)
+FRAME_HEADER = struct.Struct("<BxHI")
+
+# จำนวนข้อมูลสูงสุดต่อ frame เท่ากับขนาด batch สูงสุดของ /detects/batch (header รองรับได้ถึง 65535)
+MAX_FRAME_RECORDS = 10000
+
+# ข้อมูลแต่ละชุดขนาด 44 bytes (little-endian):
+# api_key 16 bytes (hex 32 ตัวอักษรแปลงกลับเป็น bytes), ค่าที่วัดได้ 6 ค่าเป็น float32 ตามลำดับใน METRICS
+# และ timestamp เป็นวินาทีจาก epoch ตามนาฬิกาของอุปกรณ์ (uint32) เช่นเดียวกับ timestamp ใน JSON
+RECORD = struct.Struct("<16s6fI")
+RECORD_DTYPE = np.dtype([("api_key", "V16"), ("values", "<f4", (len(METRICS),)), ("seconds", "<u4")])
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(detects: list[CreateDetect], seq: int = 0) -> bytes:
+    # สำหรับ client, gateway และ benchmark
+    records = [
+        RECORD.pack(
+            bytes.fromhex(detect.api_key),
+            *[getattr(detect, metric) for metric in METRICS],
+            int((detect.timestamp.replace(tzinfo=None) - EPOCH).total_seconds()),
+        )
+        for detect in detects
+    ]
+    return FRAME_HEADER.pack(FRAME_VERSION, len(detects), seq) + b"".join(records)
+
+
+def decode_frame(data: bytes) -> tuple[int, list[CreateDetect]]:
+    # แปลง frame กลับเป็น (seq, รายการ CreateDetect) โดยไม่ผ่านการ parse JSON
+    if len(data) < FRAME_HEADER.size:
+        raise FrameError("The frame is too short.")
+
+    version, count, seq = FRAME_HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version: {version}.")
+    if count > MAX_FRAME_RECORDS:
+        raise FrameError(f"The frame contains more than {MAX_FRAME_RECORDS} records.")
+    if len(data) != FRAME_HEADER.size + count * RECORD.size:
+        raise FrameError("The frame length does not match its record count.")
+
+    # แปลงทั้ง frame ครั้งเดียวด้วย numpy แทนการแปลงทีละข้อมูล
+    records = np.frombuffer(data, dtype=RECORD_DTYPE, count=count, offset=FRAME_HEADER.size)
+    values = records["values"]
+    if not np.isfinite(values).all():
+        raise FrameError("The frame contains a non-finite value.")
+
+    # ปัดทศนิยม 2 ตำแหน่งเหมือนค่าที่ ESP32 ส่งมาใน JSON (float32 -> float)
+    values = np.round(values.astype(np.float64), 2).tolist()
+    # api_key ทั้ง frame เป็น hex ครั้งเดียว แล้วตัดทีละ 32 ตัวอักษร (V16 ไม่ตัด byte 0 ท้าย key ทิ้งแบบ S16)
+    api_keys = records["api_key"].tobytes().hex()
+    api_keys = [api_keys[start:start + 32] for start in range(0, len(api_keys), 32)]
+    timestamps = records["seconds"].astype("datetime64[s]").astype("datetime64[us]").tolist()
+
+    # ชนิดของทุกค่าถูกกำหนดโดย layout ของ frame แล้ว จึงสร้างโดยไม่ผ่านการ validate ของ pydantic
+    detects = [
+        CreateDetect.model_construct(
+            api_key=api_key,
+            pm2_5=pm2_5,
+            pm10=pm10,
+            co2=co2,
+            tvoc=tvoc,
+            humidity=humidity,
+            temperature=temperature,
+            timestamp=timestamp,
+        )
+        for api_key, (pm2_5, pm10, co2, tvoc, humidity, temperature), timestamp in zip(
+            api_keys, values, timestamps
+        )
+    ]
+    return seq, detects
@@ -1,8 +1,77 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     SQLDB_URL: str
 
+    # session ของผู้ใช้ (JWT ในคุกกี้) ต้องตั้ง SESSION_SECRET_KEY ให้เหมือนกันทุก worker
+    SESSION_SECRET_KEY: str = ""  # จำเป็น: ระบบไม่เริ่มทำงานถ้าว่าง
+    SESSION_ALLOW_RANDOM_KEY: bool = False  # สำหรับพัฒนาในเครื่อง: ว่าง = สุ่มใหม่ทุกครั้งที่เริ่มระบบ (ผู้ใช้ต้อง login ใหม่)
+    SESSION_EXPIRE_MINUTES: int = 720  # อายุของ session
+    USER_CACHE_SIZE: int = 1000  # จำนวนผู้ใช้สูงสุดในแคช
+    USER_CACHE_TTL_SECONDS: int = 30  # อายุของข้อมูลผู้ใช้ในแคช
+
+    # engine และ connection pool (ต่อ worker: connection สูงสุด = DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    DB_ECHO: bool = False  # log SQL ทุกคำสั่ง (ใช้ตอน debug เท่านั้น)
+    DB_POOL_SIZE: int = 5  # connection ที่เปิดค้างไว้
+    DB_MAX_OVERFLOW: int = 10  # connection ที่เปิดเพิ่มได้ชั่วคราวเมื่อ pool เต็ม
+    DB_POOL_TIMEOUT_SECONDS: float = 30  # เวลารอ connection ก่อนแจ้ง error
+    DB_POOL_RECYCLE_SECONDS: int = -1  # เปิด connection ใหม่เมื่ออายุเกินกี่วินาที (-1 = ไม่เปิดใหม่)
+    DB_POOL_PRE_PING: bool = False  # ตรวจ connection ก่อนใช้ทุกครั้ง (เพิ่ม round trip ต่อ checkout)
+    DB_STATEMENT_CACHE_SIZE: int = 100  # prepared statement ที่แคชต่อ connection ของ asyncpg
+
+    # โหมดรับข้อมูลจากอุปกรณ์: "sync" บันทึกทันที, "queue" เข้าคิวแล้วทยอยบันทึกเป็นชุด
+    INGEST_MODE: Literal["sync", "queue"] = "sync"
+    INGEST_QUEUE_SIZE: int = 10000  # จำนวนข้อมูลสูงสุดที่รอในคิว
+    INGEST_BATCH_SIZE: int = 500  # บันทึกเมื่อครบจำนวนนี้
+    INGEST_FLUSH_INTERVAL_MS: int = 200  # หรือเมื่อครบเวลานี้
+    INGEST_FLUSH_RETRIES: int = 3  # ลองบันทึกใหม่เมื่อฐานข้อมูลผิดพลาดชั่วคราว
+    INGEST_RETRY_BACKOFF_MS: int = 100  # เวลารอก่อนลองใหม่ครั้งแรก (เพิ่มเท่าตัวทุกครั้ง)
+
+    # การลบข้อมูลเก่าอัตโนมัติ (0 = ปิดการทำงาน)
+    RETENTION_INTERVAL_MINUTES: int = 60  # ความถี่ในการลบข้อมูลเก่า
+    RETENTION_CHUNK_SIZE: int = 5000  # จำนวนแถวสูงสุดต่อการลบหนึ่งครั้ง
+    DETECT_RETENTION_DAYS: int = 0  # เก็บ detects ย้อนหลังกี่วันนอกจากวันนี้
+    DAILY_AVERAGE_RETENTION_MONTHS: int = 0  # เก็บ daily_averages กี่เดือนล่าสุด (0 = เก็บทั้งหมด)
+    ROLLUP_5M_RETENTION_DAYS: int = 0  # เก็บ rollup ราย 5 นาทีกี่วัน (0 = เก็บทั้งหมด)
+    ROLLUP_HOURLY_RETENTION_DAYS: int = 0  # เก็บ rollup รายชั่วโมงกี่วัน (0 = เก็บทั้งหมด)
+
+    # เก็บประวัติข้อมูลดิบทั้งหมดใน detect_history (แบ่ง partition รายเดือน)
+    DETECT_HISTORY_ENABLED: bool = False
+    DETECT_HISTORY_MONTHS_AHEAD: int = 2  # สร้าง partition ล่วงหน้ากี่เดือน
+    DETECT_HISTORY_RETENTION_MONTHS: int = 0  # เก็บกี่เดือนล่าสุด ลบทีละ partition (0 = เก็บทั้งหมด)
+
+    # การส่งออกข้อมูล (/export)
+    EXPORT_PAGE_SIZE: int = 5000  # จำนวนแถวที่อ่านจากฐานข้อมูลต่อครั้ง
+
+    # ข้อมูลล่าสุดของทุกอุปกรณ์ในหน่วยความจำ (/detects/{api_key}, /scores/{api_key}, /showdetect/all)
+    LATEST_STORE_ENABLED: bool = True
+    LATEST_STORE_REFRESH_SECONDS: int = 0  # โหลดใหม่จากฐานข้อมูลทุกกี่วินาที ตั้งค่าเมื่อรันหลาย worker (0 = ไม่โหลดใหม่)
+
+    # /dashboard/snapshot
+    DASHBOARD_TREND_DAYS: int = 7  # ค่าเฉลี่ยรายวันย้อนหลังกี่วัน (รวมวันนี้)
+    DASHBOARD_CACHE_SECONDS: float = 2  # ใช้ snapshot เดิมซ้ำกี่วินาที (0 = สร้างใหม่ทุกครั้ง)
+
+    # /ws/dashboard
+    DASHBOARD_FEED_QUEUE_SIZE: int = 100  # ข้อความที่รอส่งได้ต่อ client ก่อนถูกตัดการเชื่อมต่อ
+    DASHBOARD_FEED_SEND_TIMEOUT_SECONDS: float = 5  # เวลาสูงสุดในการส่งหนึ่งข้อความ
+
+    # แคช response ของ /avg/daily_averages, /devices/timestamps, /scores และ /showdetect/all (ETag / 304)
+    RESPONSE_CACHE_SIZE: int = 2000  # จำนวน response สูงสุด (0 = ปิด)
+    RESPONSE_CACHE_TTL_SECONDS: int = 0  # อายุสูงสุดของ response ตั้งค่าเมื่อรันหลาย worker (0 = อยู่จนถูกล้างเมื่อข้อมูลเปลี่ยน)
+
+    # รวม request ที่เหมือนกันซึ่งเข้ามาพร้อมกันเป็น query เดียว (/avg/daily_averages, /scores)
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # การแบ่งหน้า (/devices/all, /users/all, /showdetect/all)
+    PAGINATION_COUNT_TTL_SECONDS: int = 5  # แคชจำนวนแถวทั้งหมดกี่วินาที (0 = นับทุกครั้ง)
+    PAGINATION_ESTIMATE_ROWS: int = 0  # ใช้ค่าประมาณจาก pg_class เมื่อตารางมีตั้งแต่กี่แถว (0 = นับจริงเสมอ)
+
+    # แคชข้อมูลอุปกรณ์ตาม api_key
+    DEVICE_CACHE_SIZE: int = 10000  # จำนวนอุปกรณ์สูงสุดในแคช
+    DEVICE_CACHE_TTL_SECONDS: int = 60  # อายุของข้อมูลอุปกรณ์ที่พบ
+    DEVICE_CACHE_NEGATIVE_TTL_SECONDS: int = 30  # อายุของ api_key ที่ไม่พบ
+
     model_config = SettingsConfigDict(
         env_file=".env", validate_assignment=True, extra="allow"
     )
@@ -0,0 +1,147 @@
+import hashlib
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlmodel import select
+from sqlalchemy.orm import noload
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import latest, pagination
+from .ingest import METRICS
+from .models.daily_average import DBDailyAverage, DailyAverageColumns
+from .models.dashboard import DashboardDevice, DashboardSnapshot
+from .models.device import DBDevice, DeviceRead
+from .models.score import DBScore, ScoreRead
+from .models.showdetect import DBShow, ShowRead
+
+AVERAGE_COLUMNS = [getattr(DBDailyAverage, f"avg_{metric}") for metric in METRICS]
+
+# จำนวนวันย้อนหลังของ trend (รวมวันนี้)
+trend_days = 7
+
+
+async def load_latest(session: AsyncSession, api_keys: list[str]) -> dict[str, tuple[ShowRead, ScoreRead | None]]:
+    # ข้อมูลล่าสุดและระดับคุณภาพของอุปกรณ์ในหน้า จากหน่วยความจำ หรือ query เดียว (showdetects LEFT JOIN scores)
+    if latest.store:
+        await latest.store.ensure_fresh()
+        readings = {}
+        for api_key in api_keys:
+            reading = latest.store.get(api_key)
+            if reading:
+                readings[api_key] = (reading.show(), reading.score() if reading.score_id is not None else None)
+        return readings
+
+    result = await session.execute(
+        select(DBShow, DBScore)
+        .outerjoin(DBScore, DBScore.api_key == DBShow.api_key)
+        .where(DBShow.api_key.in_(api_keys))
+    )
+    return {
+        show.api_key: (ShowRead.model_validate(show), ScoreRead.model_validate(score) if score else None)
+        for show, score in result.all()
+    }
+
+
+async def load_trends(session: AsyncSession, api_keys: list[str], start) -> dict[str, DailyAverageColumns]:
+    # ค่าเฉลี่ยรายวันตั้งแต่ start ของทุกอุปกรณ์ในหน้าด้วย query เดียว (ใช้ index (api_key, date))
+    result = await session.execute(
+        select(DBDailyAverage.api_key, DBDailyAverage.date, *AVERAGE_COLUMNS)
+        .where(DBDailyAverage.api_key.in_(api_keys))
+        .where(DBDailyAverage.date >= start)
+        .order_by(DBDailyAverage.api_key, DBDailyAverage.date)
+    )
+    trends = {
+        api_key: {"date": [], **{column.key: [] for column in AVERAGE_COLUMNS}} for api_key in api_keys
+    }
+    for api_key, day, *values in result.all():
+        trend = trends[api_key]
+        trend["date"].append(day)
+        for column, value in zip(AVERAGE_COLUMNS, values):
+            trend[column.key].append(value)
+    return {api_key: DailyAverageColumns(**trend) for api_key, trend in trends.items()}
+
+
+async def build_snapshot(session: AsyncSession, page: int, size: int, cursor: str | None = None) -> DashboardSnapshot:
+    trend_start = datetime.now().date() - timedelta(days=trend_days - 1)
+
+    devices = await pagination.paginate(
+        session, select(DBDevice).options(noload(DBDevice.user)), DBDevice.id, "devices", page, size, cursor
+    )
+    api_keys = [device.api_key for device in devices.items]
+    readings = await load_latest(session, api_keys) if api_keys else {}
+    trends = await load_trends(session, api_keys, trend_start) if api_keys else {}
+
+    return DashboardSnapshot(
+        trend_start=trend_start,
+        devices=[
+            DashboardDevice(
+                device=DeviceRead.model_validate(device),
+                latest=readings.get(device.api_key, (None, None))[0],
+                score=readings.get(device.api_key, (None, None))[1],
+                trend=trends[device.api_key],
+            )
+            for device in devices.items
+        ],
+        total=devices.total,
+        page=devices.page,
+        size=devices.size,
+        total_pages=devices.total_pages,
+        next_cursor=devices.next_cursor,
+    )
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class SnapshotCache:
+    # เก็บ snapshot ที่ encode เป็น JSON แล้วพร้อม ETag ตาม (page, size, cursor) เป็นเวลา ttl_seconds
+    # ทุก client ที่ poll ภายในช่วงนี้ได้ body เดิม และได้ 304 ถ้า ETag ตรงกัน
+
+    def __init__(self, ttl_seconds: float, maxsize: int = 64):
+        self.ttl = ttl_seconds
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple, tuple[float, bytes, str]] = OrderedDict()
+
+        # metrics
+        self.hits = 0
+        self.builds = 0
+        self.not_modified = 0
+
+    def get(self, key: tuple) -> tuple[bytes, str] | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def set(self, key: tuple, body: bytes) -> tuple[bytes, str]:
+        etag = make_etag(body)
+        self.builds += 1
+        if self.ttl > 0:
+            self._entries[key] = (time.monotonic() + self.ttl, body, etag)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return body, etag
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "builds": self.builds,
+            "not_modified": self.not_modified,
+        }
+
+
+# แคชที่ใช้งานอยู่ (สร้างใน init_dashboard)
+cache: SnapshotCache | None = None
+
+
+def init_dashboard(settings):
+    global cache, trend_days
+
+    trend_days = settings.DASHBOARD_TREND_DAYS
+    cache = SnapshotCache(ttl_seconds=settings.DASHBOARD_CACHE_SECONDS)
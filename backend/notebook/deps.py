@@ -3,23 +3,32 @@
 from fastapi import Depends, HTTPException, Request, status
 from typing import Annotated
 from notebook.models.users import *
-from . import models
+from . import auth, models
+
+async def get_session_user(request: Request, session: models.AsyncSession) -> UserRead:
+    # ตรวจ session token จากคุกกี้ แล้วอ่านผู้ใช้จากแคช (query เฉพาะเมื่อไม่อยู่ในแคช)
+    token = request.cookies.get(auth.SESSION_COOKIE)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in.")
+    try:
+        claims = auth.decode_token(token)
+    except auth.SessionError as error:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(error))
+
+    user = await auth.get_user(session, claims["sub"])
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found.")
+    # บทบาทเปลี่ยนหลัง login: ต้อง login ใหม่
+    if user.role != claims.get("role"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session expired. Please login again.")
+    return user
 
 # ฟังก์ชันนี้จะเช็คเฉพาะผู้ใช้ที่สถานะเป็น "active" เท่านั้น
 async def get_current_active_user(
     request: Request,  # เพิ่ม request เพื่อดึงคุกกี้
     session: Annotated[models.AsyncSession, Depends(models.get_session)],
 ) -> UserRead:
-    # ดึง user_id จากคุกกี้
-    user_id = request.cookies.get("user_id")
-    #logger.info(f"Cookie user_id: {user_id}")
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in.")
-    
-    # ดึงข้อมูลผู้ใช้จากฐานข้อมูล
-    user = await session.get(DBUser, int(user_id))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
+    user = await get_session_user(request, session)
     if user.status != "active":
         raise HTTPException(status_code=400, detail="User is not active.")
     return user
@@ -29,15 +38,7 @@ async def get_current_active_superuser(
     request: Request,  # เพิ่ม request เพื่อดึงคุกกี้
     session: Annotated[models.AsyncSession, Depends(models.get_session)],
 ) -> UserRead:
-    # ดึง user_id จากคุกกี้
-    user_id = request.cookies.get("user_id")
-    if not user_id:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not logged in.")
-    
-    # ดึงข้อมูลผู้ใช้จากฐานข้อมูล
-    user = await session.get(DBUser, int(user_id))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found.")
+    user = await get_session_user(request, session)
     if user.role != "superadmin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -48,4 +49,4 @@ async def get_current_active_superuser(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Superuser is not active.",
         )
-    return user
\ No newline at end of file
+    return user
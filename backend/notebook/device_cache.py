@@ -0,0 +1,115 @@
+import time
+from collections import OrderedDict
+
+from sqlalchemy.orm import noload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models.device import DBDevice, DeviceRead
+
+
+class DeviceCache:
+    # แคช LRU + TTL ของข้อมูลอุปกรณ์ตาม api_key
+    # เก็บ api_key ที่ไม่พบด้วย (negative cache) เพื่อไม่ให้ key ผิดๆ ยิง query ซ้ำๆ
+
+    def __init__(self, maxsize: int, ttl_seconds: int, negative_ttl_seconds: int):
+        self._entries: OrderedDict[str, tuple[float, DeviceRead | None]] = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+
+        # metrics
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, api_key: str) -> tuple[bool, DeviceRead | None]:
+        # คืนค่า (พบในแคชหรือไม่, ข้อมูลอุปกรณ์หรือ None ถ้าเป็น api_key ที่ไม่มีอยู่)
+        entry = self._entries.get(api_key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[api_key]
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(api_key)
+        if entry[1] is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return True, entry[1]
+
+    def set(self, api_key: str, device: DeviceRead | None):
+        ttl = self.ttl if device is not None else self.negative_ttl
+        self._entries[api_key] = (time.monotonic() + ttl, device)
+        self._entries.move_to_end(api_key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, api_key: str):
+        if self._entries.pop(api_key, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# แคชที่ใช้งานอยู่ (สร้างใน init_cache)
+cache: DeviceCache | None = None
+
+
+def init_cache(settings):
+    global cache
+
+    cache = DeviceCache(
+        maxsize=settings.DEVICE_CACHE_SIZE,
+        ttl_seconds=settings.DEVICE_CACHE_TTL_SECONDS,
+        negative_ttl_seconds=settings.DEVICE_CACHE_NEGATIVE_TTL_SECONDS,
+    )
+
+
+def invalidate(api_key: str):
+    if cache:
+        cache.invalidate(api_key)
+
+
+async def get_devices(session: AsyncSession, api_keys: set[str]) -> dict[str, DeviceRead]:
+    # ค้นหาอุปกรณ์จากแคชก่อน แล้ว query เฉพาะ api_key ที่ยังไม่อยู่ในแคชด้วย query เดียว
+    devices = {}
+    missing = set()
+    for api_key in api_keys:
+        found, device = cache.get(api_key) if cache else (False, None)
+        if not found:
+            missing.add(api_key)
+        elif device is not None:
+            devices[api_key] = device
+
+    if missing:
+        result = await session.exec(
+            select(DBDevice).options(noload(DBDevice.user)).where(DBDevice.api_key.in_(missing))
+        )
+        loaded = {dbdevice.api_key: DeviceRead.model_validate(dbdevice) for dbdevice in result.all()}
+        for api_key in missing:
+            if cache:
+                cache.set(api_key, loaded.get(api_key))
+        devices.update(loaded)
+
+    return devices
+
+
+async def get_device(session: AsyncSession, api_key: str) -> DeviceRead | None:
+    devices = await get_devices(session, {api_key})
+    return devices.get(api_key)
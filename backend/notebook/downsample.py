@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: เลือก threshold จุดที่รักษารูปร่างของกราฟไว้ (คืนเป็น index ที่เลือก)
+    # y มีได้หลายค่าต่อจุด (n, k) ทุกค่าใช้แกน x ร่วมกัน จึงปรับแต่ละค่าให้อยู่ในช่วง [0, 1]
+    # แล้วเลือกจุดที่ผลรวมพื้นที่สามเหลี่ยมของทุกค่ามากที่สุดในแต่ละ bucket
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 3:
+        return np.array([0, n - 1][:threshold])
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64).reshape(n, -1)
+    low = y.min(axis=0)
+    span = y.max(axis=0) - low
+    span[span == 0] = 1
+    y = (y - low) / span
+
+    # จุดแรกและจุดสุดท้ายถูกเลือกเสมอ จุดที่เหลือแบ่งเป็น threshold - 2 bucket
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # จุดที่สามคือค่าเฉลี่ยของ bucket ถัดไป (bucket สุดท้ายใช้จุดสุดท้าย)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean(axis=0)
+
+        # พื้นที่สามเหลี่ยม (a, จุดใน bucket, ค่าเฉลี่ย bucket ถัดไป) ของทุกจุดใน bucket พร้อมกัน
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end, None]) * (avg_y - y[a])
+        ).sum(axis=1)
+
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
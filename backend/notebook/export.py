@@ -0,0 +1,199 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, tuple_
+
+from . import history, models
+from .ingest import METRICS, day_bounds
+from .models.daily_average import DBDailyAverage
+from .models.detect import DBDetect
+from .models.detect_history import DBDetectHistory
+
+try:
+    import pyarrow as pa
+except ImportError:  # ติดตั้งด้วย poetry install -E arrow
+    pa = None
+
+# จำนวนแถวที่อ่านต่อหนึ่งหน้า (ถือ connection เฉพาะตอนอ่านหน้า ไม่ถือระหว่างส่งให้ client)
+page_size = 5000
+
+
+class ExportSource(NamedTuple):
+    columns: list  # คอลัมน์ที่ส่งออกตามลำดับ
+    keys: list  # คอลัมน์สำหรับเรียงลำดับและแบ่งหน้าแบบ keyset (unique ภายในอุปกรณ์)
+    api_key: object
+    day: object  # คอลัมน์ที่ใช้กรองช่วงวันที่
+    raw: bool  # True = day เป็น timestamp
+
+
+def export_source(table: str) -> ExportSource:
+    if table == "daily_averages":
+        return ExportSource(
+            columns=[
+                DBDailyAverage.date,
+                DBDailyAverage.readings,
+                *[getattr(DBDailyAverage, f"avg_{metric}") for metric in METRICS],
+            ],
+            keys=[DBDailyAverage.date],
+            api_key=DBDailyAverage.api_key,
+            day=DBDailyAverage.date,
+            raw=False,
+        )
+
+    # ข้อมูลดิบ: โหมดเก็บประวัติอ่านจาก detect_history (ข้อมูลครบทุกเดือน) นอกนั้นอ่านจาก detects
+    model = DBDetectHistory if history.store else DBDetect
+    keys = [model.timestamp] if history.store else [model.timestamp, model.id]
+    return ExportSource(
+        columns=[model.timestamp, *[getattr(model, metric) for metric in METRICS]],
+        keys=keys,
+        api_key=model.api_key,
+        day=model.timestamp,
+        raw=True,
+    )
+
+
+async def read_pages(source: ExportSource, api_key: str, start: date, end: date):
+    # อ่านทีละหน้าด้วย server-side cursor (yield_per) ใน session สั้นๆ ของแต่ละหน้า
+    # แล้วคืน connection ก่อนส่งข้อมูลหน้านั้นออกไป client ที่อ่านช้าจึงไม่ถือ connection ใน pool ไว้
+    if source.raw:
+        range_start, range_end = day_bounds(start, end)
+    else:
+        range_start, range_end = start, date.fromordinal(end.toordinal() + 1)
+
+    stmt = (
+        select(*source.columns, *source.keys)
+        .where(source.api_key == api_key)
+        .where(source.day >= range_start)
+        .where(source.day < range_end)
+        .order_by(*source.keys)
+        .limit(page_size)
+        .execution_options(yield_per=1000)
+    )
+    width = len(source.columns)
+    key = source.keys[0] if len(source.keys) == 1 else tuple_(*source.keys)
+
+    last = None
+    while True:
+        page = []
+        async for session in models.get_session():
+            async with session:
+                result = await session.stream(stmt if last is None else stmt.where(key > last))
+                async for partition in result.partitions():
+                    page.extend(partition)
+
+        if page:
+            keys = page[-1][width:]
+            last = keys[0] if len(keys) == 1 else tuple(keys)
+            yield [row[:width] for row in page]
+
+        if len(page) < page_size:
+            return
+
+
+def isoformat(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, source: ExportSource):
+        self.names = [column.key for column in source.columns]
+
+    def _write(self, rows) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        return buffer.getvalue().encode()
+
+    def header(self) -> bytes:
+        return self._write([self.names])
+
+    def encode(self, rows) -> bytes:
+        return self._write([isoformat(value) for value in row] for row in rows)
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self, source: ExportSource):
+        self.names = [column.key for column in source.columns]
+
+    def header(self) -> bytes:
+        return b""
+
+    def encode(self, rows) -> bytes:
+        return "".join(
+            json.dumps(dict(zip(self.names, row)), default=isoformat) + "\n" for row in rows
+        ).encode()
+
+    def footer(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    # Arrow IPC stream: schema หนึ่งครั้ง แล้วหนึ่ง record batch ต่อหน้า
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrow"
+
+    ARROW_TYPES = {
+        datetime: "timestamp",
+        date: "date",
+        int: "int",
+        float: "float",
+    }
+
+    def __init__(self, source: ExportSource):
+        types = {"timestamp": pa.timestamp("us"), "date": pa.date32(), "int": pa.int64(), "float": pa.float64()}
+        self.schema = pa.schema(
+            [(column.key, types[self.ARROW_TYPES[column.type.python_type]]) for column in source.columns]
+        )
+        self._buffer = io.BytesIO()
+        self._writer = None
+
+    def _take(self) -> bytes:
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def header(self) -> bytes:
+        self._writer = pa.ipc.new_stream(self._buffer, self.schema)
+        return self._take()
+
+    def encode(self, rows) -> bytes:
+        columns = list(zip(*rows))
+        arrays = [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        return self._take()
+
+    def footer(self) -> bytes:
+        self._writer.close()
+        return self._take()
+
+
+ENCODERS = {
+    "csv": CsvEncoder,
+    "ndjson": NdjsonEncoder,
+    "arrow": ArrowEncoder,
+}
+
+
+async def stream_export(encoder, source: ExportSource, api_key: str, start: date, end: date):
+    yield encoder.header()
+    async for rows in read_pages(source, api_key, start, end):
+        yield encoder.encode(rows)
+    yield encoder.footer()
+
+
+def init_export(settings):
+    global page_size
+
+    page_size = settings.EXPORT_PAGE_SIZE
@@ -0,0 +1,202 @@
+import logging
+import re
+from datetime import date, datetime
+
+from sqlalchemy import event, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import models
+from .models.detect import CreateDetect
+from .models.detect_history import DBDetectHistory
+
+logger = logging.getLogger(__name__)
+
+TABLE = DBDetectHistory.__tablename__
+PARTITION_NAME = re.compile(rf"^{TABLE}_(\d{{4}})_(\d{{2}})$")
+
+
+def month_start(value: date | datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    month_index = month.year * 12 + month.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_{month.year:04d}_{month.month:02d}"
+
+
+class DetectHistory:
+    # เก็บข้อมูลดิบทุกชุดในตาราง detect_history ซึ่งแบ่ง partition รายเดือน (Postgres native partitioning)
+    # - partition ของเดือนถัดไปถูกสร้างล่วงหน้า และสร้างเพิ่มเองเมื่อมีข้อมูลของเดือนที่ยังไม่มี partition
+    # - การลบข้อมูลทั้งเดือนคือการ DROP partition ไม่ต้องลบทีละแถว
+    # - query ที่มีเงื่อนไข timestamp เป็นช่วง จะอ่านเฉพาะ partition ที่เกี่ยวข้อง (partition pruning)
+
+    def __init__(self, months_ahead: int):
+        self.months_ahead = months_ahead
+
+        # เดือนที่มี partition อยู่แล้ว (โหลดจากฐานข้อมูลตอนเริ่มระบบ)
+        self._months: set[date] = set()
+
+        # metrics
+        self.rows_submitted = 0
+        self.partitions_created = 0
+        self.partitions_dropped = 0
+
+    async def load(self):
+        async with models.engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT child.relname FROM pg_inherits"
+                    " JOIN pg_class parent ON parent.oid = pg_inherits.inhparent"
+                    " JOIN pg_class child ON child.oid = pg_inherits.inhrelid"
+                    " WHERE parent.relname = :table"
+                ),
+                {"table": TABLE},
+            )
+            names = result.scalars().all()
+
+        self._months = set()
+        for name in names:
+            match = PARTITION_NAME.match(name)
+            if match:
+                self._months.add(date(int(match[1]), int(match[2]), 1))
+
+    async def ensure_ahead(self, today: date):
+        # partition ของเดือนนี้และอีก months_ahead เดือนถัดไป
+        current = month_start(today)
+        await self.ensure_months({add_months(current, offset) for offset in range(self.months_ahead + 1)})
+
+    async def ensure_months(self, months: set[date], conn: AsyncConnection | None = None):
+        """สร้าง partition ของเดือนที่ยังไม่มี
+
+        ไม่ส่ง conn: สร้างใน transaction ของตัวเอง (อีก connection) partition จึงอยู่ถาวรแม้ผู้เรียกจะ rollback
+        ห้ามเรียกแบบนี้ขณะที่ transaction ของผู้เรียกถือ lock ของ detect_history อยู่ (เช่น เคยอ่าน/เขียน
+        detect_history แล้ว) เพราะ CREATE TABLE ... PARTITION OF ต้องรอ lock นั้น และ Postgres ตรวจ
+        deadlock ที่วนผ่าน client ไม่ได้ จะค้างตลอดไป
+
+        ส่ง conn: สร้างบน connection ของผู้เรียก (ใช้ได้แม้ถือ lock อยู่แล้ว) partition จะมีผลเมื่อผู้เรียก commit
+        """
+        missing = sorted(months - self._months)
+        if not missing:
+            return
+
+        if conn is not None:
+            await self._create_partitions(conn, missing)
+
+            # ถ้าผู้เรียก rollback partition ก็หายไปด้วย จึงจำไว้เฉพาะเมื่อ commit สำเร็จ
+            def created(_):
+                self._months.update(missing)
+                self.partitions_created += len(missing)
+
+            event.listen(conn.sync_connection, "commit", created, once=True)
+            return
+
+        async with models.engine.begin() as own:
+            await self._create_partitions(own, missing)
+
+        self._months.update(missing)
+        self.partitions_created += len(missing)
+
+    async def _create_partitions(self, conn: AsyncConnection, months: list[date]):
+        # advisory lock กันหลาย worker สร้าง partition เดียวกันพร้อมกัน
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {"table": TABLE})
+        for month in months:
+            await conn.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE}"
+                    f" FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                )
+            )
+            logger.info("Created partition %s.", partition_name(month))
+
+    async def insert(self, session: AsyncSession, detects: list[CreateDetect]):
+        # สร้าง partition บน connection ของ session เอง ไม่ต้องรอ lock ที่ transaction นี้อาจถืออยู่
+        await self.ensure_months({month_start(detect.timestamp) for detect in detects}, await session.connection())
+
+        # ข้อมูลที่อุปกรณ์ส่งซ้ำ (api_key และ timestamp เดิม) จะถูกข้ามไป
+        stmt = pg_insert(DBDetectHistory).on_conflict_do_nothing(
+            index_elements=[DBDetectHistory.api_key, DBDetectHistory.timestamp]
+        )
+        await session.execute(stmt, [detect.model_dump() for detect in detects])
+        self.rows_submitted += len(detects)
+
+    async def device_months(self, session: AsyncSession, api_key: str) -> list[date]:
+        # เดือนที่อุปกรณ์มีประวัติ: ตรวจทีละ partition ด้วย primary key แทนการอ่านข้อมูลทั้งหมดของอุปกรณ์
+        months = sorted(self._months)
+        if not months:
+            return []
+
+        result = await session.execute(
+            text(
+                f"SELECT month FROM unnest(CAST(:months AS date[])) AS month WHERE EXISTS ("
+                f"SELECT 1 FROM {TABLE} WHERE api_key = :api_key"
+                f" AND timestamp >= month AND timestamp < month + interval '1 month')"
+            ),
+            {"months": months, "api_key": api_key},
+        )
+        return list(result.scalars().all())
+
+    async def drop_months(self, months: list[date]) -> int:
+        months = [month for month in months if month in self._months]
+        if not months:
+            return 0
+
+        async with models.engine.begin() as conn:
+            for month in months:
+                await conn.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+                logger.info("Dropped partition %s.", partition_name(month))
+
+        self._months.difference_update(months)
+        self.partitions_dropped += len(months)
+        return len(months)
+
+    async def drop_before(self, cutoff: date) -> int:
+        # ลบ partition ทั้งหมดที่เก่ากว่าเดือนของ cutoff
+        return await self.drop_months(sorted(month for month in self._months if month < month_start(cutoff)))
+
+    async def partitions(self) -> list[dict]:
+        # จำนวนแถวเป็นค่าประมาณจากสถิติของ Postgres (ไม่ต้อง count ทั้งตาราง)
+        async with models.engine.connect() as conn:
+            result = await conn.execute(
+                text("SELECT relname, greatest(reltuples, 0)::bigint FROM pg_class WHERE relname LIKE :pattern"),
+                {"pattern": f"{TABLE}\\_%"},
+            )
+            estimates = dict(result.all())
+
+        return [
+            {
+                "month": month.strftime("%Y-%m"),
+                "partition": partition_name(month),
+                "estimated_rows": estimates.get(partition_name(month), 0),
+            }
+            for month in sorted(self._months)
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "months_ahead": self.months_ahead,
+            "partitions": len(self._months),
+            "oldest_month": min(self._months).strftime("%Y-%m") if self._months else None,
+            "newest_month": max(self._months).strftime("%Y-%m") if self._months else None,
+            "rows_submitted": self.rows_submitted,
+            "partitions_created": self.partitions_created,
+            "partitions_dropped": self.partitions_dropped,
+        }
+
+
+# ที่เก็บประวัติที่ใช้งานอยู่ (None เมื่อ DETECT_HISTORY_ENABLED=False)
+store: DetectHistory | None = None
+
+
+def init_history(settings):
+    global store
+
+    if settings.DETECT_HISTORY_ENABLED:
+        store = DetectHistory(months_ahead=settings.DETECT_HISTORY_MONTHS_AHEAD)
+    else:
+        store = None
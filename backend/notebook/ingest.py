@@ -0,0 +1,421 @@
+from datetime import date, datetime, time, timedelta
+from typing import Annotated
+from pydantic import AfterValidator
+from sqlalchemy import Date, Integer, Numeric, cast, delete, exists, func, insert, literal_column, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from notebook.models.daily_average import *
+from notebook.models.detect import *
+from notebook.models.detect_history import DBDetectHistory
+from notebook.models.device import DBDevice
+from notebook.models.period_average import *
+from notebook.models.rollup import *
+from notebook.models.score import *
+from notebook.models.showdetect import *
+from notebook import history, latest, response_cache
+from notebook.quality import POLLUTANTS, classify_array
+
+# ค่าที่วัดได้จากเซ็นเซอร์ (ชื่อคอลัมน์ตรงกันทุกตาราง)
+METRICS = ("pm2_5", "pm10", "co2", "tvoc", "humidity", "temperature")
+
+# asyncpg รับ bind parameter ได้ไม่เกิน 32767 ต่อคำสั่ง (เว้นที่ไว้สำหรับ parameter ของ ON CONFLICT)
+MAX_QUERY_ARGUMENTS = 32000
+
+
+def chunk_rows(rows: list[dict]):
+    # แบ่ง INSERT หลายแถวเป็นหลายคำสั่ง เช่น batch ย้อนหลังหลายวันมี rollup ราย 5 นาทีหลายพันช่วง
+    size = MAX_QUERY_ARGUMENTS // len(rows[0])
+    for index in range(0, len(rows), size):
+        yield rows[index:index + size]
+
+
+def day_bounds(start: date, end: date) -> tuple[datetime, datetime]:
+    # ช่วงเวลาแบบครึ่งเปิด [start 00:00, end+1 00:00) ใช้กับ timestamp >= ? AND timestamp < ?
+    # แทน date(timestamp) ซึ่ง index ใช้ไม่ได้
+    return datetime.combine(start, time.min), datetime.combine(end + timedelta(days=1), time.min)
+
+
+def local_naive(value: datetime) -> datetime:
+    # timestamp ในฐานข้อมูลเป็นเวลาท้องถิ่นแบบไม่มี timezone (เหมือน datetime.now())
+    # ค่าที่มี timezone (เช่น 2026-10-01T00:00:00Z) แปลงเป็นเวลาท้องถิ่นก่อน asyncpg เทียบกับคอลัมน์ timestamp ไม่ได้
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+# ช่วงเวลาที่รับจาก query string: ใช้แทน datetime ใน route ที่กรองตาม timestamp
+LocalDateTime = Annotated[datetime, AfterValidator(local_naive)]
+
+
+def build_score_rows(detects: list[CreateDetect]) -> list[dict]:
+    # คำนวณระดับคุณภาพของทุกอุปกรณ์ในครั้งเดียวด้วย classify_array
+    rows = [{"api_key": detect.api_key, "timestamp": detect.timestamp} for detect in detects]
+    for metric, pollutant in POLLUTANTS.items():
+        levels, fixes = classify_array(pollutant, [getattr(detect, metric) for detect in detects])
+        for row, level, fix in zip(rows, levels.tolist(), fixes.tolist()):
+            row[f"{metric}_quality_level"] = level
+            row[f"{metric}_fix"] = fix
+    return rows
+
+
+def latest_per_device(detects: list[CreateDetect]) -> dict[str, CreateDetect]:
+    # เลือกข้อมูลล่าสุดของแต่ละอุปกรณ์
+    newest = {}
+    for detect in detects:
+        current = newest.get(detect.api_key)
+        if current is None or detect.timestamp >= current.timestamp:
+            newest[detect.api_key] = detect
+    return newest
+
+
+async def upsert_showdetects(session: AsyncSession, detects: list[CreateDetect]) -> list:
+    # บันทึกข้อมูลล่าสุดลงในตาราง Showdetect ด้วย INSERT ... ON CONFLICT
+    # จะไม่เขียนทับถ้าข้อมูลที่ส่งมาเก่ากว่าข้อมูลที่มีอยู่ และคืนเฉพาะแถวที่ถูกเขียนจริง
+    shows = []
+    for rows in chunk_rows([detect.model_dump() for detect in detects]):
+        stmt = pg_insert(DBShow).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBShow.api_key],
+            set_={column: stmt.excluded[column] for column in ("timestamp", *METRICS)},
+            where=DBShow.timestamp <= stmt.excluded.timestamp,
+        )
+        result = await session.execute(stmt.returning(*DBShow.__table__.columns))
+        shows.extend(result.mappings().all())
+    return shows
+
+
+async def upsert_scores(session: AsyncSession, detects: list[CreateDetect]) -> list:
+    # บันทึกระดับคุณภาพลงในตาราง score ด้วย INSERT ... ON CONFLICT
+    scores = []
+    for rows in chunk_rows(build_score_rows(detects)):
+        stmt = pg_insert(DBScore).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[DBScore.api_key],
+            set_={column: stmt.excluded[column] for column in rows[0] if column != "api_key"},
+            where=DBScore.timestamp <= stmt.excluded.timestamp,
+        )
+        result = await session.execute(stmt.returning(*DBScore.__table__.columns))
+        scores.extend(result.mappings().all())
+    return scores
+
+
+def accumulate_daily(detects: list[CreateDetect]) -> list[dict]:
+    # รวมผลรวมและจำนวนข้อมูลของแต่ละ (api_key, วัน) ภายใน batch
+    totals = {}
+    for detect in detects:
+        key = (detect.api_key, detect.timestamp.date())
+        row = totals.get(key)
+        if row is None:
+            row = totals[key] = {"api_key": key[0], "date": key[1], "readings": 0}
+            for metric in METRICS:
+                row[f"sum_{metric}"] = 0.0
+        row["readings"] += 1
+        for metric in METRICS:
+            row[f"sum_{metric}"] += getattr(detect, metric)
+
+    for row in totals.values():
+        for metric in METRICS:
+            row[f"avg_{metric}"] = round(row[f"sum_{metric}"] / row["readings"], 2)
+
+    return list(totals.values())
+
+
+async def upsert_daily_averages(session: AsyncSession, detects: list[CreateDetect]):
+    # บวกผลรวมและจำนวนข้อมูลเข้ากับตัวสะสมของวันนั้น แล้วคำนวณค่าเฉลี่ยจากตัวสะสม
+    # ใช้งาน O(1) ต่อข้อมูล ไม่ต้องอ่านข้อมูล detect ทั้งวันใหม่
+    for rows in chunk_rows(accumulate_daily(detects)):
+        stmt = pg_insert(DBDailyAverage).values(rows)
+        await session.execute(accumulate_daily_conflict(stmt))
+
+
+def accumulate_daily_conflict(stmt):
+    # ON CONFLICT (api_key, date): บวกจำนวนและผลรวมเข้ากับตัวสะสมเดิม แล้วคำนวณค่าเฉลี่ยใหม่
+    readings = DBDailyAverage.readings + stmt.excluded.readings
+
+    set_ = {"readings": readings}
+    for metric in METRICS:
+        total = getattr(DBDailyAverage, f"sum_{metric}") + stmt.excluded[f"sum_{metric}"]
+        set_[f"sum_{metric}"] = total
+        set_[f"avg_{metric}"] = func.round(cast(total / readings, Numeric), 2)
+
+    return stmt.on_conflict_do_update(
+        index_elements=[DBDailyAverage.api_key, DBDailyAverage.date],
+        set_=set_,
+    )
+
+
+# ตาราง rollup ตามความละเอียด (ขนาดช่วงเป็นนาที)
+ROLLUP_TIERS = {
+    "5m": (DBRollup5m, 5),
+    "hour": (DBRollupHourly, 60),
+}
+
+
+def bucket_start(timestamp: datetime, minutes: int) -> datetime:
+    # ปัดเวลาลงเป็นจุดเริ่มต้นของช่วง (minutes ต้องหาร 60 ลงตัว)
+    return timestamp.replace(minute=timestamp.minute // minutes * minutes, second=0, microsecond=0)
+
+
+def accumulate_rollups(detects: list[CreateDetect], minutes: int) -> list[dict]:
+    # รวมจำนวน ผลรวม ค่าต่ำสุด และค่าสูงสุดของแต่ละ (api_key, ช่วงเวลา) ภายใน batch
+    totals = {}
+    for detect in detects:
+        key = (detect.api_key, bucket_start(detect.timestamp, minutes))
+        row = totals.get(key)
+        if row is None:
+            row = totals[key] = {"api_key": key[0], "bucket": key[1], "readings": 0}
+            for metric in METRICS:
+                value = getattr(detect, metric)
+                row[f"sum_{metric}"] = 0.0
+                row[f"min_{metric}"] = value
+                row[f"max_{metric}"] = value
+        row["readings"] += 1
+        for metric in METRICS:
+            value = getattr(detect, metric)
+            row[f"sum_{metric}"] += value
+            if value < row[f"min_{metric}"]:
+                row[f"min_{metric}"] = value
+            if value > row[f"max_{metric}"]:
+                row[f"max_{metric}"] = value
+
+    return list(totals.values())
+
+
+async def upsert_rollups(session: AsyncSession, detects: list[CreateDetect]):
+    # สะสมเข้าตาราง rollup ทุกระดับ ครั้งเดียวต่อ (api_key, ช่วงเวลา) ต่อ batch
+    for model, minutes in ROLLUP_TIERS.values():
+        for rows in chunk_rows(accumulate_rollups(detects, minutes)):
+            stmt = pg_insert(model).values(rows)
+            await session.execute(accumulate_rollup_conflict(model, stmt))
+
+
+def accumulate_rollup_conflict(model, stmt):
+    # ON CONFLICT (api_key, bucket): บวกจำนวนและผลรวม และเก็บค่าต่ำสุด/สูงสุดรวมกับค่าเดิม
+    set_ = {"readings": model.readings + stmt.excluded.readings}
+    for metric in METRICS:
+        set_[f"sum_{metric}"] = getattr(model, f"sum_{metric}") + stmt.excluded[f"sum_{metric}"]
+        set_[f"min_{metric}"] = func.least(getattr(model, f"min_{metric}"), stmt.excluded[f"min_{metric}"])
+        set_[f"max_{metric}"] = func.greatest(getattr(model, f"max_{metric}"), stmt.excluded[f"max_{metric}"])
+
+    return stmt.on_conflict_do_update(
+        index_elements=[model.api_key, model.bucket],
+        set_=set_,
+    )
+
+
+async def rebuild_daily_averages(session: AsyncSession, start: date, end: date) -> int:
+    # สร้างตัวสะสมของช่วงวันที่ [start, end] ใหม่จากข้อมูล detect ดิบ
+    # โหมดเก็บประวัติอ่านจาก detect_history (detects ถูกลบตามอายุข้อมูล แต่ประวัติยังอยู่ครบ)
+    # วันที่ไม่มีข้อมูลดิบเหลืออยู่แล้วจะไม่ถูกแตะต้อง
+    source = DBDetectHistory if history.store else DBDetect
+    specific_date = func.date(source.timestamp)
+    range_start, range_end = day_bounds(start, end)
+    totals = (
+        select(
+            source.api_key,
+            specific_date,
+            func.count(),
+            *[func.sum(getattr(source, metric)) for metric in METRICS],
+            *[func.round(cast(func.avg(getattr(source, metric)), Numeric), 2) for metric in METRICS],
+        )
+        .where(source.timestamp >= range_start)
+        .where(source.timestamp < range_end)
+        .group_by(source.api_key, specific_date)
+    )
+
+    columns = [
+        "readings",
+        *[f"sum_{metric}" for metric in METRICS],
+        *[f"avg_{metric}" for metric in METRICS],
+    ]
+    stmt = pg_insert(DBDailyAverage).from_select(["api_key", "date", *columns], totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBDailyAverage.api_key, DBDailyAverage.date],
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+    result = await session.execute(stmt)
+
+    await refresh_period_averages(session, None, start, end)
+
+    return result.rowcount
+
+
+def period_columns() -> list[str]:
+    return [
+        "days",
+        "readings",
+        *[f"avg_{metric}" for metric in METRICS],
+        *[f"min_{metric}" for metric in METRICS],
+        *[f"max_{metric}" for metric in METRICS],
+    ]
+
+
+async def refresh_period_averages(
+    session: AsyncSession, api_keys: list[str] | None, first: date, last: date, prune: bool = False
+):
+    # คำนวณสรุปรายเดือน (จาก daily_averages) และรายปี (จากรายเดือน) ใหม่ สำหรับเดือน/ปีที่ครอบคลุมวันที่ [first, last]
+    # อ่านเพียงไม่เกิน 31 แถวต่อเดือนและ 12 แถวต่อปีของแต่ละอุปกรณ์ (api_keys=None คือทุกอุปกรณ์)
+    # prune=True ลบสรุปของเดือน/ปีที่ไม่มีข้อมูลรายวันเหลืออยู่แล้ว (หลังจากลบ daily_averages)
+    first_month = history.month_start(first)
+    end_month = history.add_months(history.month_start(last), 1)
+    first_year, end_year = first.year, last.year + 1
+    columns = period_columns()
+
+    # รายเดือน
+    month = cast(func.date_trunc("month", DBDailyAverage.date), Date)
+    monthly = (
+        select(
+            DBDailyAverage.api_key,
+            month,
+            func.count(),
+            func.sum(DBDailyAverage.readings),
+            *[func.avg(getattr(DBDailyAverage, f"avg_{metric}")) for metric in METRICS],
+            *[func.min(getattr(DBDailyAverage, f"avg_{metric}")) for metric in METRICS],
+            *[func.max(getattr(DBDailyAverage, f"avg_{metric}")) for metric in METRICS],
+        )
+        .where(DBDailyAverage.date >= first_month)
+        .where(DBDailyAverage.date < end_month)
+        .group_by(DBDailyAverage.api_key, month)
+    )
+    if api_keys is not None:
+        monthly = monthly.where(DBDailyAverage.api_key.in_(api_keys))
+
+    stmt = pg_insert(DBMonthlyAverage).from_select(["api_key", "month", *columns], monthly)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBMonthlyAverage.api_key, DBMonthlyAverage.month],
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+    await session.execute(stmt)
+
+    if prune:
+        stmt = (
+            delete(DBMonthlyAverage)
+            .where(DBMonthlyAverage.month >= first_month)
+            .where(DBMonthlyAverage.month < end_month)
+            .where(
+                ~exists().where(
+                    DBDailyAverage.api_key == DBMonthlyAverage.api_key,
+                    DBDailyAverage.date >= DBMonthlyAverage.month,
+                    DBDailyAverage.date < DBMonthlyAverage.month + literal_column("interval '1 month'"),
+                )
+            )
+        )
+        if api_keys is not None:
+            stmt = stmt.where(DBMonthlyAverage.api_key.in_(api_keys))
+        await session.execute(stmt)
+
+    # รายปี: ค่าเฉลี่ยถ่วงน้ำหนักด้วยจำนวนวันของแต่ละเดือน (เท่ากับค่าเฉลี่ยของค่าเฉลี่ยรายวันทั้งปี)
+    year = cast(func.extract("year", DBMonthlyAverage.month), Integer)
+    days = func.sum(DBMonthlyAverage.days)
+    yearly = (
+        select(
+            DBMonthlyAverage.api_key,
+            year,
+            days,
+            func.sum(DBMonthlyAverage.readings),
+            *[func.sum(getattr(DBMonthlyAverage, f"avg_{metric}") * DBMonthlyAverage.days) / days for metric in METRICS],
+            *[func.min(getattr(DBMonthlyAverage, f"min_{metric}")) for metric in METRICS],
+            *[func.max(getattr(DBMonthlyAverage, f"max_{metric}")) for metric in METRICS],
+        )
+        .where(DBMonthlyAverage.month >= date(first_year, 1, 1))
+        .where(DBMonthlyAverage.month < date(end_year, 1, 1))
+        .group_by(DBMonthlyAverage.api_key, year)
+    )
+    if api_keys is not None:
+        yearly = yearly.where(DBMonthlyAverage.api_key.in_(api_keys))
+
+    stmt = pg_insert(DBYearlyAverage).from_select(["api_key", "year", *columns], yearly)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBYearlyAverage.api_key, DBYearlyAverage.year],
+        set_={column: stmt.excluded[column] for column in columns},
+    )
+    await session.execute(stmt)
+
+    if prune:
+        year_start = func.make_date(DBYearlyAverage.year, 1, 1)
+        stmt = (
+            delete(DBYearlyAverage)
+            .where(DBYearlyAverage.year >= first_year)
+            .where(DBYearlyAverage.year < end_year)
+            .where(
+                ~exists().where(
+                    DBMonthlyAverage.api_key == DBYearlyAverage.api_key,
+                    DBMonthlyAverage.month >= year_start,
+                    DBMonthlyAverage.month < year_start + literal_column("interval '1 year'"),
+                )
+            )
+        )
+        if api_keys is not None:
+            stmt = stmt.where(DBYearlyAverage.api_key.in_(api_keys))
+        await session.execute(stmt)
+
+
+async def ensure_period_averages(session: AsyncSession):
+    # ฐานข้อมูลที่มี daily_averages อยู่ก่อนแล้วแต่ยังไม่มีสรุปรายเดือน: สร้างจากข้อมูลทั้งหมดครั้งเดียว
+    if (await session.execute(select(DBMonthlyAverage.id).limit(1))).first():
+        return
+
+    first, last = (await session.execute(select(func.min(DBDailyAverage.date), func.max(DBDailyAverage.date)))).one()
+    if first is not None:
+        await refresh_period_averages(session, None, first, last)
+
+
+async def lock_devices(session: AsyncSession, api_keys) -> set[str]:
+    # ล็อกแถวของอุปกรณ์แบบ FOR KEY SHARE จนจบ transaction แล้วคืน api_key ที่ยังมีอยู่
+    # การลบอุปกรณ์ต้องรอ transaction ที่ล็อกไว้ commit ก่อน และ transaction ที่ล็อกหลังการลบจะไม่พบอุปกรณ์
+    # ข้อมูลของอุปกรณ์ที่ถูกลบแล้ว (เช่นที่ค้างในคิว หรือผ่านแคชอุปกรณ์ก่อนถูกลบ) จึงไม่ถูกสร้างกลับมา
+    result = await session.execute(
+        select(DBDevice.api_key)
+        .where(DBDevice.api_key.in_(sorted(api_keys)))
+        .order_by(DBDevice.api_key)
+        .with_for_update(key_share=True)
+    )
+    return set(result.scalars().all())
+
+
+async def ingest_detects(session: AsyncSession, detects: list[CreateDetect]) -> list[DBDetect]:
+    # บันทึกข้อมูลทั้งหมดภายใน transaction เดียว (ผู้เรียกเป็นคน commit)
+    # ข้อมูลของอุปกรณ์ที่ถูกลบไปแล้วถูกข้าม (คืนเฉพาะแถวที่บันทึก)
+    known_api_keys = await lock_devices(session, {detect.api_key for detect in detects})
+    detects = [detect for detect in detects if detect.api_key in known_api_keys]
+    if not detects:
+        return []
+
+    result = await session.scalars(
+        insert(DBDetect).returning(DBDetect),
+        [detect.model_dump() for detect in detects],
+    )
+    dbdetects = result.all()
+
+    # showdetect และ score ใช้เฉพาะข้อมูลล่าสุดของแต่ละอุปกรณ์
+    newest = list(latest_per_device(detects).values())
+    shows = await upsert_showdetects(session, newest)
+    scores = await upsert_scores(session, newest)
+
+    # อัปเดตข้อมูลล่าสุดในหน่วยความจำและส่งให้ dashboard หลัง commit (id ของ detect ล่าสุดมาจาก RETURNING ด้านบน)
+    if shows and latest.wanted():
+        detect_ids = {}
+        for dbdetect in sorted(dbdetects, key=lambda dbdetect: (dbdetect.timestamp, dbdetect.id)):
+            detect_ids[dbdetect.api_key] = dbdetect.id
+        latest.stage(session, latest.build_readings(shows, scores, detect_ids))
+
+    # สะสมค่าเฉลี่ยรายวันครั้งเดียวต่อ (api_key, วัน)
+    await upsert_daily_averages(session, detects)
+
+    # สรุปรายเดือนและรายปีของเดือนที่ค่าเฉลี่ยรายวันเปลี่ยน
+    days = [detect.timestamp.date() for detect in detects]
+    api_keys = sorted({detect.api_key for detect in detects})
+    await refresh_period_averages(session, api_keys, min(days), max(days))
+
+    # response ที่แคชไว้ของอุปกรณ์เหล่านี้ใช้ไม่ได้แล้ว (ล้างหลัง commit)
+    response_cache.stage_invalidation(session, api_keys)
+
+    # สะสม rollup ราย 5 นาทีและรายชั่วโมง
+    await upsert_rollups(session, detects)
+
+    # โหมดเก็บประวัติ: เก็บข้อมูลดิบไว้ใน detect_history ด้วย
+    if history.store:
+        await history.store.insert(session, detects)
+
+    return dbdetects
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import exc
+
+from . import models
+from .ingest import ingest_detects
+from .models.detect import CreateDetect
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE ที่ลองใหม่แล้วอาจสำเร็จ: การเชื่อมต่อ (08), deadlock/serialization (40),
+# ทรัพยากรไม่พอ (53), ฐานข้อมูลกำลังปิด/เริ่มระบบ (57P), รอ lock ไม่ได้ (55P03)
+TRANSIENT_SQLSTATES = ("08", "40", "53", "57P", "55P03")
+
+
+def is_transient(error: Exception) -> bool:
+    # ข้อผิดพลาดชั่วคราวของฐานข้อมูล (ไม่ได้เกิดจากข้อมูลที่บันทึก)
+    if isinstance(error, (exc.TimeoutError, OSError)):
+        return True
+    if isinstance(error, exc.DBAPIError):
+        if error.connection_invalidated or isinstance(error, (exc.OperationalError, exc.InterfaceError)):
+            return True
+        sqlstate = getattr(error.orig, "sqlstate", None) or ""
+        return sqlstate.startswith(TRANSIENT_SQLSTATES)
+    return False
+
+
+class IngestQueue:
+    # คิวในหน่วยความจำสำหรับโหมด INGEST_MODE="queue"
+    # รับข้อมูลแล้วตอบกลับทันที จากนั้น flusher จะทยอยบันทึกเป็นชุดตามจำนวนหรือเวลา
+
+    def __init__(
+        self,
+        maxsize: int,
+        batch_size: int,
+        flush_interval_ms: int,
+        flush_retries: int = 3,
+        retry_backoff_ms: int = 100,
+    ):
+        self._queue: asyncio.Queue[CreateDetect] = asyncio.Queue(maxsize=maxsize)
+        self._task: asyncio.Task | None = None
+        self._accepting = False
+
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_retries = flush_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+
+        # metrics
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retries = 0
+        self.splits = 0
+        self.flushes = 0
+        self.last_flush_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    def start(self):
+        self._accepting = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # หยุดรับข้อมูลใหม่ แล้วรอให้ข้อมูลที่ค้างในคิวถูกบันทึกจนหมดก่อนปิด
+        self._accepting = False
+        if self._task is None:
+            return
+
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def put_many(self, detects: list[CreateDetect]):
+        # เพิ่มข้อมูลทั้งชุดหรือไม่เพิ่มเลย (raise asyncio.QueueFull เมื่อคิวเต็ม)
+        free = self._queue.maxsize - self._queue.qsize()
+        if not self._accepting or free < len(detects):
+            self.rejected += len(detects)
+            raise asyncio.QueueFull
+
+        for detect in detects:
+            self._queue.put_nowait(detect)
+        self.enqueued += len(detects)
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "splits": self.splits,
+            "flushes": self.flushes,
+            "last_flush_size": self.last_flush_size,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # รอข้อมูลตัวแรก แล้วเก็บต่อจนครบ batch_size หรือครบเวลา flush_interval
+            detects = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(detects) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    detects.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(detects)
+
+    async def _flush(self, detects: list[CreateDetect]):
+        started = time.perf_counter()
+        try:
+            await self._store(detects)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.last_flush_size = len(detects)
+            self.last_flush_ms = elapsed_ms
+            self.total_flush_ms += elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            for _ in detects:
+                self._queue.task_done()
+
+    async def _store(self, detects: list[CreateDetect]):
+        # ข้อผิดพลาดชั่วคราว (connection หลุด, deadlock, ...) ลองใหม่ทั้งชุดแล้ว ถ้ายังไม่สำเร็จจึงทิ้งทั้งชุด
+        # ข้อผิดพลาดอื่นมักเกิดจากข้อมูลบางชุด: แบ่งครึ่งแล้วบันทึกแยกกัน จนเหลือชุดเดียวที่บันทึกไม่ได้จึงทิ้งเฉพาะชุดนั้น
+        try:
+            await self._commit(detects)
+            self.flushed += len(detects)
+        except Exception as error:
+            if is_transient(error):
+                self.failed += len(detects)
+                logger.exception(
+                    "Dropped %d queued detects after %d retries.", len(detects), self.flush_retries
+                )
+            elif len(detects) == 1:
+                self.failed += 1
+                logger.exception("Dropped a queued detect that cannot be stored: %s", detects[0].model_dump_json())
+            else:
+                self.splits += 1
+                middle = len(detects) // 2
+                await self._store(detects[:middle])
+                await self._store(detects[middle:])
+
+    async def _commit(self, detects: list[CreateDetect]):
+        # บันทึกใน transaction เดียว ลองใหม่ด้วย backoff แบบเพิ่มเท่าตัวเมื่อเป็นข้อผิดพลาดชั่วคราว
+        for attempt in range(self.flush_retries + 1):
+            try:
+                async for session in models.get_session():
+                    async with session:
+                        await ingest_detects(session, detects)
+                        await session.commit()
+                return
+            except Exception as error:
+                if attempt == self.flush_retries or not is_transient(error):
+                    raise
+                self.retries += 1
+                delay = self.retry_backoff * 2**attempt
+                logger.warning(
+                    "Retrying %d queued detects in %.2f s after a transient error: %s", len(detects), delay, error
+                )
+                await asyncio.sleep(delay)
+
+
+# คิวที่ใช้งานอยู่ (None เมื่อ INGEST_MODE="sync")
+queue: IngestQueue | None = None
+
+
+def init_queue(settings):
+    global queue
+
+    if settings.INGEST_MODE == "queue":
+        queue = IngestQueue(
+            maxsize=settings.INGEST_QUEUE_SIZE,
+            batch_size=settings.INGEST_BATCH_SIZE,
+            flush_interval_ms=settings.INGEST_FLUSH_INTERVAL_MS,
+            flush_retries=settings.INGEST_FLUSH_RETRIES,
+            retry_backoff_ms=settings.INGEST_RETRY_BACKOFF_MS,
+        )
+    else:
+        queue = None
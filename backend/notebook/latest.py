@@ -0,0 +1,280 @@
+import asyncio
+import bisect
+import sys
+import time as timer
+from datetime import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from . import broadcast, models
+from .models.detect import DBDetect, DetectRead
+from .models.score import DBScore, ScoreRead
+from .models.showdetect import DBShow, ShowRead
+
+# ชื่อคอลัมน์เดียวกับ ingest.METRICS (ingest import โมดูลนี้ จึง import กลับไม่ได้)
+METRICS = ("pm2_5", "pm10", "co2", "tvoc", "humidity", "temperature")
+SCORE_COLUMNS = tuple(f"{metric}_{suffix}" for metric in METRICS for suffix in ("quality_level", "fix"))
+
+# ที่พักข้อมูลล่าสุดใน session.info จนกว่า transaction จะ commit สำเร็จ
+PENDING_KEY = "latest_readings"
+
+
+class LatestReading:
+    # ข้อมูลล่าสุดของอุปกรณ์หนึ่งเครื่อง (แถวใน showdetects + scores + id ของ detect ล่าสุด)
+    # ใช้ __slots__ และ tuple เพื่อให้ 10k อุปกรณ์ใช้หน่วยความจำเพียงไม่กี่ MB
+    # ข้อความระดับคุณภาพมีไม่กี่แบบ จึง intern ไว้ใช้ object เดียวกันทุกอุปกรณ์
+    __slots__ = ("api_key", "timestamp", "show_id", "values", "detect_id", "score_id", "score_timestamp", "levels")
+
+    def __init__(self, api_key, timestamp, show_id, values, detect_id=None, score_id=None, score_timestamp=None, levels=None):
+        self.api_key = api_key
+        self.timestamp = timestamp
+        self.show_id = show_id
+        self.values = values  # ค่าตามลำดับ METRICS
+        self.detect_id = detect_id  # None = ไม่มี detect แล้ว (ถูกลบตามอายุข้อมูล)
+        self.score_id = score_id
+        self.score_timestamp = score_timestamp
+        self.levels = levels  # ค่าตามลำดับ SCORE_COLUMNS
+
+    def show(self) -> ShowRead:
+        return ShowRead(id=self.show_id, api_key=self.api_key, timestamp=self.timestamp, **dict(zip(METRICS, self.values)))
+
+    def detect(self) -> DetectRead:
+        return DetectRead(id=self.detect_id, api_key=self.api_key, timestamp=self.timestamp, **dict(zip(METRICS, self.values)))
+
+    def score(self) -> ScoreRead:
+        return ScoreRead(
+            id=self.score_id,
+            api_key=self.api_key,
+            timestamp=self.score_timestamp,
+            **dict(zip(SCORE_COLUMNS, self.levels)),
+        )
+
+
+def build_readings(shows, scores, detect_ids: dict[str, int]) -> list[LatestReading]:
+    # รวมแถวของ showdetects และ scores (mapping ตามชื่อคอลัมน์) เป็น LatestReading ตาม api_key
+    scores = {score["api_key"]: score for score in scores}
+    readings = []
+    for show in shows:
+        reading = LatestReading(
+            show["api_key"],
+            show["timestamp"],
+            show["id"],
+            tuple(show[metric] for metric in METRICS),
+            detect_ids.get(show["api_key"]),
+        )
+        score = scores.get(show["api_key"])
+        if score is not None:
+            reading.score_id = score["id"]
+            reading.score_timestamp = score["timestamp"]
+            reading.levels = tuple(sys.intern(score[column]) for column in SCORE_COLUMNS)
+        readings.append(reading)
+    return readings
+
+
+async def latest_detect_ids(session: AsyncSession, api_keys: list[str] | None = None) -> dict[str, int]:
+    # id ของ detect ล่าสุดของแต่ละอุปกรณ์ (subquery ต่ออุปกรณ์ใช้ index (api_key, timestamp))
+    detect_id = (
+        select(DBDetect.id)
+        .where(DBDetect.api_key == DBShow.api_key)
+        .order_by(DBDetect.timestamp.desc(), DBDetect.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = select(DBShow.api_key, detect_id)
+    if api_keys is not None:
+        stmt = stmt.where(DBShow.api_key.in_(api_keys))
+    result = await session.execute(stmt)
+    return {api_key: value for api_key, value in result.all() if value is not None}
+
+
+async def load_readings(session: AsyncSession, api_keys: list[str] | None = None) -> list[LatestReading]:
+    shows = select(*DBShow.__table__.columns)
+    scores = select(*DBScore.__table__.columns)
+    if api_keys is not None:
+        shows = shows.where(DBShow.api_key.in_(api_keys))
+        scores = scores.where(DBScore.api_key.in_(api_keys))
+
+    show_rows = (await session.execute(shows)).mappings().all()
+    score_rows = (await session.execute(scores)).mappings().all()
+    return build_readings(show_rows, score_rows, await latest_detect_ids(session, api_keys))
+
+
+def wanted() -> bool:
+    # มีผู้ใช้ข้อมูลล่าสุดหรือไม่ (store หรือ dashboard ที่เชื่อมต่ออยู่)
+    return bool(store or (broadcast.broadcaster and broadcast.broadcaster.has_subscribers()))
+
+
+def stage(session: AsyncSession, readings: list[LatestReading]):
+    # เก็บไว้ก่อน แล้วนำเข้า store และส่งให้ dashboard หลัง commit สำเร็จ (ถ้า rollback จะถูกทิ้ง)
+    if readings:
+        session.info.setdefault(PENDING_KEY, []).extend(readings)
+
+
+def quality_changed(reading: LatestReading, previous: LatestReading | None) -> list[str]:
+    # ค่าที่ระดับคุณภาพต่างจากข้อมูลก่อนหน้า (levels เรียงเป็น quality_level, fix ต่อค่า)
+    if previous is None or previous.levels is None or reading.levels is None:
+        return []
+    return [
+        metric
+        for index, metric in enumerate(METRICS)
+        if reading.levels[index * 2] != previous.levels[index * 2]
+    ]
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    readings = session.info.pop(PENDING_KEY, None)
+    if not readings:
+        return
+
+    applied = store.apply(readings) if store else [(reading, None) for reading in readings]
+    if broadcast.broadcaster:
+        broadcast.broadcaster.publish(
+            [
+                (reading.api_key, broadcast.reading_event(reading, quality_changed(reading, previous)))
+                for reading, previous in applied
+            ]
+        )
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+class LatestStore:
+    # ข้อมูลล่าสุดของทุกอุปกรณ์ในหน่วยความจำ โหลดจากฐานข้อมูลตอนเริ่มระบบ
+    # และอัปเดตจาก ingest หลัง commit ใช้ตอบ /detects/{api_key}, /scores/{api_key} และ /showdetect/all
+    # เมื่อรันหลาย worker แต่ละ worker เห็นเฉพาะข้อมูลที่ตัวเองรับ จึงต้องตั้ง refresh_seconds ให้โหลดใหม่เป็นรอบ
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._readings: dict[str, LatestReading] = {}
+        self._order: list[str] | None = None  # api_key เรียงตาม show_id (ลำดับเดียวกับ /showdetect/all เดิม)
+        self._order_ids: list[int] = []
+        self._lock = asyncio.Lock()
+        self.loaded_at: float | None = None
+
+        # metrics
+        self.reads = 0
+        self.updates = 0
+        self.stale_updates = 0
+        self.reloads = 0
+        self.last_reload_at: datetime | None = None
+        self.last_reload_ms = 0.0
+
+    def _expired(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        return self.refresh_seconds > 0 and timer.monotonic() - self.loaded_at > self.refresh_seconds
+
+    async def _load(self):
+        started = timer.perf_counter()
+        async for session in models.get_session():
+            async with session:
+                readings = await load_readings(session)
+
+        # ข้อมูลที่ commit ระหว่างโหลดอาจใหม่กว่าที่อ่านได้ ให้เก็บอันที่ใหม่กว่าไว้
+        loaded = {}
+        for reading in readings:
+            current = self._readings.get(reading.api_key)
+            loaded[reading.api_key] = current if current and current.timestamp > reading.timestamp else reading
+
+        self._readings = loaded
+        self._order = None
+        self.loaded_at = timer.monotonic()
+        self.reloads += 1
+        self.last_reload_at = datetime.now()
+        self.last_reload_ms = (timer.perf_counter() - started) * 1000
+
+    async def reload(self):
+        async with self._lock:
+            await self._load()
+
+    async def ensure_fresh(self):
+        if self._expired():
+            async with self._lock:
+                if self._expired():
+                    await self._load()
+
+    def apply(self, readings: list[LatestReading]) -> list[tuple[LatestReading, LatestReading | None]]:
+        # ไม่เขียนทับข้อมูลที่ใหม่กว่า (ลำดับการ commit ของหลาย transaction ไม่แน่นอน)
+        # คืนข้อมูลที่นำเข้าจริงคู่กับข้อมูลก่อนหน้า
+        applied = []
+        for reading in readings:
+            current = self._readings.get(reading.api_key)
+            if current is not None and current.timestamp > reading.timestamp:
+                self.stale_updates += 1
+                continue
+            if current is None:
+                self._order = None
+            self._readings[reading.api_key] = reading
+            self.updates += 1
+            applied.append((reading, current))
+        return applied
+
+    def remove(self, api_key: str):
+        if self._readings.pop(api_key, None) is not None:
+            self._order = None
+
+    def forget_detects_before(self, cutoff: datetime, api_key: str | None = None):
+        # detect ล่าสุดถูกลบตามอายุข้อมูลแล้ว (showdetects / scores ยังอยู่)
+        if api_key is None:
+            readings = self._readings.values()
+        else:
+            readings = [self._readings[api_key]] if api_key in self._readings else []
+        for reading in readings:
+            if reading.timestamp < cutoff:
+                reading.detect_id = None
+
+    def get(self, api_key: str) -> LatestReading | None:
+        self.reads += 1
+        return self._readings.get(api_key)
+
+    def page(self, offset: int, size: int, after_id: int | None = None) -> tuple[list[LatestReading], int]:
+        # after_id: เริ่มหลัง show_id นี้ (keyset cursor) แทน offset
+        self.reads += 1
+        if self._order is None:
+            self._order = sorted(self._readings, key=lambda api_key: self._readings[api_key].show_id)
+            self._order_ids = [self._readings[api_key].show_id for api_key in self._order]
+        if after_id is not None:
+            offset = bisect.bisect_right(self._order_ids, after_id)
+        return [self._readings[api_key] for api_key in self._order[offset:offset + size]], len(self._order)
+
+    def memory_bytes(self) -> int:
+        # ขนาดโดยประมาณของ record, tuple และค่าตัวเลข (ไม่รวมข้อความที่ใช้ร่วมกัน)
+        total = sys.getsizeof(self._readings)
+        for reading in self._readings.values():
+            total += sys.getsizeof(reading) + sys.getsizeof(reading.values)
+            total += sum(sys.getsizeof(value) for value in reading.values)
+            if reading.levels is not None:
+                total += sys.getsizeof(reading.levels)
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._readings),
+            "memory_bytes": self.memory_bytes(),
+            "refresh_seconds": self.refresh_seconds,
+            "reads": self.reads,
+            "updates": self.updates,
+            "stale_updates": self.stale_updates,
+            "reloads": self.reloads,
+            "last_reload_at": self.last_reload_at,
+            "last_reload_ms": round(self.last_reload_ms, 2),
+        }
+
+
+# store ที่ใช้งานอยู่ (None เมื่อ LATEST_STORE_ENABLED=False)
+store: LatestStore | None = None
+
+
+def init_store(settings):
+    global store
+
+    if settings.LATEST_STORE_ENABLED:
+        store = LatestStore(refresh_seconds=settings.LATEST_STORE_REFRESH_SECONDS)
+    else:
+        store = None
@@ -1,11 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import select
+from datetime import datetime
 
 #import logging
 #logging.basicConfig(level=logging.INFO)
 
-from . import models, routers, config
+from . import models, routers, config, auth, broadcast, bulk_delete, dashboard, ingest, device_cache, export, history, ingest_queue, latest, migrations, pagination, response_cache, retention, single_flight
 from .models.users import DBUser
 from .routers.websocket import router as websocket_router  # นำเข้า router จาก device.py
 
@@ -24,6 +25,45 @@ def create_app():
 
     # Initial database
     models.init_db(settings)
+
+    # session ของผู้ใช้และแคชข้อมูลผู้ใช้
+    auth.init_auth(settings)
+
+    # แคชข้อมูลอุปกรณ์ตาม api_key
+    device_cache.init_cache(settings)
+
+    # ข้อมูลล่าสุดของทุกอุปกรณ์ในหน่วยความจำ
+    latest.init_store(settings)
+
+    # ตัวนับจำนวนแถวทั้งหมดของการแบ่งหน้า
+    pagination.init_pagination(settings)
+
+    # แคช response ของ endpoint อ่านข้อมูลที่ถูกเรียกบ่อย
+    response_cache.init_response_cache(settings)
+
+    # รวม request อ่านข้อมูลที่ซ้ำกันระหว่างรอ query
+    single_flight.init_single_flight(settings)
+
+    # แคช snapshot ของ dashboard
+    dashboard.init_dashboard(settings)
+
+    # ตัวกระจายข้อมูลใหม่ไปยัง dashboard (/ws/dashboard)
+    broadcast.init_broadcaster(settings)
+
+    # คิวรับข้อมูลจากอุปกรณ์ (เฉพาะ INGEST_MODE="queue")
+    ingest_queue.init_queue(settings)
+
+    # ประวัติข้อมูลดิบแบบแบ่ง partition รายเดือน (เฉพาะ DETECT_HISTORY_ENABLED=True)
+    history.init_history(settings)
+
+    # ขนาดหน้าของการส่งออกข้อมูล
+    export.init_export(settings)
+
+    # ตัวลบข้อมูลของอุปกรณ์ทีละ chunk (ลบอุปกรณ์ / ลบตามเดือน)
+    bulk_delete.init_deleter(settings)
+
+    # ตัวลบข้อมูลเก่าตามรอบเวลา
+    retention.init_scheduler(settings)
     
     # เรียกใช้งาน router ที่มีการตรวจสอบการเข้าถึง
     routers.init_router(app)
@@ -36,6 +76,9 @@ def create_app():
         # สร้าง database และผู้ใช้ superadmin ถ้ายังไม่มี
         await models.create_all()
 
+        # ปรับ schema ของตารางที่มีอยู่เดิม (unique constraint, คอลัมน์และ index ใหม่)
+        await migrations.upgrade()
+
         async for session in models.get_session():  # ใช้ async for เพื่อดึง session
             async with session:  # ใช้ session เป็น context manager
                 result = await session.exec(select(DBUser).where(DBUser.role == "superadmin"))
@@ -53,4 +96,34 @@ def create_app():
                     session.add(superadmin)
                     await session.commit()
 
+                # สร้างสรุปรายเดือน/รายปีจาก daily_averages ที่มีอยู่เดิม (ครั้งแรกครั้งเดียว)
+                await ingest.ensure_period_averages(session)
+                await session.commit()
+
+        # โหลดรายการ partition ที่มีอยู่ และสร้าง partition ของเดือนนี้และเดือนถัดไป
+        if history.store:
+            await history.store.load()
+            await history.store.ensure_ahead(datetime.now().date())
+
+        # โหลดข้อมูลล่าสุดของทุกอุปกรณ์เข้าหน่วยความจำ
+        if latest.store:
+            await latest.store.reload()
+
+        # เริ่ม flusher ของคิวรับข้อมูล
+        if ingest_queue.queue:
+            ingest_queue.queue.start()
+
+        # เริ่มลบข้อมูลเก่าตามรอบเวลา
+        if retention.scheduler:
+            retention.scheduler.start()
+
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        if retention.scheduler:
+            await retention.scheduler.stop()
+
+        # บันทึกข้อมูลที่ค้างในคิวให้หมดก่อนปิดระบบ
+        if ingest_queue.queue:
+            await ingest_queue.queue.stop()
+
     return app
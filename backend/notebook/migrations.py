@@ -0,0 +1,135 @@
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import SQLModel
+
+from . import history, models
+from .ingest import METRICS
+
+logger = logging.getLogger(__name__)
+
+# create_all สร้างเฉพาะตารางที่ยังไม่มี ไม่แก้ไขตารางเดิม
+# ฐานข้อมูลที่สร้างก่อนหน้านี้จึงต้องปรับ schema ที่นี่ ทุกขั้นตอนตรวจก่อนทำ (รันซ้ำทุกครั้งที่เริ่มระบบได้)
+
+
+async def index_is_unique(conn: AsyncConnection, name: str) -> bool | None:
+    # None = ไม่มี index ชื่อนี้
+    result = await conn.execute(
+        text(
+            "SELECT pg_index.indisunique FROM pg_index"
+            " JOIN pg_class ON pg_class.oid = pg_index.indexrelid WHERE pg_class.relname = :name"
+        ),
+        {"name": name},
+    )
+    return result.scalar()
+
+
+async def constraint_exists(conn: AsyncConnection, name: str) -> bool:
+    result = await conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": name})
+    return result.scalar() is not None
+
+
+async def unique_api_key(conn: AsyncConnection, table: str):
+    # scores / showdetects: หนึ่งแถวต่ออุปกรณ์ (เป้าหมายของ ON CONFLICT (api_key))
+    # ตารางเดิมมี index ธรรมดาชื่อเดียวกัน: ลบแถวซ้ำโดยเก็บแถวล่าสุด แล้วสร้างเป็น unique index
+    index = f"ix_{table}_api_key"
+    if await index_is_unique(conn, index):
+        return
+
+    result = await conn.execute(
+        text(
+            f"DELETE FROM {table} AS older USING {table} AS newer"
+            " WHERE older.api_key = newer.api_key"
+            " AND (older.timestamp, older.id) < (newer.timestamp, newer.id)"
+        )
+    )
+    await conn.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    await conn.execute(text(f"CREATE UNIQUE INDEX {index} ON {table} (api_key)"))
+    logger.info("Made %s unique (removed %d duplicate rows).", index, result.rowcount)
+
+
+async def unique_daily_averages(conn: AsyncConnection):
+    # daily_averages: หนึ่งแถวต่อ (api_key, date) ลบแถวซ้ำโดยเก็บแถวที่สร้างล่าสุด
+    if await constraint_exists(conn, "uq_daily_averages_api_key_date"):
+        return
+
+    result = await conn.execute(
+        text(
+            "DELETE FROM daily_averages AS older USING daily_averages AS newer"
+            " WHERE older.api_key = newer.api_key AND older.date = newer.date AND older.id < newer.id"
+        )
+    )
+    await conn.execute(
+        text("ALTER TABLE daily_averages ADD CONSTRAINT uq_daily_averages_api_key_date UNIQUE (api_key, date)")
+    )
+    # index เดิมบน api_key ซ้ำซ้อนกับ unique constraint ซึ่งขึ้นต้นด้วย api_key
+    await conn.execute(text("DROP INDEX IF EXISTS ix_daily_averages_api_key"))
+    logger.info("Added uq_daily_averages_api_key_date (removed %d duplicate rows).", result.rowcount)
+
+
+async def daily_average_accumulators(conn: AsyncConnection):
+    # ตัวสะสม readings / sum_* ของค่าเฉลี่ยรายวัน: แถวเดิมจะได้ 0 ซึ่งทำให้ข้อมูลถัดไปเขียนทับค่าเฉลี่ยทั้งวัน
+    await conn.execute(text("ALTER TABLE daily_averages ADD COLUMN IF NOT EXISTS readings integer NOT NULL DEFAULT 0"))
+    for metric in METRICS:
+        await conn.execute(
+            text(f"ALTER TABLE daily_averages ADD COLUMN IF NOT EXISTS sum_{metric} double precision NOT NULL DEFAULT 0")
+        )
+
+    # แถวที่ยังไม่มีตัวสะสม (readings = 0): คำนวณจากข้อมูลดิบของวันนั้น (detects แล้วตามด้วย detect_history)
+    sources = ["detects"] + (["detect_history"] if history.store else [])
+    for source in sources:
+        result = await conn.execute(
+            text(
+                "UPDATE daily_averages AS target SET readings = totals.readings, "
+                + ", ".join(
+                    f"sum_{metric} = totals.sum_{metric}, avg_{metric} = round(totals.avg_{metric}::numeric, 2)"
+                    for metric in METRICS
+                )
+                + " FROM (SELECT daily.id, count(*) AS readings, "
+                + ", ".join(f"sum(raw.{metric}) AS sum_{metric}, avg(raw.{metric}) AS avg_{metric}" for metric in METRICS)
+                + f" FROM daily_averages AS daily JOIN {source} AS raw ON raw.api_key = daily.api_key"
+                " AND raw.timestamp >= daily.date AND raw.timestamp < daily.date + 1"
+                " WHERE daily.readings = 0 GROUP BY daily.id) AS totals"
+                " WHERE target.id = totals.id"
+            )
+        )
+        if result.rowcount:
+            logger.info("Recomputed %d daily average accumulators from %s.", result.rowcount, source)
+
+    # ไม่มีข้อมูลดิบเหลือแล้ว: ใช้ค่าเฉลี่ยเดิมเป็นข้อมูลหนึ่งค่า (ข้อมูลใหม่ของวันนั้นจะถูกเฉลี่ยรวมกับค่าเดิม ไม่เขียนทับ)
+    result = await conn.execute(
+        text(
+            "UPDATE daily_averages SET readings = 1, "
+            + ", ".join(f"sum_{metric} = avg_{metric}" for metric in METRICS)
+            + " WHERE readings = 0"
+        )
+    )
+    if result.rowcount:
+        logger.info("Seeded %d daily average accumulators without raw data.", result.rowcount)
+
+
+def model_indexes(connection):
+    # index ที่เพิ่มใน model หลังจากตารางถูกสร้างไปแล้ว (เช่น (api_key, timestamp) และ BRIN ของ detects)
+    # ตารางใหญ่จะถูกล็อกการเขียนระหว่างสร้าง index ครั้งแรก
+    existing = {table: {index["name"] for index in inspect(connection).get_indexes(table)}
+                for table in SQLModel.metadata.tables}
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing[table.name]:
+                index.create(connection)
+                logger.info("Created index %s.", index.name)
+
+
+async def upgrade():
+    async with models.engine.begin() as conn:
+        # หลาย worker เริ่มพร้อมกัน: ให้ปรับ schema ทีละ worker
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('notebook_migrations'))"))
+
+        await unique_api_key(conn, "scores")
+        await unique_api_key(conn, "showdetects")
+        await unique_daily_averages(conn)
+        await daily_average_accumulators(conn)
+        await conn.run_sync(model_indexes)
+        # index เดิมบน api_key ซ้ำซ้อนกับ ix_detects_api_key_timestamp ซึ่งขึ้นต้นด้วย api_key
+        await conn.execute(text("DROP INDEX IF EXISTS ix_detects_api_key"))
@@ -1,28 +1,43 @@
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from notebook.db_pool import TimedQueuePool
 
 connect_args = {}
 
 engine = None
+session_factory = None
 
 def init_db(settings):
-    global engine
+    global engine, session_factory
+
+    args = dict(connect_args)
+    if make_url(settings.SQLDB_URL).get_driver_name() == "asyncpg":
+        # จำนวน prepared statement ที่แคชต่อ connection (0 = ปิด เช่นเมื่อใช้ pgbouncer แบบ transaction)
+        args["prepared_statement_cache_size"] = settings.DB_STATEMENT_CACHE_SIZE
 
     engine = create_async_engine(
         settings.SQLDB_URL,
-        echo=True,
+        echo=settings.DB_ECHO,
         future=True,
-        connect_args=connect_args,
+        connect_args=args,
+        poolclass=TimedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
     )
+    # สร้างครั้งเดียว ใช้ร่วมกันทุก request
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def create_all():
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
 
 async def get_session() -> AsyncSession:
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
+    async with session_factory() as session:
         yield session
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
 from datetime import date
 
 
@@ -14,11 +15,27 @@ class DailyAverageRead(BaseModel):
     avg_humidity: float
     avg_temperature: float
 
+
+class DailyAverageColumns(BaseModel):
+    # รูปแบบคอลัมน์: หนึ่ง array ต่อค่า (ขนาด JSON เล็กกว่าแบบหนึ่ง object ต่อวัน)
+    date: list[date]
+    avg_pm2_5: list[float]
+    avg_pm10: list[float]
+    avg_co2: list[float]
+    avg_tvoc: list[float]
+    avg_humidity: list[float]
+    avg_temperature: list[float]
+
+
 class DBDailyAverage(SQLModel, table=True):
     __tablename__ = "daily_averages"
+    __table_args__ = (
+        # ใช้เป็นเป้าหมายของ ON CONFLICT และค้นหาข้อมูลของอุปกรณ์ตามช่วงวันที่
+        UniqueConstraint("api_key", "date", name="uq_daily_averages_api_key_date"),
+    )
 
     id: int = Field(primary_key=True)
-    api_key: str = Field(index=True)
+    api_key: str
     date: date
 
     avg_pm2_5: float
@@ -27,3 +44,12 @@ class DBDailyAverage(SQLModel, table=True):
     avg_tvoc: float
     avg_humidity: float
     avg_temperature: float
+
+    # ตัวสะสมสำหรับคำนวณค่าเฉลี่ยแบบเพิ่มทีละค่า (ไม่ต้อง AVG() ข้อมูลทั้งวันใหม่ทุกครั้ง)
+    readings: int = Field(default=0)
+    sum_pm2_5: float = Field(default=0)
+    sum_pm10: float = Field(default=0)
+    sum_co2: float = Field(default=0)
+    sum_tvoc: float = Field(default=0)
+    sum_humidity: float = Field(default=0)
+    sum_temperature: float = Field(default=0)
@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from datetime import date
+
+from .device import DeviceRead
+from .score import ScoreRead
+from .showdetect import ShowRead
+from .daily_average import DailyAverageColumns
+
+
+class DashboardDevice(BaseModel):
+    device: DeviceRead
+    latest: ShowRead | None  # ข้อมูลล่าสุด (None = ยังไม่เคยส่งข้อมูล)
+    score: ScoreRead | None  # ระดับคุณภาพของข้อมูลล่าสุด
+    trend: DailyAverageColumns  # ค่าเฉลี่ยรายวันย้อนหลัง trend_days วัน (รูปแบบคอลัมน์)
+
+
+class DashboardSnapshot(BaseModel):
+    # ไม่มีเวลาที่สร้าง เพื่อให้ ETag เปลี่ยนเฉพาะเมื่อข้อมูลเปลี่ยน
+    trend_start: date  # วันแรกของ trend
+    devices: list[DashboardDevice]
+    total: int  # จำนวนอุปกรณ์ทั้งหมด
+    page: int | None  # None เมื่ออ่านด้วย cursor
+    size: int
+    total_pages: int
+    next_cursor: str | None = None
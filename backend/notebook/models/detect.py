@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from datetime import datetime
 
 
@@ -28,12 +29,39 @@ class CreateDetect(BaseModel):
     timestamp: datetime
 
 
+class SocketDetect(BaseModel):
+    seq: int  # ลำดับของข้อมูล ใช้จับคู่กับ ack ที่ส่งกลับ
+    pm2_5: float
+    pm10: float
+    co2: float
+    tvoc: float
+    humidity: float
+    temperature: float
+    timestamp: datetime
+
+
+class RejectedDetect(BaseModel):
+    index: int  # ลำดับของข้อมูลใน batch ที่ส่งมา
+    api_key: str
+    detail: str
+
+
+class DetectBatchResult(BaseModel):
+    accepted: int  # จำนวนข้อมูลที่บันทึกสำเร็จ
+    rejected: list[RejectedDetect]  # ข้อมูลที่ถูกปฏิเสธ
+
 
 class DBDetect(SQLModel, table=True):
     __tablename__ = "detects"
+    __table_args__ = (
+        # ค้นหาข้อมูลของอุปกรณ์ตามช่วงเวลา (api_key = ? AND timestamp >= ? AND timestamp < ?)
+        Index("ix_detects_api_key_timestamp", "api_key", "timestamp"),
+        # ตารางเพิ่มข้อมูลตามเวลาอย่างเดียว ใช้ BRIN สำหรับการลบข้อมูลเก่าตามช่วงเวลา
+        Index("ix_detects_timestamp_brin", "timestamp", postgresql_using="brin"),
+    )
 
     id: int = Field(primary_key=True)
-    api_key: str = Field(index=True)  
+    api_key: str
 
     pm2_5: float
     pm10: float
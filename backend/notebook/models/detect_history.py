@@ -0,0 +1,33 @@
+from pydantic import BaseModel, ConfigDict
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+
+class DetectHistoryRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    api_key: str
+    timestamp: datetime
+    pm2_5: float
+    pm10: float
+    co2: float
+    tvoc: float
+    humidity: float
+    temperature: float
+
+
+class DBDetectHistory(SQLModel, table=True):
+    # ประวัติข้อมูลดิบทั้งหมด แบ่ง partition ตามเดือนของ timestamp (ดู notebook/history.py)
+    # primary key (api_key, timestamp) ใช้ค้นหาตามช่วงเวลาของอุปกรณ์ และกันข้อมูลซ้ำเมื่ออุปกรณ์ส่งซ้ำ
+    __tablename__ = "detect_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
+
+    api_key: str = Field(primary_key=True)
+    timestamp: datetime = Field(primary_key=True)
+
+    pm2_5: float
+    pm10: float
+    co2: float
+    tvoc: float
+    humidity: float
+    temperature: float
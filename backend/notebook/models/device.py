@@ -55,6 +55,7 @@ class DeviceList(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     devices: list[DeviceRead]
     total: int  # จำนวนผู้ใช้ทั้งหมด
-    page: int  # หน้าปัจจุบัน
+    page: int | None  # หน้าปัจจุบัน (None เมื่ออ่านด้วย cursor)
     size: int  # จำนวนผู้ใช้ต่อหน้า
     total_pages: int  # จำนวนหน้าทั้งหมด
+    next_cursor: str | None = None  # ส่งเป็น cursor เพื่ออ่านหน้าถัดไป (None = หน้าสุดท้าย)
@@ -0,0 +1,77 @@
+from pydantic import BaseModel, ConfigDict
+from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
+from datetime import date
+
+
+class PeriodAverageRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    period: str  # "YYYY-MM" สำหรับรายเดือน, "YYYY" สำหรับรายปี
+    days: int  # จำนวนวันที่มีข้อมูล
+    readings: int
+    avg_pm2_5: float
+    avg_pm10: float
+    avg_co2: float
+    avg_tvoc: float
+    avg_humidity: float
+    avg_temperature: float
+    min_pm2_5: float
+    min_pm10: float
+    min_co2: float
+    min_tvoc: float
+    min_humidity: float
+    min_temperature: float
+    max_pm2_5: float
+    max_pm10: float
+    max_co2: float
+    max_tvoc: float
+    max_humidity: float
+    max_temperature: float
+
+
+class PeriodAverageBase(SQLModel):
+    # สรุปจาก daily_averages: ค่าเฉลี่ยของค่าเฉลี่ยรายวัน ค่าเฉลี่ยรายวันที่ต่ำสุด/สูงสุด และจำนวนวัน
+    id: int = Field(primary_key=True)
+    api_key: str
+    days: int
+    readings: int
+
+    avg_pm2_5: float
+    avg_pm10: float
+    avg_co2: float
+    avg_tvoc: float
+    avg_humidity: float
+    avg_temperature: float
+
+    min_pm2_5: float
+    min_pm10: float
+    min_co2: float
+    min_tvoc: float
+    min_humidity: float
+    min_temperature: float
+
+    max_pm2_5: float
+    max_pm10: float
+    max_co2: float
+    max_tvoc: float
+    max_humidity: float
+    max_temperature: float
+
+
+class DBMonthlyAverage(PeriodAverageBase, table=True):
+    __tablename__ = "monthly_averages"
+    __table_args__ = (
+        UniqueConstraint("api_key", "month", name="uq_monthly_averages_api_key_month"),
+    )
+
+    month: date  # วันแรกของเดือน
+
+
+class DBYearlyAverage(PeriodAverageBase, table=True):
+    __tablename__ = "yearly_averages"
+    __table_args__ = (
+        UniqueConstraint("api_key", "year", name="uq_yearly_averages_api_key_year"),
+    )
+
+    year: int
@@ -0,0 +1,82 @@
+from pydantic import BaseModel, ConfigDict
+from sqlmodel import SQLModel, Field
+from sqlalchemy import UniqueConstraint
+from datetime import datetime
+from typing import Optional
+
+
+class RollupRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    bucket: datetime  # เวลาเริ่มต้นของช่วง
+    readings: int
+    avg_pm2_5: float
+    avg_pm10: float
+    avg_co2: float
+    avg_tvoc: float
+    avg_humidity: float
+    avg_temperature: float
+    # ระดับรายวันมาจาก daily_averages ซึ่งไม่มีค่าต่ำสุด/สูงสุด
+    min_pm2_5: Optional[float] = None
+    min_pm10: Optional[float] = None
+    min_co2: Optional[float] = None
+    min_tvoc: Optional[float] = None
+    min_humidity: Optional[float] = None
+    min_temperature: Optional[float] = None
+    max_pm2_5: Optional[float] = None
+    max_pm10: Optional[float] = None
+    max_co2: Optional[float] = None
+    max_tvoc: Optional[float] = None
+    max_humidity: Optional[float] = None
+    max_temperature: Optional[float] = None
+
+
+class RollupSeries(BaseModel):
+    api_key: str
+    resolution: str  # ระดับที่ถูกเลือกใช้จริง
+    start: datetime
+    end: datetime
+    points: list[RollupRead]
+
+
+class RollupBase(SQLModel):
+    # จำนวน ผลรวม ค่าต่ำสุด และค่าสูงสุดของแต่ละค่าในช่วงเวลา (bucket) หนึ่งของอุปกรณ์
+    id: int = Field(primary_key=True)
+    api_key: str
+    bucket: datetime
+    readings: int = Field(default=0)
+
+    sum_pm2_5: float = Field(default=0)
+    sum_pm10: float = Field(default=0)
+    sum_co2: float = Field(default=0)
+    sum_tvoc: float = Field(default=0)
+    sum_humidity: float = Field(default=0)
+    sum_temperature: float = Field(default=0)
+
+    min_pm2_5: float
+    min_pm10: float
+    min_co2: float
+    min_tvoc: float
+    min_humidity: float
+    min_temperature: float
+
+    max_pm2_5: float
+    max_pm10: float
+    max_co2: float
+    max_tvoc: float
+    max_humidity: float
+    max_temperature: float
+
+
+class DBRollup5m(RollupBase, table=True):
+    __tablename__ = "rollups_5m"
+    __table_args__ = (
+        UniqueConstraint("api_key", "bucket", name="uq_rollups_5m_api_key_bucket"),
+    )
+
+
+class DBRollupHourly(RollupBase, table=True):
+    __tablename__ = "rollups_hourly"
+    __table_args__ = (
+        UniqueConstraint("api_key", "bucket", name="uq_rollups_hourly_api_key_bucket"),
+    )
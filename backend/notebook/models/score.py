@@ -27,7 +27,7 @@ class DBScore(SQLModel, table=True):
     __tablename__ = "scores"
 
     id: int = Field(primary_key=True)
-    api_key: str = Field(index=True)  
+    api_key: str = Field(unique=True, index=True)  
     timestamp: datetime
 
     pm2_5_quality_level: str
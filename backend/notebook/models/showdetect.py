@@ -21,7 +21,7 @@ class DBShow(SQLModel, table=True):
     __tablename__ = "showdetects"
 
     id: int = Field(primary_key=True)
-    api_key: str = Field(index=True)  
+    api_key: str = Field(unique=True, index=True)  
     timestamp: datetime
 
     pm2_5: float
@@ -36,6 +36,7 @@ class ShowList(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     shows: list[ShowRead]
     total: int  # จำนวนผู้ใช้ทั้งหมด
-    page: int  # หน้าปัจจุบัน
+    page: int | None  # หน้าปัจจุบัน (None เมื่ออ่านด้วย cursor)
     size: int  # จำนวนผู้ใช้ต่อหน้า
-    total_pages: int  # จำนวนหน้าทั้งหมด
\ No newline at end of file
+    total_pages: int  # จำนวนหน้าทั้งหมด
+    next_cursor: str | None = None  # ส่งเป็น cursor เพื่ออ่านหน้าถัดไป (None = หน้าสุดท้าย)
\ No newline at end of file
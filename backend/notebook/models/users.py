@@ -69,6 +69,7 @@ class UserList(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     users: list[UserRead]
     total: int  # จำนวนผู้ใช้ทั้งหมด
-    page: int  # หน้าปัจจุบัน
+    page: int | None  # หน้าปัจจุบัน (None เมื่ออ่านด้วย cursor)
     size: int  # จำนวนผู้ใช้ต่อหน้า
-    total_pages: int  # จำนวนหน้าทั้งหมด
\ No newline at end of file
+    total_pages: int  # จำนวนหน้าทั้งหมด
+    next_cursor: str | None = None  # ส่งเป็น cursor เพื่ออ่านหน้าถัดไป (None = หน้าสุดท้าย)
\ No newline at end of file
@@ -0,0 +1,149 @@
+import base64
+import json
+import time
+from typing import NamedTuple
+
+from sqlalchemy import func, select, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class CursorError(ValueError):
+    pass
+
+
+def encode_cursor(last_id: int) -> str:
+    # cursor แบบทึบ: client ส่งกลับมาตามเดิมเท่านั้น ไม่ต้องรู้ว่าข้างในเป็น id
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id = data["id"]
+    except (ValueError, TypeError, KeyError):
+        raise CursorError("Invalid cursor.")
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise CursorError("Invalid cursor.")
+    return last_id
+
+
+async def count_rows(session: AsyncSession, stmt) -> int:
+    result = await session.execute(select(func.count()).select_from(stmt.order_by(None).subquery()))
+    return result.scalar_one()
+
+
+class RowCounter:
+    # นับจำนวนแถวทั้งหมดด้วย SELECT count(*) แทนการโหลดทุกแถวมานับ
+    # แคชผลไว้ตาม ttl_seconds (ล้างทันทีเมื่อเพิ่ม/ลบแถว) และใช้ค่าประมาณจาก pg_class
+    # เมื่อตารางมีขนาดตั้งแต่ estimate_rows แถวขึ้นไป (0 = นับจริงเสมอ)
+
+    def __init__(self, ttl_seconds: int, estimate_rows: int):
+        self.ttl = ttl_seconds
+        self.estimate_rows = estimate_rows
+        self._counts: dict[str, tuple[float, int]] = {}
+
+        # metrics
+        self.hits = 0
+        self.counts = 0
+        self.estimates = 0
+
+    async def count(self, session: AsyncSession, stmt, table: str) -> int:
+        entry = self._counts.get(table)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        total = None
+        if self.estimate_rows > 0:
+            result = await session.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"), {"table": table}
+            )
+            estimate = result.scalar()
+            if estimate is not None and estimate >= self.estimate_rows:
+                total = estimate
+                self.estimates += 1
+
+        if total is None:
+            total = await count_rows(session, stmt)
+            self.counts += 1
+
+        if self.ttl > 0:
+            self._counts[table] = (time.monotonic() + self.ttl, total)
+        return total
+
+    def invalidate(self, table: str):
+        self._counts.pop(table, None)
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "estimate_rows": self.estimate_rows,
+            "cached": len(self._counts),
+            "hits": self.hits,
+            "counts": self.counts,
+            "estimates": self.estimates,
+        }
+
+
+class Page(NamedTuple):
+    items: list
+    total: int
+    page: int | None  # None = อ่านด้วย cursor (ไม่รู้ว่าเป็นหน้าที่เท่าไร)
+    size: int
+    total_pages: int
+    next_cursor: str | None  # None = หน้าสุดท้าย
+
+
+async def paginate(
+    session: AsyncSession,
+    stmt,
+    key,
+    table: str,
+    page: int,
+    size: int,
+    cursor: str | None = None,
+) -> Page:
+    # แบ่งหน้าเรียงตาม key (id) จากเก่าไปใหม่
+    # ส่ง cursor มาเพื่ออ่านหน้าถัดไปแบบ keyset (WHERE id > ?) ซึ่งเร็วเท่ากันทุกหน้า
+    # ไม่ส่ง cursor ใช้ page/size แบบ OFFSET เหมือนเดิม
+    total = await counter.count(session, stmt, table) if counter else await count_rows(session, stmt)
+
+    if cursor:
+        stmt = stmt.where(key > decode_cursor(cursor))
+    else:
+        stmt = stmt.offset((page - 1) * size)
+
+    # อ่านเกิน 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+    result = await session.exec(stmt.order_by(key.asc()).limit(size + 1))
+    items = result.all()
+    if not cursor:
+        # จำนวนที่แคชไว้อาจน้อยกว่าจริงเมื่อเพิ่งมีแถวใหม่ แต่ต้องไม่น้อยกว่าที่เห็นในหน้านี้
+        total = max(total, (page - 1) * size + len(items))
+    next_cursor = encode_cursor(getattr(items[size - 1], key.key)) if len(items) > size else None
+
+    return Page(
+        items=items[:size],
+        total=total,
+        page=None if cursor else page,
+        size=size,
+        total_pages=(total + size - 1) // size,
+        next_cursor=next_cursor,
+    )
+
+
+# ตัวนับที่ใช้งานอยู่ (สร้างใน init_pagination)
+counter: RowCounter | None = None
+
+
+def init_pagination(settings):
+    global counter
+
+    counter = RowCounter(
+        ttl_seconds=settings.PAGINATION_COUNT_TTL_SECONDS,
+        estimate_rows=settings.PAGINATION_ESTIMATE_ROWS,
+    )
+
+
+def invalidate(table: str):
+    if counter:
+        counter.invalidate(table)
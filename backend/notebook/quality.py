@@ -0,0 +1,136 @@
+import math
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple
+
+import numpy as np
+
+GOOD_FIX = 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'
+
+# ค่าที่จัดระดับไม่ได้ (NaN จากเซ็นเซอร์)
+UNKNOWN_LEVEL = 'ไม่ทราบ'
+UNKNOWN_FIX = ''
+
+
+class QualityTable(NamedTuple):
+    # ตารางเกณฑ์ของสารแต่ละชนิด ครอบคลุมทุกค่าบนเส้นจำนวน
+    # มี len(breakpoints) + 1 ช่วง โดยช่วงที่ i คือค่าระหว่าง breakpoints[i-1] และ breakpoints[i]
+    # side="left": ค่าที่เท่ากับ breakpoint อยู่ช่วงล่าง (เช่น PM2.5 = 25 ยัง "ดี")
+    # side="right": ค่าที่เท่ากับ breakpoint อยู่ช่วงบน (เช่น อุณหภูมิ 24.00 เริ่ม "ดี")
+    breakpoints: tuple[float, ...]
+    levels: tuple[str, ...]
+    fixes: tuple[str, ...]
+    side: str
+    np_breakpoints: np.ndarray
+    np_levels: np.ndarray
+    np_fixes: np.ndarray
+
+
+def build_table(breakpoints: tuple[float, ...], bands: tuple[tuple[str, str], ...], side: str) -> QualityTable:
+    levels = tuple(level for level, _ in bands)
+    fixes = tuple(fix for _, fix in bands)
+    return QualityTable(
+        breakpoints=breakpoints,
+        levels=levels,
+        fixes=fixes,
+        side=side,
+        np_breakpoints=np.array(breakpoints, dtype=np.float64),
+        np_levels=np.array(levels, dtype=object),
+        np_fixes=np.array(fixes, dtype=object),
+    )
+
+
+# สร้างครั้งเดียวตอน import
+QUALITY_TABLES = {
+    'PM2.5': build_table(
+        (25, 35),
+        (
+            ('ดี', GOOD_FIX),
+            ('ปานกลาง', 'ควรสวมหน้ากาก , ควรทำความสะอาดห้อง'),
+            ('อันตราย', 'ต้องสวมหน้ากาก , ใช้เครื่องฟอกอากาศ , ต้องทำความสะอาดห้องเเละทำความสะอาดแผ่นกรองแอร์'),
+        ),
+        side="left",
+    ),
+    'PM10': build_table(
+        (50, 70),
+        (
+            ('ดี', GOOD_FIX),
+            ('ปานกลาง', 'ควรสวมหน้ากาก , ควรทำความสะอาดห้อง'),
+            ('อันตราย', 'ต้องสวมหน้ากาก , ใช้เครื่องฟอกอากาศ , ต้องทำความสะอาดห้องเเละทำความสะอาดแผ่นกรองแอร์'),
+        ),
+        side="left",
+    ),
+    'CO2': build_table(
+        (1000, 1400),
+        (
+            ('ดี', GOOD_FIX),
+            ('ปานกลาง', 'เปิดหน้าต่างหรือประตูชั่วคราว , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ'),
+            ('อันตราย', ' เปิดหน้าต่างหรือประตูให้นานขึ้น , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ'),
+        ),
+        side="left",
+    ),
+    'TVOC': build_table(
+        (1000, 1400),
+        (
+            ('ดี', GOOD_FIX),
+            ('ปานกลาง', 'เปิดหน้าต่างหรือประตูชั่วคราว , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ , ต้องค้นหาเเละกำจัดกลิ่นไม่พึงประสงค์หรือสารเคมีออกจากห้อง'),
+            ('อันตราย', 'เปิดหน้าต่างหรือประตูให้นานขึ้น , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ , ต้องค้นหาเเละกำจัดกลิ่นไม่พึงประสงค์หรือสารเคมีออกจากห้องทันที'),
+        ),
+        side="left",
+    ),
+    'Temperature': build_table(
+        (22.00, 24.00, 27.00, 29.00),
+        (
+            ('อันตราย', 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วงที่เหมาะสม , ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'),
+            ('ปานกลาง', 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วง 24-26°C'),
+            ('ดี', GOOD_FIX),
+            ('ปานกลาง', 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วง 24-26°C'),
+            ('อันตราย', 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วงที่เหมาะสม , ใช้พัดลมช่วยกระจายความเย็น , ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'),
+        ),
+        side="right",
+    ),
+    'Humidity': build_table(
+        (40.00, 50.00, 66.00, 76.00),
+        (
+            ('อันตราย', 'เปิดใช้เครื่องพ่นไอน้ำเพื่อเพิ่มความชื้นอย่างต่อเนื่อง , ห้ามใช้แอร์โหมดเย็น ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'),
+            ('ปานกลาง', 'เปิดใช้เครื่องพ่นไอน้ำเพื่อเพิ่มความชื้น'),
+            ('ดี', GOOD_FIX),
+            ('ปานกลาง', 'ปรับแอร์เป็น Dry Mode เพื่อลดความชื้น '),
+            ('อันตราย', 'เปิดแอร์ในโหมด Dry Mode อย่างต่อเนื่อง ,  ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'),
+        ),
+        side="right",
+    ),
+}
+
+# ชื่อคอลัมน์ของค่าที่วัดได้ -> ชื่อสารในตารางเกณฑ์
+POLLUTANTS = {
+    "pm2_5": "PM2.5",
+    "pm10": "PM10",
+    "co2": "CO2",
+    "tvoc": "TVOC",
+    "humidity": "Humidity",
+    "temperature": "Temperature",
+}
+
+
+def classify(pollutant: str, value: float) -> tuple[str, str]:
+    # จัดระดับคุณภาพของค่าเดียวด้วย binary search (คืนค่า (ระดับ, วิธีแก้ไข))
+    if math.isnan(value):
+        return UNKNOWN_LEVEL, UNKNOWN_FIX
+    table = QUALITY_TABLES[pollutant]
+    search = bisect_left if table.side == "left" else bisect_right
+    index = search(table.breakpoints, value)
+    return table.levels[index], table.fixes[index]
+
+
+def classify_array(pollutant: str, values) -> tuple[np.ndarray, np.ndarray]:
+    # จัดระดับคุณภาพของทั้ง array ในครั้งเดียว (สำหรับ batch ingest และ backfill)
+    table = QUALITY_TABLES[pollutant]
+    values = np.asarray(values, dtype=np.float64)
+    index = np.searchsorted(table.np_breakpoints, values, side=table.side)
+    levels, fixes = table.np_levels[index], table.np_fixes[index]
+    # searchsorted จัด NaN ไว้ช่วงสุดท้าย ส่วน bisect จัดไว้ช่วงแรก: ให้ทั้งสองแบบเป็น "ไม่ทราบ"
+    unknown = np.isnan(values)
+    if unknown.any():
+        levels[unknown] = UNKNOWN_LEVEL
+        fixes[unknown] = UNKNOWN_FIX
+    return levels, fixes
@@ -0,0 +1,230 @@
+import hashlib
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import NamedTuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# tag ของ response ที่ขึ้นกับข้อมูลของทุกอุปกรณ์ (เช่น /showdetect/all) ล้างทุกครั้งที่อุปกรณ์ใดเปลี่ยน
+ALL_DEVICES = "*"
+
+# api_key ที่ต้องล้างแคชหลัง commit สำเร็จ (เก็บใน session.info)
+PENDING_KEY = "response_cache_api_keys"
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+    last_modified: int  # epoch วินาที
+    expires: float  # time.monotonic(), 0 = ไม่หมดอายุ
+
+
+def not_modified(request: Request, entry: CachedResponse) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return entry.etag in if_none_match or if_none_match.strip() == "*"
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return entry.last_modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def to_response(request: Request, entry: CachedResponse) -> Response:
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": formatdate(entry.last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    # แคช response ที่ encode แล้ว (bytes) ตาม path และ query string แบบ LRU
+    # แต่ละรายการผูกกับ tag (api_key หรือ ALL_DEVICES) เพื่อล้างทันทีเมื่อข้อมูลของอุปกรณ์เปลี่ยน
+    # generation ของ tag กันไม่ให้ request ที่อ่านข้อมูลก่อนการเขียนนำข้อมูลเก่ากลับมาเก็บหลังล้างแคชแล้ว
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self._entries: OrderedDict[tuple[str, str], tuple[str, CachedResponse]] = OrderedDict()
+        self._tags: dict[str, set[tuple[str, str]]] = {}
+        self._generations: dict[str, int] = {}
+
+        # metrics
+        self.hits = 0
+        self.not_modified = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, tag: str) -> int:
+        return self._generations.get(tag, 0)
+
+    def get(self, key: tuple[str, str]) -> CachedResponse | None:
+        item = self._entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        tag, entry = item
+        if entry.expires and entry.expires < time.monotonic():
+            self._discard(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def set(self, key: tuple[str, str], tag: str, generation: int, body: bytes) -> CachedResponse:
+        entry = CachedResponse(
+            body=body,
+            etag='"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+            last_modified=int(time.time()),
+            expires=time.monotonic() + self.ttl if self.ttl > 0 else 0,
+        )
+        # ข้อมูลถูกเขียนระหว่างที่ request นี้อ่านอยู่ ไม่เก็บผลที่อาจเก่าไว้
+        if generation != self.generation(tag):
+            return entry
+
+        self._discard(key)
+        self._entries[key] = (tag, entry)
+        self._tags.setdefault(tag, set()).add(key)
+        self.stores += 1
+        while len(self._entries) > self.maxsize:
+            self._discard(next(iter(self._entries)))
+            self.evictions += 1
+        return entry
+
+    def _discard(self, key: tuple[str, str]):
+        item = self._entries.pop(key, None)
+        if item is not None:
+            keys = self._tags.get(item[0])
+            keys.discard(key)
+            if not keys:
+                del self._tags[item[0]]
+
+    def invalidate(self, api_key: str):
+        for tag in (api_key, ALL_DEVICES):
+            self._generations[tag] = self.generation(tag) + 1
+            for key in list(self._tags.get(tag, ())):
+                self._discard(key)
+        self.invalidations += 1
+
+    def clear(self):
+        for tag in list(self._tags) + [ALL_DEVICES]:
+            self._generations[tag] = self.generation(tag) + 1
+        self._entries.clear()
+        self._tags.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "capacity": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class Lookup:
+    # ผลการค้นหาแคชของ request หนึ่ง: response พร้อมส่ง (hit) หรือใช้ respond(result) เก็บผลที่คำนวณใหม่
+
+    def __init__(self, request: Request, tag: str):
+        self.request = request
+        self.tag = tag
+        self.key = (request.url.path, request.url.query)
+        self.response: Response | None = None
+        self._generation = 0
+
+        if cache is None:
+            return
+        entry = cache.get(self.key)
+        if entry is not None:
+            self.response = to_response(request, entry)
+            if self.response.status_code == 304:
+                cache.not_modified += 1
+        else:
+            self._generation = cache.generation(tag)
+
+    @property
+    def flight_key(self):
+        # key สำหรับ single_flight: รวม generation ด้วย เพื่อไม่ให้ request ที่เข้ามาหลังข้อมูลเปลี่ยนรอผลของ query เก่า
+        return self.key, self._generation
+
+    def respond(self, result):
+        if cache is None:
+            return result
+        body = JSONResponse(content=jsonable_encoder(result)).body
+        response = to_response(self.request, cache.set(self.key, self.tag, self._generation, body))
+        if response.status_code == 304:
+            cache.not_modified += 1
+        return response
+
+
+def lookup(request: Request, api_key: str = ALL_DEVICES) -> Lookup:
+    # ใช้ภายใน route หลัง dependency ตรวจสิทธิ์ทำงานแล้ว:
+    #   cached = response_cache.lookup(request, api_key)
+    #   if cached.response: return cached.response
+    #   ... คำนวณ result ...
+    #   return cached.respond(result)
+    return Lookup(request, api_key)
+
+
+def invalidate(api_key: str):
+    if cache:
+        cache.invalidate(api_key)
+
+
+def clear():
+    if cache:
+        cache.clear()
+
+
+def stage_invalidation(session, api_keys):
+    # ล้างแคชของอุปกรณ์เหล่านี้หลัง commit (ล้างก่อน commit อาจทำให้ request อื่นเก็บข้อมูลเก่ากลับเข้าไป)
+    if cache:
+        session.info.setdefault(PENDING_KEY, set()).update(api_keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_pending(session):
+    api_keys = session.info.pop(PENDING_KEY, None)
+    if api_keys and cache:
+        for api_key in api_keys:
+            cache.invalidate(api_key)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+# แคชที่ใช้งานอยู่ (None เมื่อ RESPONSE_CACHE_SIZE=0)
+cache: ResponseCache | None = None
+
+
+def init_response_cache(settings):
+    global cache
+
+    if settings.RESPONSE_CACHE_SIZE > 0:
+        cache = ResponseCache(maxsize=settings.RESPONSE_CACHE_SIZE, ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS)
+    else:
+        cache = None
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+from . import history, latest, models, response_cache
+from .bulk_delete import delete_chunked
+from .ingest import refresh_period_averages
+from .models.daily_average import DBDailyAverage
+from .models.detect import DBDetect
+from .models.rollup import DBRollup5m, DBRollupHourly
+
+logger = logging.getLogger(__name__)
+
+
+def detect_cutoff(today: date, days: int) -> datetime:
+    # detects ที่เก่ากว่าเวลานี้จะถูกลบ (days=0 คือเก็บเฉพาะวันนี้)
+    return datetime.combine(today - timedelta(days=days), time.min)
+
+
+def month_cutoff(today: date, months: int) -> date:
+    # วันแรกของเดือนที่เก่าที่สุดที่ยังเก็บไว้ (นับรวมเดือนปัจจุบัน)
+    month_index = today.year * 12 + today.month - 1 - (months - 1)
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+class RetentionScheduler:
+    # ลบข้อมูลเก่าตามนโยบายใน Settings เป็นรอบๆ และลบทีละ chunk เพื่อไม่ให้ล็อกตารางนาน
+
+    def __init__(
+        self,
+        interval_minutes: int,
+        chunk_size: int,
+        detect_days: int,
+        daily_average_months: int,
+        history_months: int,
+        rollup_5m_days: int,
+        rollup_hourly_days: int,
+    ):
+        self.interval = interval_minutes * 60
+        self.chunk_size = chunk_size
+        self.detect_days = detect_days
+        self.daily_average_months = daily_average_months
+        self.history_months = history_months
+        self.rollup_5m_days = rollup_5m_days
+        self.rollup_hourly_days = rollup_hourly_days
+
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+        # metrics
+        self.runs = 0
+        self.last_run_at: datetime | None = None
+        self.last_run_ms = 0.0
+        self.last_removed: dict[str, int] = {}
+        self.total_removed: dict[str, int] = {}
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_minutes": self.interval // 60,
+            "detect_retention_days": self.detect_days,
+            "daily_average_retention_months": self.daily_average_months,
+            "history_retention_months": self.history_months,
+            "rollup_5m_retention_days": self.rollup_5m_days,
+            "rollup_hourly_retention_days": self.rollup_hourly_days,
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_run_ms": round(self.last_run_ms, 2),
+            "last_removed": self.last_removed,
+            "total_removed": self.total_removed,
+        }
+
+    async def run_once(self) -> dict[str, int]:
+        async with self._lock:
+            started = timer.perf_counter()
+            today = datetime.now().date()
+
+            cutoff_at = detect_cutoff(today, self.detect_days)
+            removed = {"detects": await self._purge(DBDetect, DBDetect.timestamp, cutoff_at)}
+            if latest.store:
+                latest.store.forget_detects_before(cutoff_at)
+            if self.daily_average_months > 0:
+                cutoff = month_cutoff(today, self.daily_average_months)
+                removed["daily_averages"] = await self._purge(DBDailyAverage, DBDailyAverage.date, cutoff)
+
+                # ลบสรุปรายเดือนที่หมดอายุตาม และคำนวณสรุปรายปีที่ได้รับผลกระทบใหม่
+                async for session in models.get_session():
+                    async with session:
+                        await refresh_period_averages(session, None, date.min, cutoff - timedelta(days=1), prune=True)
+                        await session.commit()
+                response_cache.clear()
+            for table, model, days in (
+                ("rollups_5m", DBRollup5m, self.rollup_5m_days),
+                ("rollups_hourly", DBRollupHourly, self.rollup_hourly_days),
+            ):
+                if days > 0:
+                    removed[table] = await self._purge(model, model.bucket, detect_cutoff(today, days))
+
+            # ประวัติข้อมูลดิบ: สร้าง partition ของเดือนถัดไปล่วงหน้า และ DROP partition ที่หมดอายุทั้งเดือน
+            if history.store:
+                await history.store.ensure_ahead(today)
+                if self.history_months > 0:
+                    removed["detect_history_partitions"] = await history.store.drop_before(
+                        month_cutoff(today, self.history_months)
+                    )
+
+            self.runs += 1
+            self.last_run_at = datetime.now()
+            self.last_run_ms = (timer.perf_counter() - started) * 1000
+            self.last_removed = removed
+            for table, count in removed.items():
+                self.total_removed[table] = self.total_removed.get(table, 0) + count
+
+            return removed
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Retention run failed.")
+            await asyncio.sleep(self.interval)
+
+    async def _purge(self, model, column, cutoff) -> int:
+        # ลบทีละ chunk และ commit แยกกัน จนกว่าจะไม่มีข้อมูลที่เก่ากว่า cutoff
+        return await delete_chunked(model, column < cutoff, self.chunk_size)
+
+
+# scheduler ที่ใช้งานอยู่ (None เมื่อ RETENTION_INTERVAL_MINUTES=0)
+scheduler: RetentionScheduler | None = None
+
+
+def init_scheduler(settings):
+    global scheduler
+
+    if settings.RETENTION_INTERVAL_MINUTES > 0:
+        scheduler = RetentionScheduler(
+            interval_minutes=settings.RETENTION_INTERVAL_MINUTES,
+            chunk_size=settings.RETENTION_CHUNK_SIZE,
+            detect_days=settings.DETECT_RETENTION_DAYS,
+            daily_average_months=settings.DAILY_AVERAGE_RETENTION_MONTHS,
+            history_months=settings.DETECT_HISTORY_RETENTION_MONTHS,
+            rollup_5m_days=settings.ROLLUP_5M_RETENTION_DAYS,
+            rollup_hourly_days=settings.ROLLUP_HOURLY_RETENTION_DAYS,
+        )
+    else:
+        scheduler = None
@@ -4,7 +4,11 @@ from . import device
 from . import detect
 from . import score
 from . import daily_average
+from . import rollup
 from . import showdetect
+from . import export
+from . import internal
+from . import dashboard
 
 def init_router(app):
     app.include_router(users.router)
@@ -13,4 +17,8 @@ def init_router(app):
     app.include_router(detect.router)
     app.include_router(score.router)
     app.include_router(daily_average.router)
-    app.include_router(showdetect.router)
\ No newline at end of file
+    app.include_router(rollup.router)  # หลัง daily_average เพราะ /avg/{resolution}/{api_key} ครอบคลุม path ของ daily_average
+    app.include_router(showdetect.router)
+    app.include_router(export.router)
+    app.include_router(internal.router)
+    app.include_router(dashboard.router)
\ No newline at end of file
@@ -1,10 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form, Response, Request
+from sqlalchemy.orm import noload
 from sqlmodel import select
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from notebook.models.users import *
 from notebook.models import get_session
+from notebook import auth
 
 router = APIRouter(tags=["authentication"])
 
@@ -16,7 +18,7 @@ async def login(
     response: Response  # เพิ่ม response เพื่อจัดการคุกกี้
 ) -> dict:
     # ตรวจสอบ username และ password
-    result = await session.exec(select(DBUser).where(DBUser.username == username))
+    result = await session.exec(select(DBUser).options(noload(DBUser.devices)).where(DBUser.username == username))
     user = result.one_or_none()
 
     if not user or not await user.verify_password(password):
@@ -29,11 +31,11 @@ async def login(
     user.status = "active"
     session.add(user)
     await session.commit()
+    auth.invalidate(user.id)
 
-    # เก็บ user_id ในคุกกี้
-    response.set_cookie(key="user_id", value=str(user.id), httponly=True)
-    #response.set_cookie(key="user_id", value=str(user.id), httponly=True, secure=False, samesite="Lax")
-    #logger.info(f"Set cookie user_id: {user.id}")  # เพิ่ม Logging หลังตั้งคุกกี้
+    # เก็บ session token ที่ลงลายเซ็นแล้วในคุกกี้ (แก้ไขค่าเองไม่ได้)
+    response.set_cookie(key=auth.SESSION_COOKIE, value=auth.create_token(user), httponly=True)
+    #response.set_cookie(key=auth.SESSION_COOKIE, value=auth.create_token(user), httponly=True, secure=False, samesite="Lax")
 
     return {"message": "Login successful.", "role": user.role}
 
@@ -44,18 +46,17 @@ async def logout(
     session: Annotated[AsyncSession, Depends(get_session)],
     response: Response  # เพิ่ม response เพื่อจัดการคุกกี้
 ):
-    # ดึง user_id จากคุกกี้
-    user_id_str = request.cookies.get("user_id")
-    if not user_id_str:
+    # ดึง session token จากคุกกี้
+    token = request.cookies.get(auth.SESSION_COOKIE)
+    if not token:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User not logged in.")
-    
-    # แปลง user_id ให้เป็น int
+
     try:
-        user_id = int(user_id_str)
-    except ValueError:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user ID.")
+        claims = auth.decode_token(token)
+    except auth.SessionError as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
 
-    user = await session.get(DBUser, user_id)
+    user = await auth.get_db_user(session, claims["sub"])
     
     if not user or user.status != "active":
         raise HTTPException(
@@ -67,8 +68,9 @@ async def logout(
     user.status = "inactive"
     session.add(user)
     await session.commit()
+    auth.invalidate(user.id)
 
-    # ลบคุกกี้ user_id
-    response.delete_cookie("user_id")
+    # ลบคุกกี้ session
+    response.delete_cookie(auth.SESSION_COOKIE)
 
     return {"message": "Successfully logged out."}
\ No newline at end of file
@@ -1,39 +1,140 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
 from sqlmodel import select
-from typing import Annotated
+from typing import Annotated, Literal
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+import numpy as np
+
 from notebook.models.daily_average import *
+from notebook.models.period_average import *
 from notebook.deps import *
+from notebook.ingest import METRICS, rebuild_daily_averages
+from notebook.downsample import lttb_indices
+from notebook import response_cache, single_flight
 from notebook.models import get_session
 
 router = APIRouter(prefix="/avg", tags=["avg"])
 
+AVERAGE_COLUMNS = [getattr(DBDailyAverage, f"avg_{metric}") for metric in METRICS]
+
+async def load_daily_averages(
+    session: AsyncSession,
+    api_key: str,
+    start: date | None,
+    end: date | None,
+    max_points: int | None,
+    layout: str,
+) -> list[dict] | DailyAverageColumns:
+    # อ่านเฉพาะคอลัมน์ที่ใช้ ไม่สร้าง ORM object ทีละแถว
+    stmt = select(DBDailyAverage.date, *AVERAGE_COLUMNS).where(DBDailyAverage.api_key == api_key)
+    if start:
+        stmt = stmt.where(DBDailyAverage.date >= start)
+    if end:
+        stmt = stmt.where(DBDailyAverage.date <= end)
+    result = await session.execute(stmt.order_by(DBDailyAverage.date))  # เรียงลำดับวันที่จากน้อยไปมาก
+    rows = result.all()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No daily averages found for API Key: {api_key}.")
+
+    dates = [row[0] for row in rows]
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+
+    # ลดจำนวนจุดโดยรักษารูปร่างของกราฟ (Recharts วาดได้ไม่กี่ร้อยจุด)
+    if max_points and len(rows) > max_points:
+        x = np.array([day.toordinal() for day in dates], dtype=np.float64)
+        keep = lttb_indices(x, values, max_points)
+        dates = [dates[index] for index in keep]
+        values = values[keep]
+
+    if layout == "columns":
+        columns = values.T.tolist()
+        return DailyAverageColumns(
+            date=dates, **{column.key: columns[index] for index, column in enumerate(AVERAGE_COLUMNS)}
+        )
+
+    # จัดข้อมูลในรูปแบบที่เหมาะกับ Recharts (รูปเเบบ Line Chart)
+    names = [column.key for column in AVERAGE_COLUMNS]
+    return [
+        {"date": day.strftime("%Y-%m-%d"), **dict(zip(names, row))}
+        for day, row in zip(dates, values.tolist())
+    ]
+
+
+# start/end (รวมทั้งสองวัน) กรองช่วงวันที่, max_points ลดจำนวนจุดด้วย LTTB, layout="columns" ตอบเป็นหนึ่ง array ต่อค่า
 @router.get("/daily_averages/{api_key}")
 async def get_daily_averages(
     api_key: str,
+    request: Request,
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[DailyAverageRead]:
+    start: date | None = None,
+    end: date | None = None,
+    max_points: Annotated[int | None, Query(ge=3, le=10000)] = None,
+    layout: Literal["rows", "columns"] = "rows",
+) -> list[DailyAverageRead] | DailyAverageColumns:
+    # ตอบจาก response ที่แคชไว้ (304 เมื่อ ETag ตรงกับที่ client มี)
+    cached = response_cache.lookup(request, api_key)
+    if cached.response:
+        return cached.response
+
+    # request เดียวกันที่เข้ามาพร้อมกันรอผลจาก query เดียว
+    result = await single_flight.run(
+        cached.flight_key, lambda: load_daily_averages(session, api_key, start, end, max_points, layout)
+    )
+    return cached.respond(result)
+
+
+def period_average(period: str, row) -> dict:
+    average = {"period": period, "days": row.days, "readings": row.readings}
+    for metric in METRICS:
+        average[f"avg_{metric}"] = round(getattr(row, f"avg_{metric}"), 2)
+        average[f"min_{metric}"] = getattr(row, f"min_{metric}")
+        average[f"max_{metric}"] = getattr(row, f"max_{metric}")
+    return average
+
+
+# สรุปรายเดือนของอุปกรณ์ (ระบุ year เพื่อดูเฉพาะปีนั้น)
+# year สูงสุด 9998: ช่วงของปีสิ้นสุดที่ 1 ม.ค. ของปีถัดไป ซึ่ง date รองรับถึงปี 9999
+@router.get("/monthly/{api_key}")
+async def get_monthly_averages(
+    api_key: str,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    year: Annotated[int | None, Query(ge=1, le=9998)] = None,
+) -> list[PeriodAverageRead]:
+    stmt = select(DBMonthlyAverage).where(DBMonthlyAverage.api_key == api_key)
+    if year is not None:
+        stmt = stmt.where(DBMonthlyAverage.month >= date(year, 1, 1)).where(DBMonthlyAverage.month < date(year + 1, 1, 1))
+    result = await session.exec(stmt.order_by(DBMonthlyAverage.month))
+
+    return [period_average(row.month.strftime("%Y-%m"), row) for row in result.all()]
+
+
+# สรุปรายปีของอุปกรณ์
+@router.get("/yearly/{api_key}")
+async def get_yearly_averages(
+    api_key: str,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> list[PeriodAverageRead]:
     result = await session.exec(
-        select(DBDailyAverage)
-        .where(DBDailyAverage.api_key == api_key)
-        .order_by(DBDailyAverage.date)  # เรียงลำดับวันที่จากน้อยไปมาก
+        select(DBYearlyAverage).where(DBYearlyAverage.api_key == api_key).order_by(DBYearlyAverage.year)
     )
-    daily_averages = result.all()
 
-    if not daily_averages:
-        raise HTTPException(status_code=404, detail=f"No daily averages found for API Key: {api_key}.")
+    return [period_average(str(row.year), row) for row in result.all()]
 
-    # จัดข้อมูลในรูปแบบที่เหมาะกับ Recharts (รูปเเบบ Line Chart)
-    return [
-        {
-            "date": daily_avg.date.strftime("%Y-%m-%d"),
-            "avg_pm2_5": daily_avg.avg_pm2_5,
-            "avg_pm10": daily_avg.avg_pm10,
-            "avg_co2": daily_avg.avg_co2,
-            "avg_tvoc": daily_avg.avg_tvoc,
-            "avg_humidity": daily_avg.avg_humidity,
-            "avg_temperature": daily_avg.avg_temperature,
-        }
-        for daily_avg in daily_averages
-    ]
+
+# สำหรับ superadmin สร้างตัวสะสมค่าเฉลี่ยรายวันใหม่จากข้อมูล detect ดิบ
+@router.post("/rebuild")
+async def rebuild_daily_averages_by_range(
+    start: date,
+    end: date,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if end < start:
+        raise HTTPException(status_code=400, detail="The end date must not be earlier than the start date.")
+
+    rebuilt = await rebuild_daily_averages(session, start, end)
+    await session.commit()
+    response_cache.clear()
+
+    return {"message": f"Rebuilt {rebuilt} daily averages from {start} to {end}."}
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import Annotated
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from notebook import dashboard, pagination
+from notebook.models import get_session
+from notebook.models.dashboard import DashboardSnapshot
+
+router = APIRouter(prefix="/dashboard", tags=["dashboard"])
+
+
+# ข้อมูลทั้งหมดของหน้า dashboard ใน request เดียว: ข้อมูลอุปกรณ์ ข้อมูลล่าสุด ระดับคุณภาพ
+# และค่าเฉลี่ยรายวันย้อนหลัง แทนการเรียก /devices/all, /showdetect/all, /scores และ /avg ทีละอุปกรณ์
+# ส่ง If-None-Match ด้วย ETag ที่ได้ครั้งก่อน ถ้าข้อมูลไม่เปลี่ยนจะได้ 304 ที่ไม่มี body
+@router.get("/snapshot", response_model=None, responses={200: {"model": DashboardSnapshot}})
+async def get_dashboard_snapshot(
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    page: Annotated[int, Query(ge=1)] = 1,
+    size: Annotated[int, Query(ge=1, le=1000)] = 100,
+    cursor: str | None = None,
+) -> Response:
+    # อ่านด้วย cursor ไม่ใช้ page: ทุก page ของ cursor เดียวกันใช้ snapshot เดียวกัน
+    key = (None if cursor else page, size, cursor)
+    cached = dashboard.cache.get(key)
+    if cached is None:
+        try:
+            snapshot = await dashboard.build_snapshot(session, page, size, cursor)
+        except pagination.CursorError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+        cached = dashboard.cache.set(key, snapshot.model_dump_json().encode())
+
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        dashboard.cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
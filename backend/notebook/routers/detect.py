@@ -1,17 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import select, func
+from fastapi import APIRouter, Body, HTTPException, Depends, Query, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+from sqlmodel import select
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from datetime import date, datetime
-from sqlalchemy import delete
+import asyncio
+from datetime import datetime
 
-from notebook.models.daily_average import *
 from notebook.models.device import *
 from notebook.models.detect import *
-from notebook.models.score import *
-from notebook.models.showdetect import *
+from notebook.models.detect_history import *
 from notebook.deps import *
+from notebook.ingest import LocalDateTime, ingest_detects
+from notebook.codec import BINARY_CONTENT_TYPE, FrameError, decode_frame
+from notebook import device_cache, history, ingest_queue, latest
 
 from notebook.models import get_session
 
@@ -19,237 +23,177 @@ router = APIRouter(prefix="/detects", tags=["detects"])
 
 SIZE_PER_PAGE = 50
 
-def get_quality_level(value, pollutant):
-    levels = {
-        'PM2.5': [
-            {'range': (0, 25), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
-            {'range': (26, 35), 'level': 'ปานกลาง', 'fix': 'ควรสวมหน้ากาก , ควรทำความสะอาดห้อง'},
-            {'range': (36, float('inf')), 'level': 'อันตราย', 'fix': 'ต้องสวมหน้ากาก , ใช้เครื่องฟอกอากาศ , ต้องทำความสะอาดห้องเเละทำความสะอาดแผ่นกรองแอร์'}
-        ],
-        'PM10': [
-            {'range': (0, 50), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
-            {'range': (51, 70), 'level': 'ปานกลาง', 'fix': 'ควรสวมหน้ากาก , ควรทำความสะอาดห้อง'},
-            {'range': (71, float('inf')), 'level': 'อันตราย', 'fix': 'ต้องสวมหน้ากาก , ใช้เครื่องฟอกอากาศ , ต้องทำความสะอาดห้องเเละทำความสะอาดแผ่นกรองแอร์'}
-        ],
-        'CO2': [
-            {'range': (0, 1000), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
-            {'range': (1001, 1400), 'level': 'ปานกลาง', 'fix': 'เปิดหน้าต่างหรือประตูชั่วคราว , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ'},
-            {'range': (1401, float('inf')), 'level': 'อันตราย', 'fix': ' เปิดหน้าต่างหรือประตูให้นานขึ้น , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ'}
-        ],
-        'TVOC': [
-            {'range': (0, 1000), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
-            {'range': (1001, 1400), 'level': 'ปานกลาง', 'fix': 'เปิดหน้าต่างหรือประตูชั่วคราว , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ , ต้องค้นหาเเละกำจัดกลิ่นไม่พึงประสงค์หรือสารเคมีออกจากห้อง'},
-            {'range': (1401, float('inf')), 'level': 'อันตราย', 'fix': 'เปิดหน้าต่างหรือประตูให้นานขึ้น , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ , ต้องค้นหาเเละกำจัดกลิ่นไม่พึงประสงค์หรือสารเคมีออกจากห้องทันที'}
-        ],
-        'Temperature': [
-            {'range': (24.00, 26.99), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
-            {'range': (22.00, 23.99), 'level': 'ปานกลาง', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วง 24-26°C'},
-            {'range': (27.00, 28.99), 'level': 'ปานกลาง', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วง 24-26°C'},
-            {'range': (float('-inf'), 21.99), 'level': 'อันตราย', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วงที่เหมาะสม , ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'},
-            {'range': (29.00, float('inf')), 'level': 'อันตราย', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วงที่เหมาะสม , ใช้พัดลมช่วยกระจายความเย็น , ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'}
-        ],
-        'Humidity': [
-            {'range': (50.00, 65.99), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
-            {'range': (40.00, 49.99), 'level': 'ปานกลาง', 'fix': 'เปิดใช้เครื่องพ่นไอน้ำเพื่อเพิ่มความชื้น'},
-            {'range': (66.00, 75.99), 'level': 'ปานกลาง', 'fix': 'ปรับแอร์เป็น Dry Mode เพื่อลดความชื้น '},
-            {'range': (float('-inf'), 39.99), 'level': 'อันตราย', 'fix': 'เปิดใช้เครื่องพ่นไอน้ำเพื่อเพิ่มความชื้นอย่างต่อเนื่อง , ห้ามใช้แอร์โหมดเย็น ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'},
-            {'range': (76.00, float('inf')), 'level': 'อันตราย', 'fix': 'เปิดแอร์ในโหมด Dry Mode อย่างต่อเนื่อง ,  ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'}
-        ]
-    }
-
-    if pollutant not in levels:
-        return 'ไม่ทราบ'
-
-    for level in levels[pollutant]:
-        low, high = level['range']
-        if low <= value <= high:
-            return level['level'], level['fix']
-
-    return 'ไม่ทราบ'
-
-
-async def update_daily_average(
-    session: AsyncSession, api_key: str, specific_date: date
-):
-    # ดึงข้อมูล detect เฉพาะวันนั้น
-    result = await session.exec(
-        select(
-            func.avg(DBDetect.pm2_5).label("avg_pm2_5"),
-            func.avg(DBDetect.pm10).label("avg_pm10"),
-            func.avg(DBDetect.co2).label("avg_co2"),
-            func.avg(DBDetect.tvoc).label("avg_tvoc"),
-            func.avg(DBDetect.humidity).label("avg_humidity"),
-            func.avg(DBDetect.temperature).label("avg_temperature"),
+# จำนวนข้อมูลสูงสุดต่อ batch (ตอบ 422 เมื่อเกิน) gateway ที่มีข้อมูลค้างมากกว่านี้ให้แบ่งส่งหลายครั้ง
+MAX_BATCH_SIZE = 10000
+
+
+def enqueue_detects(detects: list[CreateDetect]):
+    # โหมด queue: เพิ่มข้อมูลเข้าคิว (ตอบ 503 เมื่อคิวเต็ม)
+    try:
+        ingest_queue.queue.put_many(detects)
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The ingest queue is full. Please retry later.",
+            headers={"Retry-After": "1"},
         )
-        .where(DBDetect.api_key == api_key)
-        .where(func.date(DBDetect.timestamp) == specific_date)
-    )
-    averages = result.one()
-
-    # กำหนดหลักทศนิยมให้กับค่าเฉลี่ย
-    rounded_averages = {
-        "avg_pm2_5": round(averages.avg_pm2_5 or 0, 2),
-        "avg_pm10": round(averages.avg_pm10 or 0, 2),
-        "avg_co2": round(averages.avg_co2 or 0, 2),
-        "avg_tvoc": round(averages.avg_tvoc or 0, 2),
-        "avg_humidity": round(averages.avg_humidity or 0, 2),
-        "avg_temperature": round(averages.avg_temperature or 0, 2),
-    }
-
-    # ตรวจสอบว่ามีข้อมูลในตาราง daily_averages สำหรับ API Key และวันที่นี้หรือไม่
-    existing_daily_average = await session.exec(
-        select(DBDailyAverage)
-        .where(DBDailyAverage.api_key == api_key)
-        .where(DBDailyAverage.date == specific_date)
-    )
-    daily_average = existing_daily_average.one_or_none()
-
-    if daily_average:
-        # หากมีข้อมูลอยู่แล้ว ทำการอัปเดต
-        daily_average.avg_pm2_5 = rounded_averages["avg_pm2_5"]
-        daily_average.avg_pm10 = rounded_averages["avg_pm10"]
-        daily_average.avg_co2 = rounded_averages["avg_co2"]
-        daily_average.avg_tvoc = rounded_averages["avg_tvoc"]
-        daily_average.avg_humidity = rounded_averages["avg_humidity"]
-        daily_average.avg_temperature = rounded_averages["avg_temperature"]
-        session.add(daily_average)
-        await session.commit()
-        await session.refresh(daily_average)  
-
-    else:
-        # หากยังไม่มีข้อมูล ทำการเพิ่มใหม่
-        new_daily_average = DBDailyAverage(
-            api_key=api_key,
-            date=specific_date,
-            avg_pm2_5=rounded_averages["avg_pm2_5"],
-            avg_pm10=rounded_averages["avg_pm10"],
-            avg_co2=rounded_averages["avg_co2"],
-            avg_tvoc=rounded_averages["avg_tvoc"],
-            avg_humidity=rounded_averages["avg_humidity"],
-            avg_temperature=rounded_averages["avg_temperature"],
+
+
+def reject_detect(index: int, detect: CreateDetect) -> RejectedDetect:
+    return RejectedDetect(index=index, api_key=detect.api_key, detail="Invalid API Key. Please add devices first.")
+
+
+async def store_detect_batch(session: AsyncSession, detects: list[CreateDetect]):
+    # ตรวจสอบ API Key ทั้งหมดใน batch ผ่านแคชอุปกรณ์ (query เดียวสำหรับ key ที่ไม่อยู่ในแคช)
+    known_api_keys = await device_cache.get_devices(session, {detect.api_key for detect in detects})
+
+    # แยกข้อมูลที่ใช้ได้ออกจากข้อมูลที่ถูกปฏิเสธ
+    accepted = []
+    rejected = []
+    for index, detect in enumerate(detects):
+        if detect.api_key in known_api_keys:
+            accepted.append((index, detect))
+        else:
+            rejected.append(reject_detect(index, detect))
+
+    if accepted and ingest_queue.queue:
+        enqueue_detects([detect for _, detect in accepted])
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=DetectBatchResult(accepted=len(accepted), rejected=rejected).model_dump(),
         )
-        session.add(new_daily_average)
+
+    stored = 0
+    if accepted:
+        dbdetects = await ingest_detects(session, [detect for _, detect in accepted])
         await session.commit()
-        await session.refresh(new_daily_average)  
+        stored = len(dbdetects)
+
+        # อุปกรณ์ที่ถูกลบหลังจากตรวจผ่านแคช: ingest_detects ข้ามข้อมูลเหล่านี้ไป
+        if stored < len(accepted):
+            stored_api_keys = {dbdetect.api_key for dbdetect in dbdetects}
+            rejected.extend(
+                reject_detect(index, detect) for index, detect in accepted if detect.api_key not in stored_api_keys
+            )
+            rejected.sort(key=lambda item: item.index)
+
+    return DetectBatchResult(accepted=stored, rejected=rejected)
+
+
+# สำหรับ gateway หรืออุปกรณ์ที่เก็บข้อมูลไว้ระหว่างเครือข่ายขัดข้อง แล้วส่งมาพร้อมกันทีเดียว
+@router.post("/batch")
+async def create_detect_batch(
+    detects: Annotated[list[CreateDetect], Body(max_length=MAX_BATCH_SIZE)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> DetectBatchResult:
+    if not detects:
+        raise HTTPException(status_code=400, detail="No detection data provided.")
 
+    return await store_detect_batch(session, detects)
 
-@router.post("/create")
+
+async def read_detect(request: Request) -> CreateDetect:
+    # body แบบ JSON (CreateDetect) ตอบ 422 ในรูปแบบเดียวกับการ validate body ของ FastAPI
+    try:
+        return CreateDetect.model_validate_json(await request.body())
+    except ValidationError as error:
+        raise RequestValidationError(
+            [{**detail, "loc": ("body", *detail["loc"])} for detail in error.errors(include_url=False)]
+        )
+
+
+# เลือกรูปแบบของ body ตาม Content-Type:
+# JSON = ข้อมูลหนึ่งชุด (CreateDetect), application/vnd.aircheck.readings = binary frame หนึ่งหรือหลายชุด (ดู notebook/codec.py)
+@router.post(
+    "/create",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {"schema": CreateDetect.model_json_schema()},
+                BINARY_CONTENT_TYPE: {"schema": {"type": "string", "format": "binary"}},
+            },
+        }
+    },
+)
 async def create_detect(
-    detect: CreateDetect,
+    request: Request,
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> DetectRead:
+) -> DetectRead | DetectBatchResult:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type == BINARY_CONTENT_TYPE:
+        try:
+            _, detects = decode_frame(await request.body())
+        except FrameError as error:
+            raise HTTPException(status_code=400, detail=str(error))
 
-    # คำนวณวันที่ปัจจุบัน 
-    today = datetime.now().date()
+        if not detects:
+            raise HTTPException(status_code=400, detail="No detection data provided.")
 
-    # ลบข้อมูล detect ที่มีวันที่น้อยกว่าวันปัจจุบัน
-    delete_stmt = delete(DBDetect).where(func.date(DBDetect.timestamp) < today)
-    await session.execute(delete_stmt)
-    await session.commit()
+        return await store_detect_batch(session, detects)
+
+    detect = await read_detect(request)
 
-    # ตรวจสอบว่า API Key มีอยู่ในฐานข้อมูลหรือไม่
-    device = await session.exec(select(DBDevice).where(DBDevice.api_key == detect.api_key))
-    device = device.one_or_none()
+    # ตรวจสอบว่า API Key มีอยู่ในระบบหรือไม่ (ผ่านแคชอุปกรณ์)
+    device = await device_cache.get_device(session, detect.api_key)
     if not device:
         raise HTTPException(status_code=400, detail="Invalid API Key. Please add devices first.")
 
-    # หากพบ API Key ในระบบ ให้สร้าง detect ใหม่
-    dbdata = DBDetect(**detect.model_dump())
-    session.add(dbdata)
-    await session.commit()
-    await session.refresh(dbdata)  
-
-    # บันทึกข้อมูลที่วัดได้ลงในตาราง Showdetect
-    existing_show = await session.exec(select(DBShow).where(DBShow.api_key == detect.api_key))
-    show = existing_show.one_or_none()
-
-    if show:
-        # หากมีข้อมูลอยู่แล้ว ทำการอัปเดต
-        show.pm2_5 = detect.pm2_5
-        show.pm10 = detect.pm10
-        show.co2 = detect.co2
-        show.tvoc = detect.tvoc
-        show.humidity = detect.humidity
-        show.temperature = detect.temperature
-        show.timestamp = detect.timestamp
-        session.add(show)
-        await session.commit()
-        await session.refresh(show)  
-
-    else:
-        # หากยังไม่มีข้อมูล ทำการเพิ่มใหม่
-        new_show = DBShow(
-            api_key=detect.api_key,
-            pm2_5=detect.pm2_5,
-            pm10=detect.pm10,
-            co2=detect.co2,
-            tvoc=detect.tvoc,
-            humidity=detect.humidity,
-            temperature=detect.temperature,
-            timestamp=detect.timestamp,
-        )
-        session.add(new_show)
-        await session.commit()
-        await session.refresh(new_show)  
-
-    # คำนวณระดับคุณภาพ
-    pm2_5_quality, pm2_5_fix = get_quality_level(dbdata.pm2_5, "PM2.5")
-    pm10_quality, pm10_fix = get_quality_level(dbdata.pm10, "PM10")
-    co2_quality, co2_fix = get_quality_level(dbdata.co2, "CO2")
-    tvoc_quality, tvoc_fix = get_quality_level(dbdata.tvoc, "TVOC")
-    humidity_quality, humidity_fix = get_quality_level(dbdata.humidity, "Humidity")
-    temperature_quality, temperature_fix = get_quality_level(dbdata.temperature, "Temperature")
-
-    # ตรวจสอบว่ามีข้อมูลในตาราง score สำหรับ API Key นี้หรือยัง
-    existing_score = await session.exec(select(DBScore).where(DBScore.api_key == detect.api_key))
-    score = existing_score.one_or_none()
-
-    if score:
-        # หากมีข้อมูลอยู่แล้ว ทำการอัปเดต
-        score.timestamp = dbdata.timestamp
-        score.pm2_5_quality_level = pm2_5_quality
-        score.pm2_5_fix = pm2_5_fix
-        score.pm10_quality_level = pm10_quality
-        score.pm10_fix = pm10_fix
-        score.co2_quality_level = co2_quality
-        score.co2_fix = co2_fix
-        score.tvoc_quality_level = tvoc_quality
-        score.tvoc_fix = tvoc_fix
-        score.humidity_quality_level = humidity_quality
-        score.humidity_fix = humidity_fix
-        score.temperature_quality_level = temperature_quality
-        score.temperature_fix = temperature_fix
-        session.add(score)
-        await session.commit()
-        await session.refresh(score)  
-
-    else:
-        # หากยังไม่มีข้อมูล ทำการเพิ่มใหม่
-        new_score = DBScore(
-            api_key=dbdata.api_key,
-            timestamp=dbdata.timestamp,
-            pm2_5_quality_level=pm2_5_quality,
-            pm2_5_fix=pm2_5_fix,
-            pm10_quality_level=pm10_quality,
-            pm10_fix=pm10_fix,
-            co2_quality_level=co2_quality,
-            co2_fix=co2_fix,
-            tvoc_quality_level=tvoc_quality,
-            tvoc_fix=tvoc_fix,
-            humidity_quality_level=humidity_quality,
-            humidity_fix=humidity_fix,
-            temperature_quality_level=temperature_quality,
-            temperature_fix=temperature_fix,
+    # โหมด queue: ตอบกลับ 202 ทันที แล้วให้ flusher บันทึกภายหลัง
+    if ingest_queue.queue:
+        enqueue_detects([detect])
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"message": "Detection data accepted."},
         )
-        session.add(new_score)
-        await session.commit()
-        await session.refresh(new_score)  
 
-    # อัปเดตค่าเฉลี่ยรายวัน
-    specific_date = dbdata.timestamp.date()  # ดึงวันที่จาก timestamp
-    await update_daily_average(session, detect.api_key, specific_date)
+    # บันทึก detect, showdetect, score และค่าเฉลี่ยรายวัน แล้ว commit ครั้งเดียว
+    dbdetects = await ingest_detects(session, [detect])
+    await session.commit()
+    if not dbdetects:
+        # อุปกรณ์ถูกลบหลังตรวจผ่านแคช
+        raise HTTPException(status_code=400, detail="Invalid API Key. Please add devices first.")
+
+    return DetectRead.model_validate(dbdetects[0])
+
+
+# สถิติของคิวรับข้อมูล (โหมด queue)
+@router.get("/queue/stats")
+async def get_ingest_queue_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not ingest_queue.queue:
+        raise HTTPException(status_code=404, detail="The ingest queue is not enabled.")
+
+    return ingest_queue.queue.stats()
 
-    return DetectRead.model_validate(dbdata)
+
+# ประวัติข้อมูลดิบของอุปกรณ์ในช่วงเวลา [start, end) (เฉพาะโหมดเก็บประวัติ)
+@router.get("/history/{api_key}")
+async def get_detect_history(
+    api_key: str,
+    start: LocalDateTime,
+    end: LocalDateTime,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    limit: Annotated[int, Query(ge=1, le=50000)] = 10000,
+) -> list[DetectHistoryRead]:
+    if not history.store:
+        raise HTTPException(status_code=404, detail="Detect history is not enabled.")
+
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be later than start.")
+
+    # เงื่อนไขช่วงเวลาทำให้ Postgres อ่านเฉพาะ partition ของเดือนที่เกี่ยวข้อง
+    result = await session.exec(
+        select(DBDetectHistory)
+        .where(DBDetectHistory.api_key == api_key)
+        .where(DBDetectHistory.timestamp >= start)
+        .where(DBDetectHistory.timestamp < end)
+        .order_by(DBDetectHistory.timestamp)
+        .limit(limit)
+    )
+
+    return [DetectHistoryRead.model_validate(row) for row in result.all()]
 
 
 @router.get("/{api_key}")
@@ -258,9 +202,22 @@ async def get_detects_by_api_key(
     session: Annotated[AsyncSession, Depends(get_session)],
 ) -> DetectRead:  
 
-    # ค้นหาข้อมูลล่าสุดจาก DBDetect ตาม API Key
-    result = await session.exec(select(DBDetect).where(DBDetect.api_key == api_key))
-    detect = result.one_or_none()  
+    # ตอบจากข้อมูลล่าสุดในหน่วยความจำ (detect_id เป็น None เมื่อ detect ล่าสุดถูกลบตามอายุข้อมูลแล้ว)
+    if latest.store:
+        await latest.store.ensure_fresh()
+        reading = latest.store.get(api_key)
+        if not reading or reading.detect_id is None:
+            raise HTTPException(status_code=404, detail=f"No detection data found for API Key: {api_key}.")
+        return reading.detect()
+
+    # ค้นหาข้อมูลล่าสุดจาก DBDetect ตาม API Key (ใช้ index (api_key, timestamp))
+    result = await session.exec(
+        select(DBDetect)
+        .where(DBDetect.api_key == api_key)
+        .order_by(DBDetect.timestamp.desc())
+        .limit(1)
+    )
+    detect = result.first()
 
     if not detect:
         raise HTTPException(status_code=404, detail=f"No detection data found for API Key: {api_key}.")
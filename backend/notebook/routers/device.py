@@ -1,15 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlmodel import select
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from notebook.models.daily_average import *
+from notebook.models.period_average import *
 from notebook.models.showdetect import *
 from notebook.models.detect import *
 from notebook.models.score import *
 from notebook.models.device import *
 from notebook.models.users import *
 from notebook.deps import *
+from notebook import bulk_delete, device_cache, pagination, response_cache
 
 from notebook.models import get_session
 
@@ -49,6 +53,9 @@ async def create_device(
     session.add(dbdevice)
     await session.commit()
     await session.refresh(dbdevice)
+    device_cache.invalidate(dbdevice.api_key)
+    pagination.invalidate("devices")
+    response_cache.invalidate(dbdevice.api_key)
 
     return DeviceRead.model_validate(dbdevice)
 
@@ -57,36 +64,28 @@ async def create_device(
 async def read_devices(
     session: Annotated[AsyncSession, Depends(get_session)],
     #current_user: Annotated[UserRead, Depends(get_current_active_user)],
-    page: int = 1,  # หน้าปัจจุบัน (default = 1)
-    size: int = 8,  # จำนวนรายการต่อหน้า (default = 8)
+    page: Annotated[int, Query(ge=1)] = 1,  # หน้าปัจจุบัน (default = 1)
+    size: Annotated[int, Query(ge=1, le=1000)] = 8,  # จำนวนรายการต่อหน้า (default = 8)
+    cursor: str | None = None,  # next_cursor จากหน้าก่อน (แทน page)
 ) -> DeviceList:
 
-    # Query จำนวนรายการทั้งหมด
-    total_devices_query = await session.exec(select(DBDevice))
-    total_devices = len(total_devices_query.all())  # จำนวนทั้งหมด
+    # Query รายการของอุปกรณ์และเรียงตาม ID จากเก่าไปใหม่ พร้อมจำนวนทั้งหมดด้วย count(*)
+    try:
+        result = await pagination.paginate(session, select(DBDevice), DBDevice.id, "devices", page, size, cursor)
+    except pagination.CursorError as error:
+        raise HTTPException(status_code=400, detail=str(error))
 
-    # คำนวณ offset และ limit สำหรับ pagination
-    offset = (page - 1) * size
-
-    # Query รายการของอุปกรณ์และเรียงตาม ID จากเก่าไปใหม่
-    result = await session.exec(
-        select(DBDevice).order_by(DBDevice.id.asc()).offset(offset).limit(size)
-    )
-    dbdevices = result.all()
-
-    if not dbdevices:
+    if not result.items:
         raise HTTPException(status_code=404, detail="No devices found.")
-    
-    # คำนวณจำนวนหน้าทั้งหมด
-    total_pages = (total_devices + size - 1) // size
 
     # สร้าง Response พร้อมข้อมูล Pagination
     return DeviceList(
-        devices=[DeviceRead.model_validate(dev) for dev in dbdevices],
-        total=total_devices,
-        page=page,
-        size=size,
-        total_pages=total_pages,
+        devices=[DeviceRead.model_validate(dev) for dev in result.items],
+        total=result.total,
+        page=result.page,
+        size=result.size,
+        total_pages=result.total_pages,
+        next_cursor=result.next_cursor,
     )
 
 
@@ -136,6 +135,7 @@ async def update_device_by_api_key(
     session.add(dbdevice)
     await session.commit()
     await session.refresh(dbdevice)
+    device_cache.invalidate(api_key)
 
     return DeviceRead.model_validate(dbdevice)
 
@@ -146,119 +146,81 @@ async def get_device_settime(
     api_key: str,
     session: Annotated[AsyncSession, Depends(get_session)],
 ) -> dict:
-    result = await session.exec(select(DBDevice.device_settime).where(DBDevice.api_key == api_key))
-    device_settime = result.one_or_none()
+    # อุปกรณ์ทุกตัวเรียกทุกรอบการส่งข้อมูล จึงอ่านผ่านแคชอุปกรณ์
+    device = await device_cache.get_device(session, api_key)
 
-    if device_settime is None:
+    if not device:
         raise HTTPException(status_code=404, detail="Device not found.")
 
-    return {"device_settime": device_settime}
+    return {"device_settime": device.device_settime}
 
 
 # สำหรับดูปีเเละเดือน เพื่อใช้ประกอบการตัดสินใจ
 @router.get("/timestamps/{api_key}")
 async def get_timestamps_by_api_key(
     api_key: str,
+    request: Request,
     session: Annotated[AsyncSession, Depends(get_session)],
     current_user: Annotated[UserRead, Depends(get_current_active_user)],  
 ) -> list[str]:
-    # ดึงข้อมูล date ตาม API Key จาก DBDailyAverage
-    result = await session.exec(select(DBDailyAverage.date).where(DBDailyAverage.api_key == api_key))
-    dates = result.all()
-
-    # แปลงเป็นปีและเดือนเท่านั้น
-    year_months = [d.strftime("%Y-%m") for d in dates if d]
+    # แคชตรวจหลัง get_current_active_user ทำงานแล้ว จึงไม่ข้ามการตรวจสิทธิ์
+    cached = response_cache.lookup(request, api_key)
+    if cached.response:
+        return cached.response
 
-    # ลบข้อมูลที่ซ้ำกันและเรียงลำดับ
-    unique_year_months = sorted(set(year_months))
+    # เดือนที่มีข้อมูล จากสรุปรายเดือน (query เดียวผ่าน unique index (api_key, month))
+    result = await session.exec(
+        select(DBMonthlyAverage.month).where(DBMonthlyAverage.api_key == api_key).order_by(DBMonthlyAverage.month)
+    )
 
-    return unique_year_months
+    return cached.respond([month.strftime("%Y-%m") for month in result.all()])
 
 
+# ลบอุปกรณ์และข้อมูลทั้งหมด ด้วย DELETE ทีละ chunk (background=true: ทำงานเบื้องหลัง ดูสถานะที่ /devices/delete_jobs/{job_id})
 @router.delete("/delete/{api_key}")
 async def delete_device_by_api_key(
     api_key: str,
     session: Annotated[AsyncSession, Depends(get_session)],
     current_user: Annotated[UserRead, Depends(get_current_active_user)],  
+    background: bool = False,
 ):
-    # ตรวจสอบว่าอุปกรณ์มีอยู่หรือไม่
-    result = await session.exec(select(DBDevice).where(DBDevice.api_key == api_key))
-    dbdevice = result.one_or_none()
-
-    if not dbdevice:
+    # ตรวจสอบว่าอุปกรณ์มีอยู่หรือไม่ (หรือถูกลบแล้วแต่ลบข้อมูลไม่ครบ ให้สั่งลบซ้ำได้)
+    result = await session.exec(select(DBDevice.id).where(DBDevice.api_key == api_key))
+    if not result.one_or_none() and not await bulk_delete.device_months(api_key):
         raise HTTPException(status_code=404, detail="Device not found.")
 
-    # ลบข้อมูลในตาราง showdetect
-    showdetect_result = await session.exec(select(DBShow).where(DBShow.api_key == api_key))
-    showdetects = showdetect_result.all()
-    for show in showdetects:
-        await session.delete(show)
-
-    # ลบข้อมูลในตาราง daily_averages
-    daily_avg_result = await session.exec(select(DBDailyAverage).where(DBDailyAverage.api_key == api_key))
-    daily_averages = daily_avg_result.all()
-    for daily_avg in daily_averages:
-        await session.delete(daily_avg)
-
-    # ลบข้อมูลในตาราง scores
-    score_result = await session.exec(select(DBScore).where(DBScore.api_key == api_key))
-    scores = score_result.all()
-    for score in scores:
-        await session.delete(score)
-
-    # ลบข้อมูลในตาราง detects
-    detect_result = await session.exec(select(DBDetect).where(DBDetect.api_key == api_key))
-    detects = detect_result.all()
-    for detect in detects:
-        await session.delete(detect)
-
-    # ลบอุปกรณ์
-    await session.delete(dbdevice)
-    await session.commit()
+    if background:
+        job = bulk_delete.deleter.submit(
+            "delete_device",
+            api_key,
+            lambda progress: bulk_delete.deleter.delete_device(api_key, progress),
+            user_id=current_user.id,
+        )
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(job.to_dict()))
+
+    removed = await bulk_delete.deleter.delete_device(api_key)
 
-    return {"message": "The device and all associated data have been successfully erased"}
+    return {"message": "The device and all associated data have been successfully erased", "removed": removed}
 
 
+# ลบข้อมูลของเดือนที่เก่าที่สุด months_to_delete เดือน (background=true: ทำงานเบื้องหลัง)
 @router.delete("/delete_by_month/{api_key}")
 async def delete_data_by_month(
     api_key: str,
     months_to_delete: int,
-    session: Annotated[AsyncSession, Depends(get_session)],
     current_user: Annotated[UserRead, Depends(get_current_active_user)],  
+    background: bool = False,
 ):
-    # ดึงข้อมูล daily_average ตาม API Key และจัดเรียงตามวันที่
-    daily_avg_result = await session.exec(
-        select(DBDailyAverage).where(DBDailyAverage.api_key == api_key).order_by(DBDailyAverage.date.asc())
-    )
-    daily_averages = daily_avg_result.all()
+    if months_to_delete < 1:
+        raise HTTPException(status_code=400, detail="months_to_delete must be at least 1.")
 
-    # ดึงข้อมูล detect ตาม API Key และจัดเรียงตาม timestamp
-    detect_result = await session.exec(
-        select(DBDetect).where(DBDetect.api_key == api_key).order_by(DBDetect.timestamp.asc())
-    )
-    detects = detect_result.all()
+    # เดือนที่มีข้อมูล คำนวณในฐานข้อมูล (ไม่โหลดข้อมูลทั้งหมดขึ้นมาจัดกลุ่มใน Python)
+    available_months = await bulk_delete.device_months(api_key)
 
-    if not daily_averages and not detects:
+    if not available_months:
         raise HTTPException(status_code=404, detail="The daily average data for this device is not available.")
 
-    # จัดกลุ่มข้อมูล daily_average ตามเดือน
-    grouped_daily_avg = {}
-    for daily_avg in daily_averages:
-        month_key = daily_avg.date.strftime("%Y-%m") if daily_avg.date else None
-        if month_key not in grouped_daily_avg:
-            grouped_daily_avg[month_key] = []
-        grouped_daily_avg[month_key].append(daily_avg)
-
-    # จัดกลุ่มข้อมูล detect ตามเดือน
-    grouped_detects = {}
-    for detect in detects:
-        month_key = detect.timestamp.strftime("%Y-%m") if detect.timestamp else None
-        if month_key not in grouped_detects:
-            grouped_detects[month_key] = []
-        grouped_detects[month_key].append(detect)
-
     # ตรวจสอบว่ามีเดือนเพียงพอที่จะลบหรือไม่
-    available_months = sorted(set(grouped_daily_avg.keys()).union(grouped_detects.keys()))
     if len(available_months) < months_to_delete:
         raise HTTPException(
             status_code=400,
@@ -266,20 +228,33 @@ async def delete_data_by_month(
         )
 
     # ลบข้อมูลจากเดือนที่เก่าสุด
-    months_deleted = 0
-    for month in available_months:
-        if month in grouped_daily_avg:
-            for daily_avg in grouped_daily_avg[month]:
-                await session.delete(daily_avg)
+    months = available_months[:months_to_delete]
+
+    if background:
+        job = bulk_delete.deleter.submit(
+            "delete_by_month",
+            api_key,
+            lambda progress: bulk_delete.deleter.delete_months(api_key, months, progress),
+            user_id=current_user.id,
+        )
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=jsonable_encoder(job.to_dict()))
 
-        if month in grouped_detects:
-            for detect in grouped_detects[month]:
-                await session.delete(detect)
+    removed = await bulk_delete.deleter.delete_months(api_key, months)
 
-        months_deleted += 1
-        if months_deleted >= months_to_delete:
-            break
+    return {
+        "message": f"Deleted {len(months)} months of daily average and detect data successfully.",
+        "removed": removed,
+    }
 
-    await session.commit()
 
-    return {"message": f"Deleted {months_deleted} months of daily average and detect data successfully."}
+# สถานะของงานลบข้อมูลเบื้องหลัง (เฉพาะผู้ที่สั่งลบและ superadmin ผู้ใช้อื่นได้ 404 เหมือนไม่มีงานนี้)
+@router.get("/delete_jobs/{job_id}")
+async def get_delete_job(
+    job_id: str,
+    current_user: Annotated[UserRead, Depends(get_current_active_user)],  
+) -> dict:
+    job = bulk_delete.deleter.get_job(job_id)
+    if not job or (job.user_id != current_user.id and current_user.role != "superadmin"):
+        raise HTTPException(status_code=404, detail="Delete job not found.")
+
+    return job.to_dict()
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import Annotated, Literal
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import date
+
+from notebook.deps import *
+from notebook import device_cache, export
+from notebook.models import get_session
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+# ส่งออกข้อมูลดิบ (detects) หรือค่าเฉลี่ยรายวันของอุปกรณ์ในช่วงวันที่ [start, end] แบบ stream
+# หน่วยความจำคงที่ไม่ว่าช่วงวันที่จะยาวแค่ไหน
+# start / end เป็นวันที่ (ไม่มี timezone): ค่าเวลาเที่ยงคืนที่มี timezone ถูกอ่านเป็นวันที่นั้น เวลาอื่นได้ 422
+@router.get("/{api_key}")
+async def export_device_data(
+    api_key: str,
+    start: date,
+    end: date,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    current_user: Annotated[UserRead, Depends(get_current_active_user)],
+    table: Literal["detects", "daily_averages"] = "detects",
+    format: Literal["csv", "ndjson", "arrow"] = "csv",
+) -> StreamingResponse:
+    if end < start:
+        raise HTTPException(status_code=400, detail="The end date must not be earlier than the start date.")
+
+    if format == "arrow" and export.pa is None:
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow (poetry install -E arrow).")
+
+    if not await device_cache.get_device(session, api_key):
+        raise HTTPException(status_code=404, detail="Device not found.")
+
+    source = export.export_source(table)
+    encoder = export.ENCODERS[format](source)
+    filename = f"{api_key}_{table}_{start}_{end}.{encoder.extension}"
+
+    return StreamingResponse(
+        export.stream_export(encoder, source, api_key, start, end),
+        media_type=encoder.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,186 @@
+from fastapi import APIRouter, HTTPException, Depends, UploadFile
+from typing import Annotated, Literal
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime
+import io
+
+from notebook.deps import *
+from notebook import auth, broadcast, dashboard, device_cache, history, latest, models, pagination, response_cache, retention, single_flight
+from notebook.backfill import BackfillError, backfill
+from notebook.models import get_session
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+
+# สถิติการลบข้อมูลเก่าอัตโนมัติ
+@router.get("/retention")
+async def get_retention_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not retention.scheduler:
+        raise HTTPException(status_code=404, detail="The retention scheduler is not enabled.")
+
+    return retention.scheduler.stats()
+
+
+# สั่งลบข้อมูลเก่าทันทีโดยไม่ต้องรอรอบถัดไป
+@router.post("/retention/run")
+async def run_retention(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not retention.scheduler:
+        raise HTTPException(status_code=404, detail="The retention scheduler is not enabled.")
+
+    removed = await retention.scheduler.run_once()
+
+    return {"message": "Retention run completed.", "removed": removed}
+
+
+# สถิติของแคชอุปกรณ์ (ใช้ตรวจสอบว่าลดการ query ตาม api_key ได้จริง)
+@router.get("/device-cache")
+async def get_device_cache_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    return device_cache.cache.stats()
+
+
+# สถิติของตัวนับจำนวนแถวของการแบ่งหน้า
+@router.get("/pagination")
+async def get_pagination_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    return pagination.counter.stats()
+
+
+# สถิติของแคชผู้ใช้ที่ใช้ตรวจสิทธิ์
+@router.get("/user-cache")
+async def get_user_cache_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    return auth.cache.stats()
+
+
+# สถิติของ connection pool ของฐานข้อมูล
+@router.get("/db-pool")
+async def get_db_pool_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    return models.engine.pool.stats()
+
+
+# สถิติของแคช response (ETag / 304)
+@router.get("/response-cache")
+async def get_response_cache_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not response_cache.cache:
+        raise HTTPException(status_code=404, detail="The response cache is not enabled.")
+
+    return response_cache.cache.stats()
+
+
+# สถิติของการรวม request ที่ซ้ำกัน
+@router.get("/single-flight")
+async def get_single_flight_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not single_flight.flights:
+        raise HTTPException(status_code=404, detail="Request coalescing is not enabled.")
+
+    return single_flight.flights.stats()
+
+
+# สถิติของแคช snapshot ของ dashboard
+@router.get("/dashboard")
+async def get_dashboard_cache_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    return dashboard.cache.stats()
+
+
+# สถิติของการส่งข้อมูลให้ dashboard แบบ push (/ws/dashboard)
+@router.get("/dashboard-feed")
+async def get_dashboard_feed_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    return broadcast.broadcaster.stats()
+
+
+# สถิติของข้อมูลล่าสุดในหน่วยความจำ
+@router.get("/latest-store")
+async def get_latest_store_stats(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not latest.store:
+        raise HTTPException(status_code=404, detail="The latest reading store is not enabled.")
+
+    return latest.store.stats()
+
+
+# โหลดข้อมูลล่าสุดใหม่จากฐานข้อมูล (เช่น หลัง backfill ผ่าน CLI ซึ่งเป็นคนละ process)
+@router.post("/latest-store/reload")
+async def reload_latest_store(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not latest.store:
+        raise HTTPException(status_code=404, detail="The latest reading store is not enabled.")
+
+    await latest.store.reload()
+    response_cache.clear()
+
+    return {"message": "Latest reading store reloaded.", **latest.store.stats()}
+
+
+# รายการ partition ของประวัติข้อมูลดิบ
+@router.get("/detect-history")
+async def get_detect_history_partitions(
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not history.store:
+        raise HTTPException(status_code=404, detail="Detect history is not enabled.")
+
+    return {**history.store.stats(), "months": await history.store.partitions()}
+
+
+# ลบประวัติข้อมูลดิบของทุกอุปกรณ์ทั้งเดือน (DROP partition) เช่น /internal/detect-history/2024-01
+@router.delete("/detect-history/{year_month}")
+async def drop_detect_history_month(
+    year_month: str,
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+) -> dict:
+    if not history.store:
+        raise HTTPException(status_code=404, detail="Detect history is not enabled.")
+
+    try:
+        month = datetime.strptime(year_month, "%Y-%m").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Month must be in YYYY-MM format.")
+
+    if not await history.store.drop_months([month]):
+        raise HTTPException(status_code=404, detail=f"No detect history partition for {year_month}.")
+
+    return {"message": f"Deleted detect history for {year_month} successfully."}
+
+
+# นำเข้าข้อมูลย้อนหลังจากไฟล์ CSV / NDJSON (คอลัมน์เหมือนไฟล์จาก /export) ใน transaction เดียว
+# ถ้าไฟล์ไม่มีคอลัมน์ api_key ให้ระบุ api_key ของอุปกรณ์ ถ้าไม่ระบุ format จะดูจากนามสกุลไฟล์
+@router.post("/backfill")
+async def backfill_detects(
+    file: UploadFile,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    current_user: Annotated[UserRead, Depends(get_current_active_superuser)],
+    api_key: str | None = None,
+    format: Literal["csv", "ndjson"] | None = None,
+) -> dict:
+    if format is None:
+        format = "ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else "csv"
+
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        report = await backfill(session, lines, format, api_key)
+    except (BackfillError, UnicodeDecodeError) as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    await session.commit()
+
+    return {"message": "Backfill completed.", **report}
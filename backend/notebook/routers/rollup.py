@@ -0,0 +1,93 @@
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlmodel import select
+from typing import Annotated, Literal
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, time, timedelta
+
+from notebook.models.daily_average import *
+from notebook.models.rollup import *
+from notebook.ingest import METRICS, ROLLUP_TIERS, LocalDateTime, bucket_start
+from notebook.models import get_session
+
+router = APIRouter(prefix="/avg", tags=["avg"])
+
+# ขนาดของแต่ละระดับเป็นวินาที เรียงจากละเอียดไปหยาบ
+RESOLUTIONS = {
+    "5m": 5 * 60,
+    "hour": 60 * 60,
+    "day": 24 * 60 * 60,
+}
+
+
+def pick_resolution(requested: str, start: datetime, end: datetime, max_points: int) -> str | None:
+    # เลือกระดับที่ละเอียดที่สุด (ไม่ละเอียดกว่าที่ขอ) ที่จำนวนจุดในช่วง [start, end) ไม่เกิน max_points
+    # ทำให้ขนาดผลลัพธ์มีขอบเขตเสมอ ไม่ว่าข้อมูลดิบจะมีมากแค่ไหน
+    seconds = (end - start).total_seconds()
+    names = list(RESOLUTIONS)
+    candidates = names if requested == "auto" else names[names.index(requested):]
+    for name in candidates:
+        if seconds / RESOLUTIONS[name] <= max_points:
+            return name
+    return None
+
+
+def rollup_point(row) -> dict:
+    point = {"bucket": row.bucket, "readings": row.readings}
+    for metric in METRICS:
+        point[f"avg_{metric}"] = round(getattr(row, f"sum_{metric}") / row.readings, 2)
+        point[f"min_{metric}"] = getattr(row, f"min_{metric}")
+        point[f"max_{metric}"] = getattr(row, f"max_{metric}")
+    return point
+
+
+def daily_point(row) -> dict:
+    point = {"bucket": datetime.combine(row.date, time.min), "readings": row.readings}
+    for metric in METRICS:
+        point[f"avg_{metric}"] = getattr(row, f"avg_{metric}")
+    return point
+
+
+# ค่าเฉลี่ย/ต่ำสุด/สูงสุดตามช่วงเวลา ระดับ 5m, hour, day หรือ auto (เลือกตาม max_points)
+@router.get("/{resolution}/{api_key}")
+async def get_rollups(
+    resolution: Literal["auto", "5m", "hour", "day"],
+    api_key: str,
+    start: LocalDateTime,
+    end: LocalDateTime,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    max_points: Annotated[int, Query(ge=1, le=5000)] = 500,
+) -> RollupSeries:
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be later than start.")
+
+    chosen = pick_resolution(resolution, start, end, max_points)
+    if not chosen:
+        raise HTTPException(
+            status_code=400,
+            detail="The requested range has more than max_points days. Please narrow the range or raise max_points.",
+        )
+
+    if chosen == "day":
+        result = await session.exec(
+            select(DBDailyAverage)
+            .where(DBDailyAverage.api_key == api_key)
+            .where(DBDailyAverage.date >= start.date())
+            # วันที่เริ่มก่อน end (end เป็นเวลาแบบไม่รวม)
+            .where(DBDailyAverage.date <= (end - timedelta(microseconds=1)).date())
+            .order_by(DBDailyAverage.date)
+        )
+        points = [daily_point(row) for row in result.all()]
+    else:
+        model, minutes = ROLLUP_TIERS[chosen]
+        # รวมช่วงที่ start อยู่ด้วย
+        first_bucket = bucket_start(start, minutes)
+        result = await session.exec(
+            select(model)
+            .where(model.api_key == api_key)
+            .where(model.bucket >= first_bucket)
+            .where(model.bucket < end)
+            .order_by(model.bucket)
+        )
+        points = [rollup_point(row) for row in result.all()]
+
+    return RollupSeries(api_key=api_key, resolution=chosen, start=start, end=end, points=points)
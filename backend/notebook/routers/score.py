@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlmodel import select
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -6,20 +6,38 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from notebook.models.score import *
 from notebook.deps import *
 from notebook.models import get_session
+from notebook import latest, response_cache, single_flight
 
 router = APIRouter(prefix="/scores", tags=["scores"])
 
-@router.get("/{api_key}")
-async def get_scores_by_api_key(
-    api_key: str,
-    session: Annotated[AsyncSession, Depends(get_session)],
-) -> ScoreRead:  
 
-    # ค้นหาข้อมูลล่าสุดสำหรับ api_key
+async def load_score(session: AsyncSession, api_key: str) -> ScoreRead:
     result = await session.exec(select(DBScore).where(DBScore.api_key == api_key))
-    score = result.one_or_none()  
+    score = result.one_or_none()
 
     if not score:
         raise HTTPException(status_code=404, detail=f"No score data found for API Key: {api_key}.")
 
     return ScoreRead.model_validate(score)
+
+
+@router.get("/{api_key}")
+async def get_scores_by_api_key(
+    api_key: str,
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> ScoreRead:  
+    cached = response_cache.lookup(request, api_key)
+    if cached.response:
+        return cached.response
+
+    # ตอบจากข้อมูลล่าสุดในหน่วยความจำ
+    if latest.store:
+        await latest.store.ensure_fresh()
+        reading = latest.store.get(api_key)
+        if not reading or reading.score_id is None:
+            raise HTTPException(status_code=404, detail=f"No score data found for API Key: {api_key}.")
+        return cached.respond(reading.score())
+
+    # ค้นหาข้อมูลล่าสุดสำหรับ api_key (request เดียวกันที่เข้ามาพร้อมกันรอผลจาก query เดียว)
+    return cached.respond(await single_flight.run(cached.flight_key, lambda: load_score(session, api_key)))
@@ -1,44 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlmodel import select
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from notebook.models.showdetect import *
 from notebook.models import get_session
+from notebook import latest, pagination, response_cache
 
 router = APIRouter(prefix="/showdetect", tags=["showdetect"])
 
 @router.get("/all")
 async def get_all_showdetects(
+    request: Request,
     session: Annotated[AsyncSession, Depends(get_session)],
-    page: int = 1,  # หน้าปัจจุบัน (default = 1)
-    size: int = 8,  # จำนวนรายการต่อหน้า (default = 8)
+    page: Annotated[int, Query(ge=1)] = 1,  # หน้าปัจจุบัน (default = 1)
+    size: Annotated[int, Query(ge=1, le=1000)] = 8,  # จำนวนรายการต่อหน้า (default = 8)
+    cursor: str | None = None,  # next_cursor จากหน้าก่อน (แทน page)
 ) -> ShowList:
-
-    # Query จำนวนรายการทั้งหมด
-    total_showdetects_query = await session.exec(select(DBShow))
-    total_showdetects = len(total_showdetects_query.all())  # จำนวนทั้งหมด
-
-    # คำนวณ offset และ limit สำหรับ pagination
-    offset = (page - 1) * size
-
-    # Query รายการ showdetect และเรียงลำดับตาม ID จากเก่าไปใหม่
-    result = await session.exec(
-        select(DBShow).order_by(DBShow.id.asc()).offset(offset).limit(size)
-    )
-    showdetects = result.all()
-
-    if not showdetects:
+    # ขึ้นกับข้อมูลของทุกอุปกรณ์ จึงถูกล้างเมื่ออุปกรณ์ใดมีข้อมูลใหม่
+    cached = response_cache.lookup(request)
+    if cached.response:
+        return cached.response
+
+    try:
+        after_id = pagination.decode_cursor(cursor) if cursor else None
+    except pagination.CursorError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+    # ตอบจากข้อมูลล่าสุดในหน่วยความจำ
+    if latest.store:
+        await latest.store.ensure_fresh()
+        readings, total = latest.store.page((page - 1) * size, size + 1, after_id)
+        if not readings:
+            raise HTTPException(status_code=404, detail="No showdetect data found.")
+
+        return cached.respond(ShowList(
+            shows=[reading.show() for reading in readings[:size]],
+            total=total,
+            page=None if cursor else page,
+            size=size,
+            total_pages=(total + size - 1) // size,
+            next_cursor=pagination.encode_cursor(readings[size - 1].show_id) if len(readings) > size else None,
+        ))
+
+    # Query รายการ showdetect และเรียงลำดับตาม ID จากเก่าไปใหม่ พร้อมจำนวนทั้งหมดด้วย count(*)
+    result = await pagination.paginate(session, select(DBShow), DBShow.id, "showdetects", page, size, cursor)
+
+    if not result.items:
         raise HTTPException(status_code=404, detail="No showdetect data found.")
 
-    # คำนวณจำนวนหน้าทั้งหมด
-    total_pages = (total_showdetects + size - 1) // size
-
     # สร้าง Response พร้อมข้อมูล Pagination
-    return ShowList(
-        shows=[ShowRead.model_validate(show) for show in showdetects],
-        total=total_showdetects,
-        page=page,
-        size=size,
-        total_pages=total_pages,
-    )
+    return cached.respond(ShowList(
+        shows=[ShowRead.model_validate(show) for show in result.items],
+        total=result.total,
+        page=result.page,
+        size=result.size,
+        total_pages=result.total_pages,
+        next_cursor=result.next_cursor,
+    ))
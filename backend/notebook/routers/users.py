@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import select
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -6,6 +6,7 @@ from sqlmodel.ext.asyncio.session import AsyncSession
 from notebook.models.users import *
 from notebook.deps import *
 from notebook.models import get_session
+from notebook import auth, pagination
 
 router = APIRouter(prefix="/users", tags=["users"])
 
@@ -58,6 +59,7 @@ async def create(
     session.add(user)
     await session.commit()
     await session.refresh(user)
+    pagination.invalidate("users")
 
     return UserRead.model_validate(user)
 
@@ -81,6 +83,8 @@ async def delete_user(
 
     await session.delete(user)
     await session.commit()
+    pagination.invalidate("users")
+    auth.invalidate(target_user_id)
 
     return {"message": "User deleted successfully"}
 
@@ -89,36 +93,28 @@ async def delete_user(
 async def get_all_users(
     session: Annotated[AsyncSession, Depends(get_session)],
     current_user: Annotated[UserRead, Depends(get_current_active_superuser)], 
-    page: int = 1,  # หน้าปัจจุบัน (default = 1)
-    size: int = 8,  # จำนวนรายการต่อหน้า (default = 8)
+    page: Annotated[int, Query(ge=1)] = 1,  # หน้าปัจจุบัน (default = 1)
+    size: Annotated[int, Query(ge=1, le=1000)] = 8,  # จำนวนรายการต่อหน้า (default = 8)
+    cursor: str | None = None,  # next_cursor จากหน้าก่อน (แทน page)
 ) -> UserList:
 
-    # Query จำนวนรายการทั้งหมด
-    total_users_query = await session.exec(select(DBUser))
-    total_users = len(total_users_query.all())  # จำนวนทั้งหมด
+    # Query รายการของผู้ใช้และเรียงตาม ID จากเก่าไปใหม่ พร้อมจำนวนทั้งหมดด้วย count(*)
+    try:
+        result = await pagination.paginate(session, select(DBUser), DBUser.id, "users", page, size, cursor)
+    except pagination.CursorError as error:
+        raise HTTPException(status_code=400, detail=str(error))
 
-    # คำนวณ offset และ limit สำหรับ pagination
-    offset = (page - 1) * size
-
-    # Query รายการของผู้ใช้และเรียงตาม ID จากเก่าไปใหม่
-    result = await session.exec(
-        select(DBUser).order_by(DBUser.id.asc()).offset(offset).limit(size)
-    )
-    users = result.all()
-
-    if not users:
+    if not result.items:
         raise HTTPException(status_code=404, detail="No users found.")
 
-    # คำนวณจำนวนหน้าทั้งหมด
-    total_pages = (total_users + size - 1) // size
-
     # สร้าง Response พร้อมข้อมูล Pagination
     return UserList(
-        users=[UserRead.model_validate(user) for user in users],
-        total=total_users,
-        page=page,
-        size=size,
-        total_pages=total_pages,
+        users=[UserRead.model_validate(user) for user in result.items],
+        total=result.total,
+        page=result.page,
+        size=result.size,
+        total_pages=result.total_pages,
+        next_cursor=result.next_cursor,
     )
 
 
@@ -162,8 +158,16 @@ async def change_password(
             detail="The new password must not be the same as the current password.",
         )
 
+    # current_user มาจากแคช ต้องอ่าน ORM object เพื่อแก้ไขรหัสผ่าน
+    user = await auth.get_db_user(session, current_user.id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found.",
+        )
+
     # ตรวจสอบรหัสผ่านเดิม
-    if not await current_user.verify_password(password_update.current_password):
+    if not await user.verify_password(password_update.current_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect current password.",
@@ -177,12 +181,13 @@ async def change_password(
         )
     
     # ตั้งค่ารหัสผ่านใหม่
-    await current_user.set_password(password_update.new_password)
+    await user.set_password(password_update.new_password)
 
     # ตั้ง user.status เป็น "inactive" ของตัวเอง
-    current_user.status = "inactive"
-    session.add(current_user)
+    user.status = "inactive"
+    session.add(user)
     await session.commit()
+    auth.invalidate(user.id)
 
     return {"message": "Password updated successfully. Please login again."}
 
@@ -225,6 +230,7 @@ async def change_password_for_others(
     user.status = "inactive"
     session.add(user)
     await session.commit()
+    auth.invalidate(user.id)
 
     return {"message": "Password updated successfully for the target user. They must login again."}
 
@@ -281,5 +287,6 @@ async def update(
     session.add(db_user)
     await session.commit()
     await session.refresh(db_user)
+    auth.invalidate(db_user.id)
 
     return UserRead.model_validate(db_user)
\ No newline at end of file
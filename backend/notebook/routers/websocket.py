@@ -1,17 +1,98 @@
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter, Depends
-from sqlmodel import select
+from sqlalchemy import update
 from typing import Annotated
 from sqlmodel.ext.asyncio.session import AsyncSession
 from starlette.websockets import WebSocketState  
 
+import asyncio
+import json
+
 from notebook.models.device import *
+from notebook.models.detect import *
 from notebook.models import get_session
+from notebook.ingest import ingest_detects
+from notebook.codec import FrameError, decode_frame
+from notebook import broadcast, device_cache, ingest_queue
 
 router = APIRouter(prefix="/ws", tags=["websocket"])
 
 # ตัวแปรเก็บ WebSocket และ API Key ของอุปกรณ์ที่เชื่อมต่อ
 connected_devices = {}
 
+
+async def set_device_status(session: AsyncSession, api_key: str, device_status: str):
+    # อัปเดตสถานะอุปกรณ์ด้วย UPDATE เดียว แล้วล้างแคชของอุปกรณ์นั้น
+    await session.execute(
+        update(DBDevice).where(DBDevice.api_key == api_key).values(device_status=device_status)
+    )
+    await session.commit()
+    device_cache.invalidate(api_key)
+    broadcast.publish_status(api_key, device_status)
+
+
+async def store_socket_detects(
+    websocket: WebSocket, session: AsyncSession, seq: int | None, detects: list[CreateDetect]
+):
+    # ใช้ ingest pipeline เดียวกับ create_detect (sync หรือ queue ตาม INGEST_MODE) แล้วตอบ ack พร้อม seq
+    if ingest_queue.queue:
+        try:
+            ingest_queue.queue.put_many(detects)
+        except asyncio.QueueFull:
+            await websocket.send_json(
+                {"seq": seq, "status": "retry", "detail": "The ingest queue is full. Please retry later."}
+            )
+            return
+        await websocket.send_json({"seq": seq, "status": "queued"})
+        return
+
+    try:
+        await ingest_detects(session, detects)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        await websocket.send_json({"seq": seq, "status": "error", "detail": "Failed to store detection data."})
+        return
+    finally:
+        # การเชื่อมต่ออยู่นาน จึงไม่เก็บ object ที่บันทึกแล้วไว้ใน session
+        session.expunge_all()
+
+    await websocket.send_json({"seq": seq, "status": "ok"})
+
+
+async def handle_reading_frame(
+    websocket: WebSocket, session: AsyncSession, device: DeviceRead | None, api_key: str, message: dict
+):
+    # รับข้อมูลที่วัดได้ผ่าน WebSocket
+    # - text: JSON หนึ่งชุดพร้อม seq (SocketDetect) โดย api_key มาจาก path ที่ตรวจสอบแล้ว
+    # - bytes: frame แบบ binary หนึ่งหรือหลายชุด (ดู notebook/codec.py) โดย seq อยู่ใน header
+    seq = None
+    try:
+        if message.get("bytes") is not None:
+            seq, detects = decode_frame(message["bytes"])
+            if any(detect.api_key != api_key for detect in detects):
+                raise FrameError("The frame contains readings for another API Key.")
+        else:
+            payload = json.loads(message["text"])
+            if isinstance(payload, dict):
+                seq = payload.get("seq")
+            frame = SocketDetect.model_validate(payload)
+            detects = [CreateDetect(api_key=api_key, **frame.model_dump(exclude={"seq"}))]
+    except ValueError:
+        await websocket.send_json({"seq": seq, "status": "error", "detail": "Invalid detection data."})
+        return
+
+    if not device:
+        await websocket.send_json(
+            {"seq": seq, "status": "error", "detail": "Invalid API Key. Please add devices first."}
+        )
+        return
+
+    if detects:
+        await store_socket_detects(websocket, session, seq, detects)
+    else:
+        await websocket.send_json({"seq": seq, "status": "ok"})
+
+
 @router.websocket("/devices/{api_key}")
 async def websocket_devices(
     websocket: WebSocket, 
@@ -25,22 +106,26 @@ async def websocket_devices(
     connected_devices[websocket] = api_key
 
     try:
-        # อัปเดตสถานะเป็น 'online'
-        result = await session.exec(select(DBDevice).where(DBDevice.api_key == api_key))
-        device = result.one_or_none()
+        # อัปเดตสถานะเป็น 'online' (ตรวจสอบ api_key ผ่านแคชอุปกรณ์)
+        device = await device_cache.get_device(session, api_key)
         if device:
-            device.device_status = "online"
-            session.add(device)
-            await session.commit()
+            await set_device_status(session, api_key, "online")
             print(f"✅ Device {api_key} status updated to 'online'.")
 
-        # WebSocket Disconnect 
+        # รับข้อมูลจาก ESP32 จนกว่าจะตัดการเชื่อมต่อ
         while websocket.client_state == WebSocketState.CONNECTED:  # เช็คก่อนรับข้อมูล
             try:
-                await websocket.receive()  # รอการตัดการเชื่อมต่อจาก ESP32
+                message = await websocket.receive()
             except WebSocketDisconnect:
                 break  # ออกจากลูปทันทีเมื่อ WebSocket ตัดการเชื่อมต่อ
 
+            if message["type"] == "websocket.disconnect":
+                break
+
+            # ข้อความแบบ text (JSON) หรือ bytes (binary frame) คือข้อมูลที่วัดได้
+            if message.get("text") is not None or message.get("bytes") is not None:
+                await handle_reading_frame(websocket, session, device, api_key, message)
+
     finally:
         print(f"✅ Device Disconnected: {api_key}")
         # ตรวจสอบว่ามี WebSocket นี้อยู่ใน connected_devices หรือไม่
@@ -48,10 +133,63 @@ async def websocket_devices(
             disconnected_api_key = connected_devices.pop(websocket)  
 
             # อัปเดตสถานะเป็น 'offline'
-            result = await session.exec(select(DBDevice).where(DBDevice.api_key == disconnected_api_key))
-            device = result.one_or_none()
+            device = await device_cache.get_device(session, disconnected_api_key)
             if device:
-                device.device_status = "offline"
-                session.add(device)
-                await session.commit()
+                await set_device_status(session, disconnected_api_key, "offline")
                 print(f"✅ Device {disconnected_api_key} status updated to 'offline'.")
+
+
+def parse_api_keys(value) -> set[str] | None:
+    # "a,b" หรือ ["a", "b"] คือรับเฉพาะอุปกรณ์เหล่านี้, ว่าง/None คือรับทุกอุปกรณ์
+    if isinstance(value, str):
+        value = [api_key for api_key in value.split(",") if api_key]
+    if not value:
+        return None
+    if not isinstance(value, list) or not all(isinstance(api_key, str) for api_key in value):
+        raise ValueError("api_keys must be a list of API Keys.")
+    return set(value)
+
+
+# ส่งข้อมูลใหม่ให้ dashboard ทันทีที่อุปกรณ์ส่งมา แทนการ poll ด้วย setInterval
+# ?api_keys=a,b เลือกอุปกรณ์ (ไม่ระบุ = ทุกอุปกรณ์) และเปลี่ยนได้ภายหลังด้วยข้อความ {"api_keys": [...]}
+# แต่ละข้อความเป็น JSON array ของเหตุการณ์:
+#   {"type": "reading", "api_key", "reading", "score", "quality_changed"}
+#   {"type": "status", "api_key", "device_status"}
+# โหลดข้อมูลเริ่มต้นด้วย /dashboard/snapshot แล้วใช้ช่องทางนี้รับการเปลี่ยนแปลง
+# client ที่อ่านไม่ทันจะถูกตัดการเชื่อมต่อ (code 1013) และควรเชื่อมต่อใหม่พร้อมโหลด snapshot อีกครั้ง
+@router.websocket("/dashboard")
+async def websocket_dashboard(websocket: WebSocket, api_keys: str | None = None):
+    await websocket.accept()
+    broadcaster = broadcast.broadcaster
+
+    try:
+        subscriber = broadcaster.subscribe(parse_api_keys(api_keys))
+    except ValueError as error:
+        await websocket.close(code=1008, reason=str(error))
+        return
+
+    async def receive_commands():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            try:
+                command = json.loads(message.get("text") or "")
+                broadcaster.resubscribe(subscriber, parse_api_keys(command.get("api_keys")))
+            except (ValueError, AttributeError):
+                await websocket.send_json({"type": "error", "detail": "Expected {\"api_keys\": [...]}."})
+
+    sender = asyncio.create_task(subscriber.send_all(websocket, broadcaster.send_timeout))
+    receiver = asyncio.create_task(receive_commands())
+    try:
+        await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        broadcaster.unsubscribe(subscriber)
+        sender.cancel()
+        receiver.cancel()
+
+    if subscriber.dropped and websocket.client_state == WebSocketState.CONNECTED:
+        try:
+            await websocket.close(code=1013, reason="The client is too slow. Please reconnect.")
+        except RuntimeError:
+            pass
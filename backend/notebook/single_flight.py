@@ -0,0 +1,80 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    # รวม request ที่เหมือนกันซึ่งเข้ามาพร้อมกันให้เหลือ query เดียว
+    # request แรก (leader) โหลดข้อมูล ส่วน request ที่ตามมาระหว่างนั้น (follower) รอผลเดียวกัน
+    # follower ไม่ได้ใช้ session ของตัวเอง จึงไม่ได้ยืม connection จาก pool
+    # ผลลัพธ์ถูกใช้ร่วมกันห้ามแก้ไข และ exception (เช่น HTTPException 404) ก็ส่งถึงทุกคน
+
+    def __init__(self):
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+        # metrics
+        self.leaders = 0
+        self.followers = 0
+        self.max_followers = 0
+        self._waiting: dict[Hashable, int] = {}
+
+    async def run(self, key: Hashable, load: Callable[[], Awaitable]):
+        while True:
+            future = self._inflight.get(key)
+            if future is None:
+                break
+            self.followers += 1
+            self._waiting[key] = self._waiting.get(key, 0) + 1
+            self.max_followers = max(self.max_followers, self._waiting[key])
+            try:
+                # shield: follower ที่ถูกยกเลิกต้องไม่ยกเลิกงานของ leader
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # leader ถูกยกเลิก (client ปิดการเชื่อมต่อ) ให้ request นี้โหลดเอง
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self._waiting[key] = 0
+        self.leaders += 1
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # ไม่ต้องเตือน "exception was never retrieved" เมื่อไม่มี follower
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
+            del self._waiting[key]
+
+    def stats(self) -> dict:
+        requests = self.leaders + self.followers
+        return {
+            "in_flight": len(self._inflight),
+            "queries": self.leaders,
+            "coalesced": self.followers,
+            "coalesced_ratio": round(self.followers / requests, 4) if requests else 0.0,
+            "max_followers": self.max_followers,
+        }
+
+
+# ตัวรวม request ที่ใช้งานอยู่ (None เมื่อ SINGLE_FLIGHT_ENABLED=False)
+flights: SingleFlight | None = None
+
+
+def init_single_flight(settings):
+    global flights
+
+    flights = SingleFlight() if settings.SINGLE_FLIGHT_ENABLED else None
+
+
+async def run(key: Hashable, load: Callable[[], Awaitable]):
+    if flights is None:
+        return await load()
+    return await flights.run(key, load)
@@ -0,0 +1,2 @@
+@echo off
+poetry run python -m notebook.cli backfill %*
\ No newline at end of file
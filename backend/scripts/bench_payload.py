@@ -0,0 +1,46 @@
+# เปรียบเทียบเวลาในการ decode ต่อข้อมูลหนึ่งชุด ระหว่าง JSON (CreateDetect) และ binary frame
+# ใช้งาน: poetry run python scripts/bench_payload.py
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pydantic import TypeAdapter
+
+from notebook.codec import decode_frame, encode_frame
+from notebook.models.detect import CreateDetect
+
+BATCH_SIZE = 500
+
+detect = CreateDetect(
+    api_key="8e408a6997b7b5ae22ee7975697fe514",
+    pm2_5=12.0,
+    pm10=20.0,
+    co2=612.0,
+    tvoc=87.0,
+    humidity=55.31,
+    temperature=25.47,
+    timestamp=datetime(2026, 1, 1, 12, 30, 0),
+)
+
+json_one = detect.model_dump_json().encode()
+json_batch = b"[" + b",".join([json_one] * BATCH_SIZE) + b"]"
+binary_one = encode_frame([detect])
+binary_batch = encode_frame([detect] * BATCH_SIZE)
+batch_adapter = TypeAdapter(list[CreateDetect])
+
+cases = [
+    ("json, 1 reading/request", lambda: CreateDetect.model_validate_json(json_one), 1, len(json_one)),
+    (f"json, {BATCH_SIZE} readings/request", lambda: batch_adapter.validate_json(json_batch), BATCH_SIZE, len(json_batch)),
+    ("binary, 1 reading/frame", lambda: decode_frame(binary_one), 1, len(binary_one)),
+    (f"binary, {BATCH_SIZE} readings/frame", lambda: decode_frame(binary_batch), BATCH_SIZE, len(binary_batch)),
+]
+
+print(f"{'payload':<32}{'us/reading':>12}{'bytes/reading':>16}")
+for name, decode, readings, size in cases:
+    timer = timeit.Timer(decode)
+    loops, _ = timer.autorange()
+    best = min(timer.repeat(repeat=5, number=loops)) / loops
+    print(f"{name:<32}{best / readings * 1e6:>12.2f}{size / readings:>16.1f}")
@@ -0,0 +1,134 @@
+# ตรวจสอบด้วย EXPLAIN ว่า query หลักของ detects/daily_averages ใช้ index (ไม่มี Seq Scan)
+# ใช้งาน: poetry run python scripts/explain_hot_queries.py
+# ปิด enable_seqscan เพื่อให้ผลไม่ขึ้นกับจำนวนข้อมูลในตาราง: ถ้ายังเป็น Seq Scan แสดงว่าไม่มี index ที่ใช้ได้
+import asyncio
+import json
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from notebook import config, models
+from notebook.ingest import day_bounds
+from notebook.models.daily_average import DBDailyAverage
+from notebook.models.detect import DBDetect
+from notebook.models.detect_history import DBDetectHistory
+from notebook.models.device import DBDevice
+from notebook.models.period_average import DBMonthlyAverage, DBYearlyAverage
+from notebook.models.rollup import DBRollup5m, DBRollupHourly
+from notebook.models.score import DBScore
+from notebook.models.showdetect import DBShow
+from notebook.models.users import DBUser  # noqa: F401 (ให้ relationship DBDevice.user หา DBUser เจอ)
+from notebook.retention import detect_cutoff
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def visit_explain(element, compiler, **kw):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+API_KEY = "8e408a6997b7b5ae22ee7975697fe514"
+TODAY = date.today()
+DAY_START, DAY_END = day_bounds(TODAY, TODAY)
+
+HOT_QUERIES = {
+    "latest detect of a device": select(DBDetect)
+    .where(DBDetect.api_key == API_KEY)
+    .order_by(DBDetect.timestamp.desc())
+    .limit(1),
+    "detects of a device in a day": select(DBDetect)
+    .where(DBDetect.api_key == API_KEY)
+    .where(DBDetect.timestamp >= DAY_START)
+    .where(DBDetect.timestamp < DAY_END),
+    "retention purge chunk": select(DBDetect.id)
+    .where(DBDetect.timestamp < detect_cutoff(TODAY, 30))
+    .limit(5000),
+    "daily average of a device and day": select(DBDailyAverage)
+    .where(DBDailyAverage.api_key == API_KEY)
+    .where(DBDailyAverage.date == TODAY),
+    "daily averages of a device in a range": select(DBDailyAverage)
+    .where(DBDailyAverage.api_key == API_KEY)
+    .where(DBDailyAverage.date >= TODAY - timedelta(days=30))
+    .where(DBDailyAverage.date <= TODAY),
+    "dashboard trends of a page of devices": select(DBDailyAverage.api_key, DBDailyAverage.date)
+    .where(DBDailyAverage.api_key.in_([API_KEY, API_KEY[::-1]]))
+    .where(DBDailyAverage.date >= TODAY - timedelta(days=6))
+    .order_by(DBDailyAverage.api_key, DBDailyAverage.date),
+    "months of a device (timestamps)": select(DBMonthlyAverage.month)
+    .where(DBMonthlyAverage.api_key == API_KEY)
+    .order_by(DBMonthlyAverage.month),
+    "years of a device": select(DBYearlyAverage)
+    .where(DBYearlyAverage.api_key == API_KEY)
+    .order_by(DBYearlyAverage.year),
+    "5-minute rollups of a device in a day": select(DBRollup5m)
+    .where(DBRollup5m.api_key == API_KEY)
+    .where(DBRollup5m.bucket >= DAY_START)
+    .where(DBRollup5m.bucket < DAY_END)
+    .order_by(DBRollup5m.bucket),
+    "hourly rollups of a device in a day": select(DBRollupHourly)
+    .where(DBRollupHourly.api_key == API_KEY)
+    .where(DBRollupHourly.bucket >= DAY_START)
+    .where(DBRollupHourly.bucket < DAY_END)
+    .order_by(DBRollupHourly.bucket),
+    "history of a device in a day": select(DBDetectHistory)
+    .where(DBDetectHistory.api_key == API_KEY)
+    .where(DBDetectHistory.timestamp >= DAY_START)
+    .where(DBDetectHistory.timestamp < DAY_END),
+    "showdetect of a device": select(DBShow).where(DBShow.api_key == API_KEY),
+    "score of a device": select(DBScore).where(DBScore.api_key == API_KEY),
+    "device by api_key": select(DBDevice).where(DBDevice.api_key == API_KEY),
+}
+
+
+def relation_scans(plan: dict) -> list[str]:
+    # รวบรวมชนิดของการ scan ทุก node ที่อ่านจากตาราง
+    scans = []
+    if "Relation Name" in plan:
+        scan = f"{plan['Node Type']} on {plan['Relation Name']}"
+        if "Index Name" in plan:
+            scan += f" using {plan['Index Name']}"
+        scans.append(scan)
+    elif "Index Name" in plan:
+        # Bitmap Index Scan ไม่มี Relation Name (อยู่ใต้ Bitmap Heap Scan)
+        scans.append(f"{plan['Node Type']} using {plan['Index Name']}")
+    for child in plan.get("Plans", []):
+        scans.extend(relation_scans(child))
+    return scans
+
+
+async def main() -> int:
+    models.init_db(config.get_settings())
+    models.engine.echo = False
+    await models.create_all()
+
+    failed = 0
+    async with models.engine.connect() as conn:
+        await conn.execute(text("SET enable_seqscan = off"))
+        for name, statement in HOT_QUERIES.items():
+            result = await conn.execute(Explain(statement))
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = relation_scans(plan[0]["Plan"])
+            ok = not any(scan.startswith("Seq Scan") for scan in scans)
+            failed += not ok
+            print(f"{'ok' if ok else 'FAIL':<5} {name}: {', '.join(scans)}")
+
+    await models.engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,2 @@
+@echo off
+poetry run python -m notebook.cli rebuild-daily-averages %*
\ No newline at end of file
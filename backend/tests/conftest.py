@@ -0,0 +1,42 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture(scope="session")
+def database_url() -> str:
+    # test ที่ต้องใช้ PostgreSQL จริง: ตั้ง TEST_SQLDB_URL เป็นฐานข้อมูลสำหรับทดสอบ (ตารางจะถูกสร้างในฐานข้อมูลนี้)
+    url = os.environ.get("TEST_SQLDB_URL")
+    if not url:
+        pytest.skip("TEST_SQLDB_URL is not set")
+    return url
+
+
+@pytest.fixture(scope="session")
+def client(database_url):
+    # แอปทั้งระบบบนฐานข้อมูลทดสอบ login เป็น superadmin แล้ว
+    # ใช้ client เดียวตลอดการทดสอบ: engine ผูกกับ event loop ของ TestClient
+    os.environ["SQLDB_URL"] = database_url
+    os.environ.setdefault("SESSION_SECRET_KEY", "test-session-secret")
+    from fastapi.testclient import TestClient
+    from notebook.main import create_app
+
+    with TestClient(create_app()) as client:
+        response = client.post("/login", data={"username": "superadmin", "password": "superadminpassword"})
+        assert response.status_code == 200, response.text
+        yield client
+
+
+@pytest.fixture
+def api_key(client) -> str:
+    # อุปกรณ์ใหม่ทุก test
+    # ชื่อและสถานที่ของอุปกรณ์ต้องไม่ซ้ำกัน
+    name = f"test-{uuid.uuid4().hex[:8]}"
+    response = client.post("/devices/create", json={"device_name": name, "location": name})
+    assert response.status_code == 200, response.text
+    return response.json()["api_key"]
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+from notebook import auth
+from notebook.config import Settings
+
+
+@pytest.fixture(autouse=True)
+def restore_auth(monkeypatch):
+    # init_auth เปลี่ยนค่าระดับ module: คืนค่าเดิมให้ client ที่ login ไว้แล้ว
+    for name in ("secret_key", "token_minutes", "cache"):
+        monkeypatch.setattr(auth, name, getattr(auth, name))
+
+
+def make_settings(**values) -> Settings:
+    return Settings(SQLDB_URL="postgresql+asyncpg://localhost/test", **values)
+
+
+USER = SimpleNamespace(id=7, role="user", status="active")
+
+
+def test_token_survives_restart():
+    settings = make_settings(SESSION_SECRET_KEY="shared-secret")
+    auth.init_auth(settings)
+    token = auth.create_token(USER)
+
+    # รีสตาร์ท / reload หรือ worker อื่นที่ใช้ค่าเดียวกัน
+    auth.init_auth(settings)
+    assert auth.decode_token(token)["sub"] == USER.id
+
+
+def test_missing_secret_key_fails_startup():
+    with pytest.raises(RuntimeError):
+        auth.init_auth(make_settings(SESSION_SECRET_KEY=""))
+
+
+def test_random_key_only_when_allowed():
+    settings = make_settings(SESSION_SECRET_KEY="", SESSION_ALLOW_RANDOM_KEY=True)
+    auth.init_auth(settings)
+    token = auth.create_token(USER)
+
+    auth.init_auth(settings)
+    with pytest.raises(auth.SessionError):
+        auth.decode_token(token)
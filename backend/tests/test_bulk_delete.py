@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from notebook import bulk_delete, models
+from notebook.ingest import METRICS, ingest_detects
+from notebook.models.detect import CreateDetect
+from notebook.models.users import UserRead
+from notebook.routers.device import get_delete_job
+
+TABLES = ("devices", "detects", "showdetects", "scores", "daily_averages", "rollups_5m", "rollups_hourly")
+
+
+def make_detect(api_key: str, minutes: int) -> CreateDetect:
+    return CreateDetect(
+        api_key=api_key,
+        **{metric: 10.0 for metric in METRICS},
+        timestamp=datetime(2026, 2, 1, 8, 0) + timedelta(minutes=minutes),
+    )
+
+
+async def count_rows(api_key: str) -> dict[str, int]:
+    async with models.engine.connect() as conn:
+        return {
+            table: (await conn.execute(text(f"SELECT count(*) FROM {table} WHERE api_key = :api_key"), {"api_key": api_key})).scalar()
+            for table in TABLES
+        }
+
+
+def test_delete_waits_for_ingest_and_blocks_new_ingest(client, api_key):
+    async def main():
+        # transaction ของ ingest ที่ยังไม่ commit ขณะเริ่มลบอุปกรณ์
+        async with models.session_factory() as session:
+            await ingest_detects(session, [make_detect(api_key, 0)])
+            deleting = asyncio.create_task(bulk_delete.deleter.delete_device(api_key))
+            await asyncio.sleep(0.3)
+            assert not deleting.done()
+            await session.commit()
+        removed = await deleting
+
+        # ingest หลังลบอุปกรณ์แล้ว (เช่นข้อมูลที่ค้างในคิว) ไม่สร้างข้อมูลกลับมา
+        async with models.session_factory() as session:
+            assert await ingest_detects(session, [make_detect(api_key, 1)]) == []
+            await session.commit()
+        return removed, await count_rows(api_key)
+
+    removed, counts = client.portal.call(main)
+    assert removed["devices"] == 1
+    assert removed["detects"] == 1
+    assert counts == dict.fromkeys(TABLES, 0)
+
+    response = client.post("/detects/create", json=make_detect(api_key, 2).model_dump(mode="json"))
+    assert response.status_code == 400
+    assert client.delete(f"/devices/delete/{api_key}").status_code == 404
+
+
+def test_retry_after_partial_delete(client, api_key):
+    response = client.post("/detects/create", json=make_detect(api_key, 0).model_dump(mode="json"))
+    assert response.status_code == 200
+
+    async def delete_device_row():
+        async with models.engine.begin() as conn:
+            await conn.execute(text("DELETE FROM devices WHERE api_key = :api_key"), {"api_key": api_key})
+
+    # อุปกรณ์ถูกลบแล้วแต่ข้อมูลยังเหลือ (การลบล้มเหลวกลางทาง): สั่งลบซ้ำได้
+    client.portal.call(delete_device_row)
+    response = client.delete(f"/devices/delete/{api_key}")
+    assert response.status_code == 200, response.text
+    assert response.json()["removed"]["detects"] == 1
+    assert client.portal.call(count_rows, api_key) == dict.fromkeys(TABLES, 0)
+
+
+def make_user(user_id: int, role: str = "user") -> UserRead:
+    return UserRead(id=user_id, username=f"user{user_id}", first_name="Test", last_name="User", role=role, status="active")
+
+
+def test_delete_job_visible_to_owner_and_superadmin(monkeypatch):
+    deleter = bulk_delete.DeviceDataDeleter(chunk_size=100)
+    job = bulk_delete.DeleteJob("delete_device", "8e408a6997b7b5ae22ee7975697fe514", user_id=1)
+    deleter.jobs[job.id] = job
+    monkeypatch.setattr(bulk_delete, "deleter", deleter)
+
+    assert asyncio.run(get_delete_job(job.id, make_user(1)))["api_key"] == job.api_key
+    assert asyncio.run(get_delete_job(job.id, make_user(2, "superadmin")))["id"] == job.id
+
+    # ผู้ใช้อื่นไม่เห็นว่ามีงานนี้อยู่
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(get_delete_job(job.id, make_user(3)))
+    assert error.value.status_code == 404
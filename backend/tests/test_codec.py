@@ -0,0 +1,126 @@
+import math
+import struct
+from datetime import datetime, timedelta
+
+import pytest
+
+from notebook.codec import (
+    BINARY_CONTENT_TYPE,
+    FRAME_HEADER,
+    MAX_FRAME_RECORDS,
+    RECORD,
+    FrameError,
+    decode_frame,
+    encode_frame,
+)
+from notebook.models.detect import CreateDetect
+
+
+def make_detect(api_key: str = "8e408a6997b7b5ae22ee7975697fe514", **values) -> CreateDetect:
+    reading = {
+        "pm2_5": 12.34,
+        "pm10": 20.5,
+        "co2": 612.0,
+        "tvoc": 87.25,
+        "humidity": 55.31,
+        "temperature": 25.47,
+        "timestamp": datetime(2026, 1, 1, 12, 30, 15),
+    }
+    return CreateDetect(api_key=api_key, **{**reading, **values})
+
+
+def test_round_trip():
+    detects = [
+        make_detect(),
+        make_detect(api_key="00" * 16, co2=1401.0, timestamp=datetime(2026, 10, 18, 0, 0, 1)),
+        # byte 0 ท้าย api_key ต้องไม่หายไป
+        make_detect(api_key="ab" * 15 + "00", temperature=-5.5),
+    ]
+    frame = encode_frame(detects, seq=42)
+    assert len(frame) == FRAME_HEADER.size + len(detects) * RECORD.size
+
+    seq, decoded = decode_frame(frame)
+    assert seq == 42
+    assert [detect.model_dump() for detect in decoded] == [detect.model_dump() for detect in detects]
+    assert all(isinstance(detect, CreateDetect) for detect in decoded)
+
+
+def test_float32_is_rounded_to_two_decimals():
+    _, (detect,) = decode_frame(encode_frame([make_detect(humidity=55.31, pm2_5=0.1)]))
+    assert detect.humidity == 55.31
+    assert detect.pm2_5 == 0.1
+
+
+def test_empty_frame():
+    assert decode_frame(encode_frame([], seq=7)) == (7, [])
+
+
+@pytest.mark.parametrize("cut", [1, RECORD.size - 1, RECORD.size, RECORD.size + 1])
+def test_truncated_frame(cut):
+    frame = encode_frame([make_detect(), make_detect()])
+    with pytest.raises(FrameError, match="length"):
+        decode_frame(frame[:-cut])
+
+
+def test_extra_bytes():
+    with pytest.raises(FrameError, match="length"):
+        decode_frame(encode_frame([make_detect()]) + b"\x00")
+
+
+@pytest.mark.parametrize("frame", [b"", b"\x01\x00\x01"])
+def test_short_header(frame):
+    with pytest.raises(FrameError, match="too short"):
+        decode_frame(frame)
+
+
+def test_unsupported_version():
+    frame = bytearray(encode_frame([make_detect()]))
+    frame[0] = 2
+    with pytest.raises(FrameError, match="version"):
+        decode_frame(bytes(frame))
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_value(value):
+    frame = bytearray(encode_frame([make_detect()]))
+    # ค่าแรก (pm2_5) ของข้อมูลชุดแรกอยู่ถัดจาก api_key
+    struct.pack_into("<f", frame, FRAME_HEADER.size + 16, value)
+    with pytest.raises(FrameError, match="non-finite"):
+        decode_frame(bytes(frame))
+
+
+def test_too_many_records():
+    count = MAX_FRAME_RECORDS + 1
+    frame = FRAME_HEADER.pack(1, count, 0) + bytes(count * RECORD.size)
+    with pytest.raises(FrameError):
+        decode_frame(frame)
+
+
+def test_create_negotiates_content_type(client, api_key):
+    timestamp = datetime(2026, 1, 1, 8, 0, 0)
+    frame = encode_frame([make_detect(api_key, timestamp=timestamp), make_detect("ff" * 16, timestamp=timestamp)])
+    response = client.post("/detects/create", content=frame, headers={"Content-Type": BINARY_CONTENT_TYPE})
+    assert response.status_code == 200, response.text
+    assert response.json()["accepted"] == 1
+    assert [rejected["index"] for rejected in response.json()["rejected"]] == [1]
+
+    response = client.post("/detects/create", content=frame[:-1], headers={"Content-Type": BINARY_CONTENT_TYPE})
+    assert response.status_code == 400
+
+    reading = make_detect(api_key, timestamp=timestamp.replace(hour=9)).model_dump(mode="json")
+    response = client.post("/detects/create", json=reading)
+    assert response.status_code == 200, response.text
+    assert response.json()["api_key"] == api_key
+
+    response = client.post("/detects/create", json={**reading, "co2": "high"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "co2"]
+
+
+def test_create_large_frame(client, api_key):
+    # frame ขนาดใหญ่จาก gateway (ข้อมูลทุก 5 นาทีกว่า 10 วัน)
+    first = datetime(2025, 4, 1)
+    detects = [make_detect(api_key, timestamp=first + timedelta(minutes=5 * index)) for index in range(3000)]
+    response = client.post("/detects/create", content=encode_frame(detects), headers={"Content-Type": BINARY_CONTENT_TYPE})
+    assert response.status_code == 200, response.text
+    assert response.json() == {"accepted": 3000, "rejected": []}
@@ -0,0 +1,89 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from notebook.downsample import lttb_indices
+
+
+@pytest.mark.parametrize("n, threshold", [(10, 3), (10, 9), (100, 7), (101, 50), (1000, 300), (5000, 4999)])
+def test_bucket_count_and_endpoints(n, threshold):
+    rng = np.random.default_rng(n)
+    x = np.arange(n, dtype=np.float64)
+    y = rng.normal(size=(n, 3))
+
+    keep = lttb_indices(x, y, threshold)
+    assert len(keep) == threshold
+    assert keep[0] == 0
+    assert keep[-1] == n - 1
+    # เรียงจากน้อยไปมากและไม่ซ้ำ: หนึ่งจุดต่อ bucket
+    assert np.all(np.diff(keep) > 0)
+
+    # แต่ละจุดที่เลือกอยู่ใน bucket ของตัวเอง
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    for index, (start, end) in zip(keep[1:-1], zip(edges[:-1], edges[1:])):
+        assert start <= index < end
+
+
+@pytest.mark.parametrize("threshold, expected", [(0, []), (1, [0]), (2, [0, 9]), (10, list(range(10))), (20, list(range(10)))])
+def test_small_thresholds(threshold, expected):
+    x = np.arange(10, dtype=np.float64)
+    assert list(lttb_indices(x, x, threshold)) == expected
+
+
+def test_keeps_spikes():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.zeros((1000, 2))
+    y[123, 0] = 50
+    y[777, 1] = -20
+    keep = lttb_indices(x, y, 20)
+    assert 123 in keep
+    assert 777 in keep
+
+
+def test_constant_series():
+    x = np.arange(50, dtype=np.float64)
+    keep = lttb_indices(x, np.full((50, 6), 7.0), 10)
+    assert len(keep) == 10
+    assert np.all(np.diff(keep) > 0)
+
+
+def test_daily_averages_max_points(client, api_key):
+    first = date(2025, 1, 1)
+    readings = [
+        {
+            "api_key": api_key,
+            "pm2_5": 10.0 + (day % 7),
+            "pm10": 20.0,
+            "co2": 900.0 if day != 40 else 3000.0,
+            "tvoc": 100.0,
+            "humidity": 55.0,
+            "temperature": 25.0,
+            "timestamp": datetime.combine(first + timedelta(days=day), datetime.min.time()).isoformat(),
+        }
+        for day in range(90)
+    ]
+    response = client.post("/detects/batch", json=readings)
+    assert response.status_code == 200, response.text
+
+    response = client.get(f"/avg/daily_averages/{api_key}")
+    assert len(response.json()) == 90
+
+    response = client.get(f"/avg/daily_averages/{api_key}", params={"max_points": 12})
+    rows = response.json()
+    assert len(rows) == 12
+    assert rows[0]["date"] == "2025-01-01"
+    assert rows[-1]["date"] == "2025-03-31"
+    assert "2025-02-10" in [row["date"] for row in rows]
+
+    response = client.get(
+        f"/avg/daily_averages/{api_key}",
+        params={"max_points": 5, "start": "2025-02-01", "end": "2025-02-28", "layout": "columns"},
+    )
+    columns = response.json()
+    assert len(columns["date"]) == len(columns["avg_co2"]) == 5
+    assert columns["date"][0] == "2025-02-01"
+    assert columns["date"][-1] == "2025-02-28"
+
+    response = client.get(f"/avg/daily_averages/{api_key}", params={"max_points": 2})
+    assert response.status_code == 422
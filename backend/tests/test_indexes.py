@@ -0,0 +1,50 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+from notebook import history, models
+from scripts.explain_hot_queries import DAY_START, HOT_QUERIES, Explain, relation_scans
+
+
+async def explain(conn, statement) -> list[str]:
+    plan = (await conn.execute(Explain(statement))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return relation_scans(plan[0]["Plan"])
+
+
+async def explain_all() -> dict[str, list[str]]:
+    # ตารางและ index ถูกสร้าง/ปรับโดย startup ของแอป (create_all และ migrations)
+    # partition ของเดือนนี้ ให้ query ของ detect_history มีตารางให้ scan
+    await history.DetectHistory(months_ahead=0).ensure_months({history.month_start(DAY_START)})
+
+    plans = {}
+    async with models.engine.connect() as conn:
+        # ตารางทดสอบมีข้อมูลน้อย: ปิด seq scan เพื่อให้เห็นว่ามี index ที่ใช้ได้หรือไม่
+        await conn.execute(text("SET enable_seqscan = off"))
+        for name, statement in HOT_QUERIES.items():
+            plans[name] = await explain(conn, statement)
+
+        # BRIN ใช้ได้เฉพาะ bitmap scan และอาจถูกเลือกเมื่อตารางทดสอบมีข้อมูลสะสมมากขึ้น
+        # ปิด bitmap scan เพื่อตรวจว่า query ของอุปกรณ์ใช้ index (api_key, timestamp) ได้
+        await conn.execute(text("SET enable_bitmapscan = off"))
+        plans["device range without bitmap scans"] = await explain(conn, HOT_QUERIES["detects of a device in a day"])
+    return plans
+
+
+@pytest.fixture(scope="module")
+def plans(client):
+    return client.portal.call(explain_all)
+
+
+@pytest.mark.parametrize("name", list(HOT_QUERIES))
+def test_hot_query_uses_index(plans, name):
+    scans = plans[name]
+    assert scans
+    assert not [scan for scan in scans if scan.startswith("Seq Scan")], scans
+
+
+def test_device_range_uses_composite_index(plans):
+    scans = plans["device range without bitmap scans"]
+    assert any("ix_detects_api_key_timestamp" in scan for scan in scans), scans
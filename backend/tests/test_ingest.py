@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from notebook import device_cache, models
+from notebook.ingest import MAX_QUERY_ARGUMENTS, METRICS, chunk_rows
+from notebook.routers.detect import MAX_BATCH_SIZE
+
+
+def test_chunk_rows_stays_under_argument_limit():
+    rows = [{f"column_{index}": index for index in range(21)} for _ in range(5000)]
+    chunks = list(chunk_rows(rows))
+    assert sum(len(chunk) for chunk in chunks) == len(rows)
+    assert all(len(chunk) * 21 <= MAX_QUERY_ARGUMENTS for chunk in chunks)
+    assert len(chunks) == 4
+
+
+async def readings(api_key: str) -> dict[str, tuple[int, int]]:
+    # (จำนวนแถว, ผลรวมของ readings) ในตารางสรุปแต่ละตาราง
+    async with models.engine.connect() as conn:
+        return {
+            table: tuple((await conn.execute(
+                text(f"SELECT count(*), sum(readings) FROM {table} WHERE api_key = :api_key"), {"api_key": api_key}
+            )).one())
+            for table in ("rollups_5m", "rollups_hourly", "daily_averages")
+        }
+
+
+def test_batch_with_many_rollup_buckets(client, api_key):
+    # gateway ส่งข้อมูลย้อนหลังกว่า 7 วัน ทุก 5 นาที: rollup ราย 5 นาทีมากกว่า 2000 ช่วงใน batch เดียว
+    count = 2100
+    first = datetime(2025, 3, 1)
+    detects = [
+        {"api_key": api_key, **{metric: 10.0 for metric in METRICS},
+         "timestamp": (first + timedelta(minutes=5 * index)).isoformat()}
+        for index in range(count)
+    ]
+    response = client.post("/detects/batch", json=detects)
+    assert response.status_code == 200, response.text
+    assert response.json()["accepted"] == count
+
+    totals = client.portal.call(readings, api_key)
+    assert totals["rollups_5m"] == (count, count)
+    assert totals["rollups_hourly"] == (count // 12, count)
+    assert totals["daily_averages"] == (8, count)
+
+
+def test_batch_reports_only_stored_readings(client, api_key, monkeypatch):
+    # อุปกรณ์ถูกลบหลังจากผ่านแคชอุปกรณ์: ingest ข้ามข้อมูลนั้น และ response ต้องนับเฉพาะที่บันทึกจริง
+    async def get_devices(session, api_keys):
+        return set(api_keys)
+
+    monkeypatch.setattr(device_cache, "get_devices", get_devices)
+    reading = {**{metric: 10.0 for metric in METRICS}, "timestamp": "2025-03-01T00:00:00"}
+    response = client.post("/detects/batch", json=[{**reading, "api_key": api_key}, {**reading, "api_key": "deleted"}])
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["accepted"] == 1
+    assert [(item["index"], item["api_key"]) for item in result["rejected"]] == [(1, "deleted")]
+
+
+def test_batch_size_limit(client, api_key):
+    reading = {"api_key": api_key, **{metric: 10.0 for metric in METRICS}}
+    response = client.post("/detects/batch", json=[reading] * (MAX_BATCH_SIZE + 1))
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "too_long"
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import exc
+
+from notebook import ingest_queue
+from notebook.ingest import METRICS
+from notebook.ingest_queue import IngestQueue, is_transient
+from notebook.models.detect import CreateDetect
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def commit(self):
+        pass
+
+
+async def fake_get_session():
+    yield FakeSession()
+
+
+def make_detects(count: int) -> list[CreateDetect]:
+    return [
+        CreateDetect(
+            api_key="8e408a6997b7b5ae22ee7975697fe514",
+            **{metric: float(index) for metric in METRICS},
+            timestamp=datetime(2026, 1, 1) + timedelta(minutes=index),
+        )
+        for index in range(count)
+    ]
+
+
+def operational_error() -> exc.OperationalError:
+    return exc.OperationalError("INSERT ...", {}, ConnectionResetError("connection reset"))
+
+
+class Store:
+    # บันทึกลง list แทนฐานข้อมูล: เรียก failures ก่อน (แต่ละตัวคืน exception ที่จะ raise หรือ None)
+    def __init__(self):
+        self.rows = []
+        self.failures = []
+
+    async def ingest_detects(self, session, detects):
+        for failure in self.failures:
+            error = failure(detects)
+            if error:
+                raise error
+        self.rows.extend(detects)
+
+
+@pytest.fixture
+def stored(monkeypatch):
+    store = Store()
+    monkeypatch.setattr(ingest_queue.models, "get_session", fake_get_session)
+    monkeypatch.setattr(ingest_queue, "ingest_detects", store.ingest_detects)
+    return store
+
+
+def run_flush(queue: IngestQueue, detects: list[CreateDetect]):
+    async def main():
+        queue.start()
+        queue.put_many(detects)
+        await queue.stop()
+
+    asyncio.run(main())
+
+
+def test_poison_reading_is_isolated(stored):
+    stored.failures.append(lambda detects: ValueError("bad row") if any(d.co2 == 5 for d in detects) else None)
+    queue = IngestQueue(maxsize=100, batch_size=16, flush_interval_ms=50, retry_backoff_ms=0)
+    detects = make_detects(16)
+    run_flush(queue, detects)
+
+    assert sorted(detect.co2 for detect in stored.rows) == [float(index) for index in range(16) if index != 5]
+    stats = queue.stats()
+    assert (stats["flushed"], stats["failed"], stats["retries"]) == (15, 1, 0)
+    assert stats["splits"] == 4  # 16 -> 8 -> 4 -> 2 -> 1
+
+
+def test_transient_error_is_retried(stored):
+    attempts = []
+
+    def flaky(detects):
+        attempts.append(len(detects))
+        return operational_error() if len(attempts) <= 2 else None
+
+    stored.failures.append(flaky)
+    queue = IngestQueue(maxsize=100, batch_size=10, flush_interval_ms=50, retry_backoff_ms=0)
+    run_flush(queue, make_detects(10))
+
+    assert len(stored.rows) == 10
+    assert attempts == [10, 10, 10]
+    stats = queue.stats()
+    assert (stats["flushed"], stats["failed"], stats["retries"], stats["splits"]) == (10, 0, 2, 0)
+
+
+def test_persistent_transient_error_drops_batch_without_splitting(stored):
+    stored.failures.append(lambda detects: operational_error())
+    queue = IngestQueue(maxsize=100, batch_size=10, flush_interval_ms=50, flush_retries=2, retry_backoff_ms=0)
+    run_flush(queue, make_detects(10))
+
+    assert stored.rows == []
+    stats = queue.stats()
+    assert (stats["flushed"], stats["failed"], stats["retries"], stats["splits"]) == (0, 10, 2, 0)
+
+
+class SqlStateError(Exception):
+    def __init__(self, sqlstate):
+        self.sqlstate = sqlstate
+
+
+@pytest.mark.parametrize(
+    "error, transient",
+    [
+        (operational_error(), True),
+        (exc.InterfaceError("SELECT 1", {}, Exception("connection is closed")), True),
+        (exc.TimeoutError("QueuePool limit reached"), True),
+        (ConnectionRefusedError(), True),
+        (exc.DBAPIError("INSERT ...", {}, SqlStateError("40P01")), True),  # deadlock
+        (exc.DBAPIError("INSERT ...", {}, SqlStateError("57P01")), True),  # admin shutdown
+        (exc.DBAPIError("INSERT ...", {}, SqlStateError("22003")), False),  # ค่าเกินช่วง
+        (exc.IntegrityError("INSERT ...", {}, SqlStateError("23505")), False),
+        (ValueError("bad row"), False),
+    ],
+)
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
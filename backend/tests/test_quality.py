@@ -0,0 +1,126 @@
+import math
+
+import numpy as np
+import pytest
+
+from notebook.quality import POLLUTANTS, QUALITY_TABLES, UNKNOWN_FIX, UNKNOWN_LEVEL, classify, classify_array
+
+
+def legacy_quality_level(value, pollutant):
+    # get_quality_level เดิม (ก่อนใช้ตารางเกณฑ์ใน notebook/quality.py)
+    levels = {
+        'PM2.5': [
+            {'range': (0, 25), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
+            {'range': (26, 35), 'level': 'ปานกลาง', 'fix': 'ควรสวมหน้ากาก , ควรทำความสะอาดห้อง'},
+            {'range': (36, float('inf')), 'level': 'อันตราย', 'fix': 'ต้องสวมหน้ากาก , ใช้เครื่องฟอกอากาศ , ต้องทำความสะอาดห้องเเละทำความสะอาดแผ่นกรองแอร์'}
+        ],
+        'PM10': [
+            {'range': (0, 50), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
+            {'range': (51, 70), 'level': 'ปานกลาง', 'fix': 'ควรสวมหน้ากาก , ควรทำความสะอาดห้อง'},
+            {'range': (71, float('inf')), 'level': 'อันตราย', 'fix': 'ต้องสวมหน้ากาก , ใช้เครื่องฟอกอากาศ , ต้องทำความสะอาดห้องเเละทำความสะอาดแผ่นกรองแอร์'}
+        ],
+        'CO2': [
+            {'range': (0, 1000), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
+            {'range': (1001, 1400), 'level': 'ปานกลาง', 'fix': 'เปิดหน้าต่างหรือประตูชั่วคราว , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ'},
+            {'range': (1401, float('inf')), 'level': 'อันตราย', 'fix': ' เปิดหน้าต่างหรือประตูให้นานขึ้น , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ'}
+        ],
+        'TVOC': [
+            {'range': (0, 1000), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
+            {'range': (1001, 1400), 'level': 'ปานกลาง', 'fix': 'เปิดหน้าต่างหรือประตูชั่วคราว , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ , ต้องค้นหาเเละกำจัดกลิ่นไม่พึงประสงค์หรือสารเคมีออกจากห้อง'},
+            {'range': (1401, float('inf')), 'level': 'อันตราย', 'fix': 'เปิดหน้าต่างหรือประตูให้นานขึ้น , ใช้พัดลมช่วยเพิ่มการถ่ายเทอากาศ , ต้องค้นหาเเละกำจัดกลิ่นไม่พึงประสงค์หรือสารเคมีออกจากห้องทันที'}
+        ],
+        'Temperature': [
+            {'range': (24.00, 26.99), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
+            {'range': (22.00, 23.99), 'level': 'ปานกลาง', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วง 24-26°C'},
+            {'range': (27.00, 28.99), 'level': 'ปานกลาง', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วง 24-26°C'},
+            {'range': (float('-inf'), 21.99), 'level': 'อันตราย', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วงที่เหมาะสม , ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'},
+            {'range': (29.00, float('inf')), 'level': 'อันตราย', 'fix': 'ปรับอุณหภูมิแอร์ให้อยู่ในช่วงที่เหมาะสม , ใช้พัดลมช่วยกระจายความเย็น , ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'}
+        ],
+        'Humidity': [
+            {'range': (50.00, 65.99), 'level': 'ดี', 'fix': 'อยู่ในเกณฑ์ดี ไม่ต้องดำเนินการใดๆ'},
+            {'range': (40.00, 49.99), 'level': 'ปานกลาง', 'fix': 'เปิดใช้เครื่องพ่นไอน้ำเพื่อเพิ่มความชื้น'},
+            {'range': (66.00, 75.99), 'level': 'ปานกลาง', 'fix': 'ปรับแอร์เป็น Dry Mode เพื่อลดความชื้น '},
+            {'range': (float('-inf'), 39.99), 'level': 'อันตราย', 'fix': 'เปิดใช้เครื่องพ่นไอน้ำเพื่อเพิ่มความชื้นอย่างต่อเนื่อง , ห้ามใช้แอร์โหมดเย็น ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'},
+            {'range': (76.00, float('inf')), 'level': 'อันตราย', 'fix': 'เปิดแอร์ในโหมด Dry Mode อย่างต่อเนื่อง ,  ตรวจสอบการตั้งค่า ถ้าพบว่าเกิดจากการทำงานผิดปกติของเเอร์ ปิดเเอร์ เเละติดต่อช่าง'}
+        ]
+    }
+
+    if pollutant not in levels:
+        return 'ไม่ทราบ'
+
+    for level in levels[pollutant]:
+        low, high = level['range']
+        if low <= value <= high:
+            return level['level'], level['fix']
+
+    return 'ไม่ทราบ'
+
+
+# ค่าที่ขอบของช่วงเกณฑ์ และค่าระหว่างช่วงที่เกณฑ์เดิมไม่ครอบคลุม
+BOUNDARIES = {
+    "PM2.5": [0, 12.5, 25, 25.5, 26, 30, 35, 35.5, 36, 500],
+    "PM10": [0, 50, 50.5, 51, 70, 70.5, 71, 500],
+    "CO2": [0, 400, 1000, 1000.5, 1001, 1400, 1400.5, 1401, 5000],
+    "TVOC": [0, 1000, 1000.5, 1001, 1400, 1400.5, 1401, 5000],
+    "Temperature": [-10, 21.99, 21.995, 22, 23.99, 23.995, 24, 26.99, 26.995, 27, 28.99, 28.995, 29, 45],
+    "Humidity": [0, 39.99, 39.995, 40, 49.99, 49.995, 50, 65.99, 65.995, 66, 75.99, 75.995, 76, 100],
+}
+
+
+@pytest.mark.parametrize("pollutant", list(BOUNDARIES))
+def test_same_as_legacy_where_legacy_classifies(pollutant):
+    values = BOUNDARIES[pollutant]
+    levels, fixes = classify_array(pollutant, values)
+    for value, level, fix in zip(values, levels, fixes):
+        expected = legacy_quality_level(value, pollutant)
+        if expected == "ไม่ทราบ":
+            continue
+        assert (level, fix) == expected, value
+        assert classify(pollutant, value) == expected, value
+
+
+@pytest.mark.parametrize(
+    "pollutant, value, level",
+    [
+        # ช่องว่างระหว่างช่วงของเกณฑ์เดิม: เดิมคืน "ไม่ทราบ" ตอนนี้เข้าช่วงที่ใกล้ที่สุดตามขอบบน/ล่าง
+        ("PM2.5", 25.5, "ปานกลาง"),
+        ("PM2.5", 35.5, "อันตราย"),
+        ("PM10", 70.5, "อันตราย"),
+        ("CO2", 1000.5, "ปานกลาง"),
+        ("Temperature", 21.995, "อันตราย"),
+        ("Temperature", 23.995, "ปานกลาง"),
+        ("Temperature", 26.995, "ดี"),
+        ("Humidity", 65.995, "ดี"),
+        ("Humidity", 75.995, "ปานกลาง"),
+    ],
+)
+def test_gaps_get_a_level(pollutant, value, level):
+    assert legacy_quality_level(value, pollutant) == "ไม่ทราบ"
+    assert classify(pollutant, value)[0] == level
+    assert classify_array(pollutant, [value])[0][0] == level
+
+
+@pytest.mark.parametrize("pollutant", ["PM2.5", "PM10", "CO2", "TVOC"])
+def test_out_of_range(pollutant):
+    table = QUALITY_TABLES[pollutant]
+    # ค่าติดลบ (เซ็นเซอร์ผิดพลาด) เดิมไม่อยู่ในช่วงใด อยู่ช่วงแรกเสมอ ค่าที่สูงมากอยู่ช่วงสุดท้าย
+    levels, _ = classify_array(pollutant, [-1.0, -math.inf, 1e9, math.inf])
+    assert legacy_quality_level(-1.0, pollutant) == "ไม่ทราบ"
+    assert list(levels) == [table.levels[0], table.levels[0], table.levels[-1], table.levels[-1]]
+
+
+@pytest.mark.parametrize("pollutant", list(QUALITY_TABLES))
+def test_nan_is_unknown(pollutant):
+    levels, fixes = classify_array(pollutant, [10.0, math.nan])
+    assert (levels[1], fixes[1]) == classify(pollutant, math.nan) == (UNKNOWN_LEVEL, UNKNOWN_FIX)
+    assert levels[0] != UNKNOWN_LEVEL
+    # ไม่แก้ไขตารางเกณฑ์ที่ใช้ร่วมกัน
+    assert UNKNOWN_LEVEL not in QUALITY_TABLES[pollutant].np_levels
+
+
+def test_array_matches_scalar():
+    rng = np.random.default_rng(0)
+    for pollutant in POLLUTANTS.values():
+        values = rng.uniform(-10, 2000, size=500).round(2)
+        levels, fixes = classify_array(pollutant, values)
+        assert [tuple(pair) for pair in zip(levels, fixes)] == [classify(pollutant, value) for value in values]
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta
+from email.utils import formatdate
+
+import pytest
+from starlette.requests import Request
+
+from notebook import response_cache
+from notebook.ingest import METRICS
+from notebook.response_cache import ALL_DEVICES, ResponseCache, to_response
+
+
+def make_request(path: str = "/scores/a", query: str = "", headers: dict | None = None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def test_etag_depends_on_body():
+    cache = ResponseCache(maxsize=10, ttl_seconds=0)
+    first = cache.set(("/a", ""), "a", 0, b'{"x":1}')
+    same = cache.set(("/b", ""), "b", 0, b'{"x":1}')
+    other = cache.set(("/a", ""), "a", 0, b'{"x":2}')
+    assert first.etag == same.etag != other.etag
+    assert cache.get(("/a", "")).body == b'{"x":2}'
+
+
+def test_not_modified():
+    cache = ResponseCache(maxsize=10, ttl_seconds=0)
+    entry = cache.set(("/scores/a", ""), "a", 0, b"{}")
+
+    assert to_response(make_request(), entry).status_code == 200
+    assert to_response(make_request(headers={"If-None-Match": entry.etag}), entry).status_code == 304
+    assert to_response(make_request(headers={"If-None-Match": f'"other", {entry.etag}'}), entry).status_code == 304
+    assert to_response(make_request(headers={"If-None-Match": "*"}), entry).status_code == 304
+    assert to_response(make_request(headers={"If-None-Match": '"other"'}), entry).status_code == 200
+
+    since = formatdate(entry.last_modified, usegmt=True)
+    assert to_response(make_request(headers={"If-Modified-Since": since}), entry).status_code == 304
+    earlier = formatdate(entry.last_modified - 60, usegmt=True)
+    assert to_response(make_request(headers={"If-Modified-Since": earlier}), entry).status_code == 200
+    assert to_response(make_request(headers={"If-Modified-Since": "yesterday"}), entry).status_code == 200
+    # If-None-Match มาก่อน If-Modified-Since
+    headers = {"If-None-Match": '"other"', "If-Modified-Since": since}
+    assert to_response(make_request(headers=headers), entry).status_code == 200
+
+
+def test_invalidate_device_and_all_devices():
+    cache = ResponseCache(maxsize=10, ttl_seconds=0)
+    cache.set(("/scores/a", ""), "a", 0, b"a")
+    cache.set(("/scores/b", ""), "b", 0, b"b")
+    cache.set(("/showdetect/all", ""), ALL_DEVICES, 0, b"all")
+
+    cache.invalidate("a")
+    assert cache.get(("/scores/a", "")) is None
+    assert cache.get(("/showdetect/all", "")) is None
+    assert cache.get(("/scores/b", "")).body == b"b"
+
+    cache.clear()
+    assert cache.get(("/scores/b", "")) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_stale_generation_is_not_stored():
+    # request อ่านข้อมูลก่อนการเขียน แล้วเก็บผลหลังการเขียนล้างแคชไปแล้ว
+    cache = ResponseCache(maxsize=10, ttl_seconds=0)
+    generation = cache.generation("a")
+    cache.invalidate("a")
+    entry = cache.set(("/scores/a", ""), "a", generation, b"old")
+    assert entry.body == b"old"
+    assert cache.get(("/scores/a", "")) is None
+
+    cache.set(("/scores/a", ""), "a", cache.generation("a"), b"new")
+    assert cache.get(("/scores/a", "")).body == b"new"
+
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2, ttl_seconds=0)
+    cache.set(("/1", ""), "a", 0, b"1")
+    cache.set(("/2", ""), "a", 0, b"2")
+    cache.get(("/1", ""))
+    cache.set(("/3", ""), "a", 0, b"3")
+    assert cache.get(("/2", "")) is None
+    assert cache.get(("/1", "")) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(maxsize=10, ttl_seconds=5)
+    cache.set(("/a", ""), "a", 0, b"a")
+    now[0] += 4
+    assert cache.get(("/a", "")) is not None
+    now[0] += 2
+    assert cache.get(("/a", "")) is None
+    assert cache.stats()["size"] == 0
+
+
+def post_reading(client, api_key: str, minutes: int, co2: float):
+    reading = {metric: 10.0 for metric in METRICS}
+    timestamp = (datetime(2026, 1, 1, 8, 0) + timedelta(minutes=minutes)).isoformat()
+    response = client.post("/detects/create", json={**reading, "co2": co2, "api_key": api_key, "timestamp": timestamp})
+    assert response.status_code == 200, response.text
+
+
+@pytest.mark.parametrize("path", ["/scores/{api_key}", "/avg/daily_averages/{api_key}", "/showdetect/all"])
+def test_etag_and_invalidation(client, api_key, path):
+    if response_cache.cache is None:
+        pytest.skip("RESPONSE_CACHE_SIZE is 0")
+    url = path.format(api_key=api_key)
+    post_reading(client, api_key, 0, 500.0)
+    if path == "/showdetect/all":
+        # อุปกรณ์ใหม่ล่าสุดอยู่หน้าสุดท้าย (เรียงตาม id)
+        url += f"?size=1&page={client.get(url, params={'size': 1}).json()['total']}"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = client.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    # ข้อมูลใหม่ของอุปกรณ์ล้างแคชหลัง commit: ได้ response ใหม่และ ETag ใหม่
+    post_reading(client, api_key, 1, 1500.0)
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json() != first.json()
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from notebook import single_flight
+from notebook.single_flight import SingleFlight
+
+
+class Loader:
+    # load ที่นับจำนวนครั้งที่ถูกเรียก และรอจนกว่าจะปล่อย
+    def __init__(self, result="rows"):
+        self.result = result
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return f"{self.result}-{self.calls}"
+
+
+async def settle():
+    # ให้ task ที่สร้างไว้เริ่มทำงานจนถึงจุดที่รอ
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_requests_share_one_load():
+    async def main():
+        flights = SingleFlight()
+        load = Loader()
+        tasks = [asyncio.create_task(flights.run("key", load)) for _ in range(10)]
+        await settle()
+        assert flights.stats()["in_flight"] == 1
+        load.release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert load.calls == 1
+        assert results == ["rows-1"] * 10
+        stats = flights.stats()
+        assert (stats["queries"], stats["coalesced"], stats["max_followers"], stats["in_flight"]) == (1, 9, 9, 0)
+
+        # เสร็จแล้วไม่แคชผล: request ถัดไปโหลดใหม่
+        assert await flights.run("key", load) == "rows-2"
+
+    asyncio.run(main())
+
+
+def test_different_keys_load_separately():
+    async def main():
+        flights = SingleFlight()
+        load = Loader()
+        load.release.set()
+        results = await asyncio.gather(flights.run("a", load), flights.run("b", load))
+        assert sorted(results) == ["rows-1", "rows-2"]
+        assert flights.stats()["coalesced"] == 0
+
+    asyncio.run(main())
+
+
+def test_exception_reaches_every_follower():
+    async def main():
+        flights = SingleFlight()
+        load = Loader(LookupError("not found"))
+        tasks = [asyncio.create_task(flights.run("key", load)) for _ in range(3)]
+        await settle()
+        load.release.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        assert load.calls == 1
+        assert all(isinstance(result, LookupError) for result in results)
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_leader_hands_over_to_a_follower():
+    async def main():
+        flights = SingleFlight()
+        load = Loader()
+        leader = asyncio.create_task(flights.run("key", load))
+        await settle()
+        followers = [asyncio.create_task(flights.run("key", load)) for _ in range(3)]
+        await settle()
+
+        # client ของ leader ปิดการเชื่อมต่อ: follower คนหนึ่งโหลดใหม่ ที่เหลือรอผลนั้น
+        leader.cancel()
+        await settle()
+        load.release.set()
+        results = await asyncio.gather(*followers)
+
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert load.calls == 2
+        assert results == ["rows-2"] * 3
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    async def main():
+        flights = SingleFlight()
+        load = Loader()
+        leader = asyncio.create_task(flights.run("key", load))
+        await settle()
+        follower = asyncio.create_task(flights.run("key", load))
+        other = asyncio.create_task(flights.run("key", load))
+        await settle()
+
+        follower.cancel()
+        await settle()
+        load.release.set()
+
+        assert await leader == "rows-1"
+        assert await other == "rows-1"
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        assert load.calls == 1
+
+    asyncio.run(main())
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(single_flight, "flights", None)
+
+    async def main():
+        load = Loader()
+        load.release.set()
+        return await asyncio.gather(single_flight.run("key", load), single_flight.run("key", load))
+
+    assert sorted(asyncio.run(main())) == ["rows-1", "rows-2"]
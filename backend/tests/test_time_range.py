@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from notebook import history
+from notebook.ingest import METRICS, local_naive
+
+
+def test_local_naive():
+    naive = datetime(2026, 10, 1, 7, 0)
+    assert local_naive(naive) is naive
+
+    aware = datetime(2026, 10, 1, 0, 0, tzinfo=timezone.utc)
+    converted = local_naive(aware)
+    assert converted.tzinfo is None
+    # เป็นเวลาเดียวกันเมื่อมองเป็นเวลาท้องถิ่น
+    assert converted.astimezone() == aware
+
+    bangkok = datetime(2026, 10, 1, 7, 0, tzinfo=timezone(timedelta(hours=7)))
+    assert local_naive(bangkok) == converted
+
+
+@pytest.mark.parametrize("start", ["2026-10-01T00:00:00Z", "2026-10-01T07:00:00+07:00", "2026-10-01T00:00:00"])
+def test_detect_history_accepts_timezones(client, api_key, monkeypatch, start):
+    # โหมดเก็บประวัติ (ตาราง detect_history ถูกสร้างโดย create_all เสมอ)
+    monkeypatch.setattr(history, "store", history.DetectHistory(months_ahead=0))
+    response = client.get(f"/detects/history/{api_key}", params={"start": start, "end": "2026-10-02T00:00:00Z"})
+    assert response.status_code == 200, response.text
+    assert response.json() == []
+
+
+@pytest.mark.parametrize("resolution", ["auto", "5m", "hour", "day"])
+def test_rollups_accept_timezones(client, api_key, resolution):
+    reading = {metric: 10.0 for metric in METRICS}
+    response = client.post("/detects/create", json={**reading, "api_key": api_key, "timestamp": "2026-10-01T12:00:00"})
+    assert response.status_code == 200, response.text
+
+    # ช่วงเวลาเดียวกันในรูปแบบ UTC
+    start = datetime(2026, 10, 1, 11, 0).astimezone(timezone.utc)
+    end = datetime(2026, 10, 1, 13, 0).astimezone(timezone.utc)
+    response = client.get(
+        f"/avg/{resolution}/{api_key}", params={"start": start.isoformat(), "end": end.isoformat()}
+    )
+    assert response.status_code == 200, response.text
+    series = response.json()
+    assert series["start"] == "2026-10-01T11:00:00"
+    assert sum(point["readings"] for point in series["points"]) == 1
+
+
+@pytest.mark.parametrize("table", ["detects", "daily_averages"])
+def test_export_accepts_timezones(client, api_key, table):
+    reading = {metric: 10.0 for metric in METRICS}
+    response = client.post("/detects/create", json={**reading, "api_key": api_key, "timestamp": "2026-10-01T12:00:00"})
+    assert response.status_code == 200, response.text
+
+    # export รับเป็นวันที่: เวลาเที่ยงคืนที่มี timezone ถูกอ่านเป็นวันที่นั้น
+    response = client.get(
+        f"/export/{api_key}",
+        params={"start": "2026-10-01T00:00:00Z", "end": "2026-10-01T00:00:00+07:00", "table": table, "format": "ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    assert len(response.text.splitlines()) == 1
+
+    # เวลาอื่นที่ไม่ใช่เที่ยงคืนไม่ใช่วันที่ (422 ไม่ใช่ 500)
+    response = client.get(f"/export/{api_key}", params={"start": "2026-10-01T10:00:00Z", "end": "2026-10-02"})
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("year", [-1, 0, 9999, 10000])
+def test_monthly_averages_rejects_out_of_range_year(client, api_key, year):
+    response = client.get(f"/avg/monthly/{api_key}", params={"year": year})
+    assert response.status_code == 422
+
+
+def test_monthly_averages_by_year(client, api_key):
+    reading = {metric: 10.0 for metric in METRICS}
+    for timestamp in ("2024-12-31T12:00:00", "2025-01-01T12:00:00"):
+        response = client.post("/detects/create", json={**reading, "api_key": api_key, "timestamp": timestamp})
+        assert response.status_code == 200, response.text
+
+    response = client.get(f"/avg/monthly/{api_key}", params={"year": 2025})
+    assert response.status_code == 200, response.text
+    assert [month["period"] for month in response.json()] == ["2025-01"]
+
+    response = client.get(f"/avg/monthly/{api_key}", params={"year": 9998})
+    assert response.json() == []